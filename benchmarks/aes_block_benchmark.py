@@ -0,0 +1,104 @@
+#!/usr/bin/python
+## @package benchmarks.aes_block_benchmark
+# Microbenchmark of AES encryption of whole blocks.
+## @file aes_block_benchmark.py Implementation of @ref benchmarks.aes_block_benchmark
+#
+# Compares encrypting and decrypting 4 KiB blocks 16 bytes at a time, packing and
+# unpacking every piece (the old encrypt_block_aes and decrypt_block_aes behaviour),
+# with the bulk CBC mode of pyaes writing into one bytearray.
+#
+# Usage: python -m benchmarks.aes_block_benchmark [--blocks 50]
+#
+import argparse
+import os
+import struct
+import time
+
+from common import constants
+from common.utilities import encryption_util
+
+## Parse args function.
+# @returns (dict) arguments and their values.
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--blocks",
+        type=int,
+        default=50,
+        help="Blocks processed per measurement. Default: %(default)s",
+    )
+    return parser.parse_args()
+
+## Encrypt or decrypt a block 16 bytes at a time.
+# @param function (function) encrypt or decrypt function of the encryption object.
+# @param block (str) block.
+# @returns (bytearray) processed block.
+def process_pieces(function, block):
+    index = 0
+    result = bytearray(len(block))
+    while index < len(block):
+        result[index:index + 16] = struct.pack(
+            "16s",
+            function(
+                struct.unpack(
+                    "16s",
+                    block[index:index + 16],
+                )[0]
+            )
+        )
+        index += 16
+    return result
+
+## Measure one way of processing blocks.
+# @param function (function) processes the block of a block number.
+# @param blocks (int) number of blocks.
+# @returns (float) MB per second.
+def measure(function, blocks):
+    start = time.time()
+    for block_num in range(blocks):
+        function(block_num)
+    return blocks * constants.BLOCK_SIZE / (time.time() - start) / 1e6
+
+def __main__():
+    args = parse_args()
+    block_key = encryption_util.BlockKey("key", "ivkey")
+    block = os.urandom(constants.BLOCK_SIZE)
+    encrypted = str(encryption_util.encrypt_block_aes(block_key.get_aes(0), block))
+
+    if process_pieces(block_key.get_aes(0).encrypt, block) != encrypted:
+        raise RuntimeError("bulk encryption differs")
+    if encryption_util.decrypt_block_aes(block_key.get_aes(0), encrypted) != block:
+        raise RuntimeError("bulk decryption differs")
+
+    print("%-10s %-8s %s" % ("operation", "mode", "MB/s"))
+    for name, mode, function in (
+        (
+            "encrypt",
+            "pieces",
+            lambda i: process_pieces(block_key.get_aes(i).encrypt, block),
+        ),
+        (
+            "encrypt",
+            "bulk",
+            lambda i: encryption_util.encrypt_block_aes(block_key.get_aes(i), block),
+        ),
+        (
+            "decrypt",
+            "pieces",
+            lambda i: process_pieces(block_key.get_aes(i).decrypt, encrypted),
+        ),
+        (
+            "decrypt",
+            "bulk",
+            lambda i: encryption_util.decrypt_block_aes(block_key.get_aes(i), encrypted),
+        ),
+    ):
+        print("%-10s %-8s %.3f" % (
+            name,
+            mode,
+            measure(function, args.blocks),
+        ))
+
+
+if __name__ == "__main__":
+    __main__()
@@ -0,0 +1,92 @@
+#!/usr/bin/python
+## @package benchmarks.aes_context_benchmark
+# Microbenchmark of creating the AES encryption object of a block.
+## @file aes_context_benchmark.py Implementation of @ref benchmarks.aes_context_benchmark
+#
+# Compares creating a pyaes.AESModeOfOperationCBC per block, hashing the key and
+# expanding it every time (the old get_aes behaviour), with the BlockKey created at
+# startup, and with the cached expanded keys of user keys.
+#
+# Usage: python -m benchmarks.aes_context_benchmark [--iterations 10000]
+#
+import argparse
+import hashlib
+import os
+import time
+
+import pyaes
+
+from common import constants
+from common.utilities import encryption_util
+
+## Parse args function.
+# @returns (dict) arguments and their values.
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--iterations",
+        type=int,
+        default=10000,
+        help="Encryption objects created per measurement. Default: %(default)s",
+    )
+    return parser.parse_args()
+
+## Create encryption object of a block, the way get_aes used to.
+# @param key (str) encryption key.
+# @param ivkey (str) encryption iv generation key.
+# @param block_num (int) block number.
+# @returns (pyaes.AESModeOfOperationCBC) encryption object.
+def get_aes_uncached(key, ivkey, block_num):
+    sha = hashlib.sha1()
+    sha.update(key)
+    key = sha.digest()[:16]
+
+    sha = hashlib.sha1()
+    sha.update(ivkey)
+    sha.update(str(block_num))
+    return pyaes.AESModeOfOperationCBC(key, iv=sha.digest()[:16])
+
+## Measure one way of creating encryption objects.
+# @param function (function) creates the encryption object of a block number.
+# @param iterations (int) number of objects.
+# @returns (float) seconds per object.
+def measure(function, iterations):
+    start = time.time()
+    for i in range(iterations):
+        function(i)
+    return (time.time() - start) / iterations
+
+def __main__():
+    args = parse_args()
+    key = "key"
+    ivkey = "ivkey"
+    block_key = encryption_util.BlockKey(key, ivkey)
+    user_key = os.urandom(16)
+    iv = os.urandom(constants.IV_LENGTH)
+
+    block = os.urandom(constants.BLOCK_SIZE)
+    for block_num in range(3):
+        if encryption_util.encrypt_block_aes(
+            block_key.get_aes(block_num),
+            block,
+        ) != encryption_util.encrypt_block_aes(
+            get_aes_uncached(key, ivkey, block_num),
+            block,
+        ):
+            raise RuntimeError("block %d: encryption changed" % block_num)
+
+    print("%-10s %s" % ("context", "usec/block"))
+    for name, function in (
+        ("uncached", lambda i: get_aes_uncached(key, ivkey, i)),
+        ("block_key", block_key.get_aes),
+        ("user", lambda i: pyaes.AESModeOfOperationCBC(user_key, iv=iv)),
+        ("user_lru", lambda i: encryption_util.get_cbc(user_key, iv)),
+    ):
+        print("%-10s %.1f" % (
+            name,
+            measure(function, args.iterations) * 1e6,
+        ))
+
+
+if __name__ == "__main__":
+    __main__()
@@ -0,0 +1,90 @@
+#!/usr/bin/python
+## @package benchmarks.aes_vector_benchmark
+# Microbenchmark of AES CBC decryption with and without numpy.
+## @file aes_vector_benchmark.py Implementation of @ref benchmarks.aes_vector_benchmark
+#
+# Compares the throughput of decrypting buffers of whole blocks one AES block at a
+# time (the scalar path, used without numpy) with decrypting all their AES blocks at
+# once with the numpy T-table cipher of pyaes.
+#
+# Usage: python -m benchmarks.aes_vector_benchmark [--blocks 1 4 16] [--iterations 20]
+#
+import argparse
+import os
+import time
+
+from pyaes import aes
+
+from common import constants
+from common.utilities import encryption_util
+
+## Parse args function.
+# @returns (dict) arguments and their values.
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--blocks",
+        type=int,
+        nargs="+",
+        default=[1, 4, 16],
+        help="Blocks per decrypted buffer. Default: %(default)s",
+    )
+    parser.add_argument(
+        "--iterations",
+        type=int,
+        default=20,
+        help="Buffers decrypted per measurement. Default: %(default)s",
+    )
+    return parser.parse_args()
+
+## Decrypt a buffer without numpy.
+# @param cbc (pyaes.AESModeOfOperationCBC) encryption object.
+# @param data (str) buffer.
+# @returns (bytearray) decrypted buffer.
+def decrypt_scalar(cbc, data):
+    numpy = aes.numpy
+    aes.numpy = None
+    try:
+        return encryption_util.decrypt_block_aes(cbc, data)
+    finally:
+        aes.numpy = numpy
+
+## Measure one decryption.
+# @param function (function) decryption function.
+# @param block_key (BlockKey) key of the buffer.
+# @param data (str) buffer.
+# @param iterations (int) number of buffers.
+# @returns (float) MB per second.
+def measure(function, block_key, data, iterations):
+    start = time.time()
+    for i in range(iterations):
+        function(block_key.get_aes(i), data)
+    return iterations * len(data) / (time.time() - start) / 1e6
+
+def __main__():
+    args = parse_args()
+    if aes.numpy is None:
+        raise RuntimeError("numpy is not installed")
+
+    block_key = encryption_util.BlockKey("key", "ivkey")
+    functions = (
+        ("scalar", decrypt_scalar),
+        ("numpy", encryption_util.decrypt_block_aes),
+    )
+
+    print("%-8s %-8s %s" % ("blocks", "decrypt", "MB/s"))
+    for blocks in args.blocks:
+        data = os.urandom(blocks * constants.BLOCK_SIZE)
+        encrypted = str(encryption_util.encrypt_block_aes(block_key.get_aes(0), data))
+        for name, function in functions:
+            if function(block_key.get_aes(0), encrypted) != data:
+                raise RuntimeError("%s: %d blocks not decrypted" % (name, blocks))
+            print("%-8d %-8s %.3f" % (
+                blocks,
+                name,
+                measure(function, block_key, encrypted, args.iterations),
+            ))
+
+
+if __name__ == "__main__":
+    __main__()
@@ -0,0 +1,236 @@
+#!/usr/bin/python
+## @package benchmarks.block_protocol_benchmark
+# Benchmark of block device operations per second over HTTP and over the binary block protocol.
+## @file block_protocol_benchmark.py Implementation of @ref benchmarks.block_protocol_benchmark
+#
+# Starts a block device on a local port, and concurrent clients write and
+# then read single random blocks for a fixed time, the way the frontend does.
+# Over HTTP every block is a keep-alive /read or /write request with its
+# request line and headers, over the binary protocol every client upgrades
+# its connection once and every block is one fixed header frame.
+#
+# Usage: python -m benchmarks.block_protocol_benchmark [--clients 1 8] [--duration 5]
+#
+import argparse
+import base64
+import ConfigParser
+import httplib
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks import worker_scaling_benchmark
+from common import constants
+from common.utilities import frame_util
+
+## Blocks of the benchmark disk.
+BLOCKS = 1024
+
+## Authorization header of the default block device credentials.
+AUTHORIZATION = "Basic %s" % base64.b64encode("username1:password1")
+
+## Parse args function.
+# @returns (dict) arguments and their values.
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--clients",
+        type=int,
+        nargs="+",
+        default=[1, 8],
+        help="Numbers of concurrent clients to measure. Default: %(default)s",
+    )
+    parser.add_argument(
+        "--duration",
+        type=float,
+        default=5,
+        help="Seconds to measure every protocol, operation and number of clients. Default: %(default)s",
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=18870,
+        help="Block device port. Default: %(default)s",
+    )
+    return parser.parse_args()
+
+## HTTP block client.
+# sends every block operation as a keep-alive HTTP request.
+class HttpBlockClient(object):
+    ## Constructor.
+    # @param port (int) block device port.
+    def __init__(self, port):
+        self._connection = httplib.HTTPConnection("127.0.0.1", port, timeout=60)
+
+    ## Perform one block operation.
+    # @param write (bool) whether to write or read the block.
+    # @param block_num (int) block number.
+    # @param block (str) block to write.
+    def run(self, write, block_num, block):
+        self._connection.request(
+            "GET",
+            "/%s?block=%d" % ("write" if write else "read", block_num),
+            block if write else None,
+            {"Authorization": AUTHORIZATION},
+        )
+        response = self._connection.getresponse()
+        data = response.read()
+        if response.status != 200:
+            raise RuntimeError("block %d %s: %s" % (block_num, response.status, data[:200]))
+
+    def close(self):
+        self._connection.close()
+
+## Binary block client.
+# upgrades its connection once, then sends every block operation as a frame.
+class BinaryBlockClient(object):
+    ## Constructor.
+    # @param port (int) block device port.
+    def __init__(self, port):
+        self._socket = socket.create_connection(("127.0.0.1", port), timeout=60)
+        self._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._request_id = 0
+        self._socket.sendall(
+            "GET /upgrade %s\r\n"
+            "Connection: Upgrade\r\n"
+            "Upgrade: %s\r\n"
+            "Authorization: %s\r\n"
+            "\r\n" % (
+                constants.HTTP_SIGNATURE,
+                constants.BLOCK_PROTOCOL,
+                AUTHORIZATION,
+            )
+        )
+        response = ""
+        while "\r\n\r\n" not in response:
+            data = self._socket.recv(4096)
+            if not data:
+                raise RuntimeError("upgrade failed")
+            response += data
+        if response.split(" ", 2)[1] != "101":
+            raise RuntimeError("upgrade failed: %s" % response.split("\r\n")[0])
+
+    ## Receive exact number of bytes.
+    # @param length (int) number of bytes.
+    # @returns (str) data.
+    def _recv(self, length):
+        data = ""
+        while len(data) < length:
+            chunk = self._socket.recv(length - len(data))
+            if not chunk:
+                raise RuntimeError("connection closed")
+            data += chunk
+        return data
+
+    ## Perform one block operation.
+    # @param write (bool) whether to write or read the block.
+    # @param block_num (int) block number.
+    # @param block (str) block to write.
+    def run(self, write, block_num, block):
+        self._request_id += 1
+        payload = block if write else ""
+        self._socket.sendall(
+            frame_util.pack_header(
+                constants.OP_WRITE if write else constants.OP_READ,
+                self._request_id,
+                block_num,
+                1,
+                len(payload),
+            ) + payload
+        )
+        opcode, request_id, block_index, count, length = frame_util.HEADER.unpack(
+            self._recv(frame_util.HEADER.size)
+        )
+        data = self._recv(length)
+        if opcode == constants.OP_ERROR:
+            raise RuntimeError("block %d: %s" % (block_num, data[:200]))
+
+    def close(self):
+        self._socket.close()
+
+## Perform block operations until time is up.
+# @param client (object) block client.
+# @param write (bool) whether to write or read blocks.
+# @param deadline (float) time to stop at.
+# @returns (int) number of operations.
+def run_client(client, write, deadline):
+    operations = 0
+    block = os.urandom(constants.BLOCK_SIZE)
+    try:
+        while time.time() < deadline:
+            client.run(write, random.randrange(BLOCKS), block)
+            operations += 1
+    finally:
+        client.close()
+    return operations
+
+## Measure one protocol, operation and number of clients.
+# @param args (dict) arguments.
+# @param client_class (type) block client class.
+# @param write (bool) whether to write or read blocks.
+# @param clients (int) number of clients.
+# @returns (float) operations per second.
+def measure(args, client_class, write, clients):
+    results = []
+    lock = threading.Lock()
+    deadline = time.time() + args.duration
+
+    def run(index):
+        result = run_client(client_class(args.port), write, deadline)
+        with lock:
+            results.append(result)
+
+    elapsed = worker_scaling_benchmark.run_clients(clients, run)
+    return sum(results) / elapsed
+
+def __main__():
+    args = parse_args()
+    directory = tempfile.mkdtemp()
+    config = ConfigParser.ConfigParser()
+    config.read("block_device/config.ini")
+    config.set("blockdevice", "bind.port", str(args.port))
+    config.set("blockdevice", "file.name", os.path.join(directory, "disk"))
+    config.set("blockdevice", "file.size", str(BLOCKS * constants.BLOCK_SIZE))
+    bd_config = os.path.join(directory, "bd.ini")
+    with open(bd_config, "w") as f:
+        config.write(f)
+
+    device = subprocess.Popen(
+        [
+            sys.executable, "-m", "block_device",
+            "--config", bd_config,
+            "--max-connections", str(max(args.clients) * 2),
+            "--keep-alive-requests", "1000000",
+            "--log-file", os.devnull,
+        ],
+        stderr=worker_scaling_benchmark.DEVNULL,
+    )
+    try:
+        worker_scaling_benchmark.wait_port(args.port)
+        print("%-8s %-6s %-8s %s" % ("protocol", "op", "clients", "blocks/s"))
+        for clients in args.clients:
+            for write in (True, False):
+                for name, client_class in (
+                    ("http", HttpBlockClient),
+                    ("binary", BinaryBlockClient),
+                ):
+                    print("%-8s %-6s %-8d %.1f" % (
+                        name,
+                        "write" if write else "read",
+                        clients,
+                        measure(args, client_class, write, clients),
+                    ))
+    finally:
+        device.terminate()
+        device.wait()
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    __main__()
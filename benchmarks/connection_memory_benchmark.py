@@ -0,0 +1,149 @@
+#!/usr/bin/python
+## @package benchmarks.connection_memory_benchmark
+# Benchmark of the memory footprint of idle connections.
+## @file connection_memory_benchmark.py Implementation of @ref benchmarks.connection_memory_benchmark
+#
+# Creates idle HttpSocket connections the way the listener accepts them, and measures
+# the growth of the resident memory per connection.
+# The dict layout is rebuilt for comparison: an instance dictionary, a state machine of
+# bound methods per connection and a dictionary request context.
+# The receive window is allocated lazily, on first receive. Each layout is also measured
+# with the window allocated up front, so the saving of the slots and the saving of the
+# lazy window are reported separately.
+#
+# Usage: python -m benchmarks.connection_memory_benchmark [--connections 1000 10000]
+#
+import argparse
+import gc
+import multiprocessing
+import resource
+import socket
+
+from common import async_server
+from common import constants
+from common import event_object
+from common.pollables.http_socket import HttpSocket
+
+## HttpSocket with the receive window allocated up front.
+class EagerHttpSocket(HttpSocket):
+    __slots__ = ()
+
+    ## Constructor.
+    # @param args (list) HttpSocket arguments.
+    def __init__(self, *args):
+        super(EagerHttpSocket, self).__init__(*args)
+        recv_buffer = self.request_context.recv_buffer
+        recv_buffer._data = bytearray(recv_buffer._size)
+
+## HttpSocket with the dict layout.
+class DictHttpSocket(HttpSocket):
+    ## Constructor.
+    # @param args (list) HttpSocket arguments.
+    def __init__(self, *args):
+        super(DictHttpSocket, self).__init__(*args)
+        request_context = self.request_context
+        self.request_context = dict(
+            (key, request_context[key]) for key in request_context.keys()
+        )
+        self.state_machine = dict(
+            (state, {"func": entry["func"].__get__(self), "next": entry["next"]})
+            for state, entry in enumerate(self._state_machine)
+        )
+
+## HttpSocket with the dict layout and the receive window allocated up front.
+class EagerDictHttpSocket(DictHttpSocket):
+    ## Constructor.
+    # @param args (list) HttpSocket arguments.
+    def __init__(self, *args):
+        super(EagerDictHttpSocket, self).__init__(*args)
+        recv_buffer = self.request_context["recv_buffer"]
+        recv_buffer._data = bytearray(recv_buffer._size)
+
+## Parse args function.
+# @returns (dict) arguments and their values.
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--connections",
+        type=int,
+        nargs="+",
+        default=[1000, 10000],
+        help="Numbers of idle connections to measure. Default: %(default)s",
+    )
+    return parser.parse_args()
+
+## Resident memory of the process.
+# @returns (int) bytes.
+def get_rss():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * resource.getpagesize()
+
+## Measure one layout and number of connections.
+# @param pollable_class (class) connection class.
+# @param connections (int) number of connections.
+# @returns (float) bytes per idle connection.
+def measure(pollable_class, connections):
+    app_context = {
+        "event_object": event_object.EVENT_OBJECTS["poll"],
+        "timeout": 0,
+        "idle_timeout": constants.IDLE_TIMEOUT,
+    }
+    server = async_server.Server(app_context)
+    sockets = [
+        socket.socket(socket.AF_INET, socket.SOCK_DGRAM) for i in range(connections)
+    ]
+    entries = []
+    try:
+        gc.collect()
+        before = get_rss()
+        for s in sockets:
+            entries.append(
+                pollable_class(s, constants.ACTIVE, app_context, server._fd_dict)
+            )
+        gc.collect()
+        return float(get_rss() - before) / connections
+    finally:
+        for entry in entries:
+            server.cancel_timer(entry._timer)
+        for s in sockets:
+            s.close()
+
+## Measure one layout and number of connections in a new process.
+# @param pollable_class (class) connection class.
+# @param connections (int) number of connections.
+# @returns (float) bytes per idle connection.
+#
+# memory freed by an earlier measurement would be reused without growing the
+# resident memory.
+#
+def measure_in_process(pollable_class, connections):
+    pool = multiprocessing.Pool(1)
+    try:
+        return pool.apply(measure, (pollable_class, connections))
+    finally:
+        pool.close()
+        pool.join()
+
+def __main__():
+    args = parse_args()
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    print("%-12s %-8s %-8s %s" % ("connections", "layout", "window", "bytes/connection"))
+    for connections in args.connections:
+        for layout, window, pollable_class in (
+            ("dict", "eager", EagerDictHttpSocket),
+            ("dict", "lazy", DictHttpSocket),
+            ("slots", "eager", EagerHttpSocket),
+            ("slots", "lazy", HttpSocket),
+        ):
+            print("%-12d %-8s %-8s %.0f" % (
+                connections,
+                layout,
+                window,
+                measure_in_process(pollable_class, connections),
+            ))
+
+
+if __name__ == "__main__":
+    __main__()
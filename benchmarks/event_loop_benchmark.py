@@ -0,0 +1,133 @@
+#!/usr/bin/python
+## @package benchmarks.event_loop_benchmark
+# Benchmark of the asynchronous server loop iteration cost with idle connections.
+## @file event_loop_benchmark.py Implementation of @ref benchmarks.event_loop_benchmark
+#
+# Compares rebuilding a poll object on every iteration (the old create_poller() behaviour)
+# with the scheduled loop over the persistent event objects, at a growing number of idle connections.
+#
+# Usage: python -m benchmarks.event_loop_benchmark [--connections 100 1000 10000]
+#
+import argparse
+import resource
+import socket
+import time
+
+from common import async_server
+from common import constants
+from common import event_object
+from common.utilities import util
+from common.pollables.pollable import Pollable
+
+## Idle entry.
+# pollable which only waits for data that never arrives.
+class IdleEntry(Pollable):
+    ## Constructor.
+    # @param sock (socket) idle socket.
+    def __init__(self, sock):
+        self.socket = sock
+        self.request_context = {
+            "state": constants.ACTIVE,
+            "recv_buffer": util.ReceiveBuffer(constants.BLOCK_SIZE),
+            "send_buffer": util.OutputQueue(),
+        }
+
+    def fileno(self):
+        return self.socket.fileno()
+
+## Parse args function.
+# @returns (dict) arguments and their values.
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--connections",
+        type=int,
+        nargs="+",
+        default=[100, 1000, 10000],
+        help="Numbers of idle connections to measure. Default: %(default)s",
+    )
+    parser.add_argument(
+        "--iterations",
+        type=int,
+        default=200,
+        help="Loop iterations per measurement. Default: %(default)s",
+    )
+    return parser.parse_args()
+
+## Create a server holding idle entries.
+# @param method (str) event method name.
+# @param entries (list) idle entries.
+# @returns (Server) server object.
+def create_server(method, entries):
+    server = async_server.Server({
+        "event_object": event_object.EVENT_OBJECTS[method],
+        "timeout": 0,
+    })
+    for entry in entries:
+        server._fd_dict[entry.fileno()] = entry
+    return server
+
+## Measure one loop iteration the way create_poller() used to do it.
+# @param server (Server) server object.
+# @param iterations (int) number of iterations.
+# @returns (float) seconds per iteration.
+def measure_rebuild(server, iterations):
+    start = time.time()
+    for i in range(iterations):
+        poller = event_object.PollEvents()
+        for entry in server._fd_dict.values():
+            poller.register(entry.fileno(), server._get_mask(entry))
+        poller.poll(0)
+    return (time.time() - start) / iterations
+
+## Measure one loop iteration with the persistent poller.
+# @param server (Server) server object.
+# @param iterations (int) number of iterations.
+# @returns (float) seconds per iteration.
+def measure_persistent(server, iterations):
+    for entry in server._fd_dict.values():
+        server.schedule(entry)
+    server._run_ready()
+    start = time.time()
+    for i in range(iterations):
+        server._run_ready()
+        server._poll(0)
+    return (time.time() - start) / iterations
+
+def __main__():
+    args = parse_args()
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    print("%-12s %-12s %s" % ("connections", "method", "usec/iteration"))
+    for connections in args.connections:
+        entries = []
+        try:
+            for i in range(connections):
+                s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                s.bind(("127.0.0.1", 0))
+                entries.append(IdleEntry(s))
+
+            results = [(
+                "poll-rebuild",
+                measure_rebuild(create_server("poll", entries), args.iterations),
+            )]
+            for method in sorted(event_object.EVENT_OBJECTS.keys()):
+                if method == "select" and connections >= 1024:
+                    continue
+                results.append((
+                    method,
+                    measure_persistent(
+                        create_server(method, entries),
+                        args.iterations,
+                    ),
+                ))
+            for method, result in results:
+                print("%-12d %-12s %.1f" % (connections, method, result * 1e6))
+        finally:
+            for entry in entries:
+                entry.socket.close()
+
+
+if __name__ == "__main__":
+    __main__()
@@ -0,0 +1,148 @@
+#!/usr/bin/python
+## @package benchmarks.keep_alive_benchmark
+# Benchmark of frontend requests per second for small assets with and without keep-alive.
+## @file keep_alive_benchmark.py Implementation of @ref benchmarks.keep_alive_benchmark
+#
+# Starts a frontend on a local port and requests the small assets a browser
+# loads with the menu, with concurrent clients for a fixed time.
+# Without keep-alive every request opens a new connection, with keep-alive
+# every client sends all of its requests on one persistent connection.
+#
+# Usage: python -m benchmarks.keep_alive_benchmark [--clients 1 8] [--duration 5]
+#
+import argparse
+import ConfigParser
+import httplib
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks import worker_scaling_benchmark
+
+## Small assets requested by the benchmark.
+ASSETS = (
+    "/",
+    "/css/list.css",
+    "/css/status.css",
+    "/upload-icon.png",
+    "/favicon.ico",
+)
+
+## Parse args function.
+# @returns (dict) arguments and their values.
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--clients",
+        type=int,
+        nargs="+",
+        default=[1, 8],
+        help="Numbers of concurrent clients to measure. Default: %(default)s",
+    )
+    parser.add_argument(
+        "--duration",
+        type=float,
+        default=5,
+        help="Seconds to measure every mode and number of clients. Default: %(default)s",
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=18860,
+        help="Frontend port. Default: %(default)s",
+    )
+    return parser.parse_args()
+
+## Request assets until time is up.
+# @param port (int) frontend port.
+# @param keep_alive (bool) whether to send all requests on one connection.
+# @param deadline (float) time to stop at.
+# @returns (int) number of requests.
+def run_client(port, keep_alive, deadline):
+    requests = 0
+    connection = None
+    try:
+        while time.time() < deadline:
+            for uri in ASSETS:
+                if connection is None:
+                    connection = httplib.HTTPConnection("127.0.0.1", port, timeout=60)
+                connection.request(
+                    "GET",
+                    uri,
+                    headers={} if keep_alive else {"Connection": "close"},
+                )
+                response = connection.getresponse()
+                response.read()
+                if response.status != 200:
+                    raise RuntimeError("%s %s" % (uri, response.status))
+                if not keep_alive:
+                    connection.close()
+                    connection = None
+                requests += 1
+    finally:
+        if connection is not None:
+            connection.close()
+    return requests
+
+## Measure one mode and number of clients.
+# @param args (dict) arguments.
+# @param keep_alive (bool) whether clients keep their connections.
+# @param clients (int) number of clients.
+# @returns (float) requests per second.
+def measure(args, keep_alive, clients):
+    results = []
+    lock = threading.Lock()
+    deadline = time.time() + args.duration
+
+    def run(index):
+        result = run_client(args.port, keep_alive, deadline)
+        with lock:
+            results.append(result)
+
+    elapsed = worker_scaling_benchmark.run_clients(clients, run)
+    return sum(results) / elapsed
+
+def __main__():
+    args = parse_args()
+    directory = tempfile.mkdtemp()
+    config = ConfigParser.ConfigParser()
+    config.read("frontend/config.ini")
+    config.set("frontend", "bind.port", str(args.port))
+    fe_config = os.path.join(directory, "frontend.ini")
+    with open(fe_config, "w") as f:
+        config.write(f)
+
+    frontend = subprocess.Popen(
+        [
+            sys.executable, "-m", "frontend",
+            "--config", fe_config,
+            "--max-connections", str(max(args.clients) * 2),
+            "--log-file", os.devnull,
+        ],
+        stderr=worker_scaling_benchmark.DEVNULL,
+    )
+    try:
+        worker_scaling_benchmark.wait_port(args.port)
+        print("%-12s %-8s %s" % ("mode", "clients", "requests/s"))
+        for clients in args.clients:
+            for name, keep_alive in (
+                ("close", False),
+                ("keep-alive", True),
+            ):
+                print("%-12s %-8d %.1f" % (
+                    name,
+                    clients,
+                    measure(args, keep_alive, clients),
+                ))
+    finally:
+        frontend.terminate()
+        frontend.wait()
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    __main__()
@@ -0,0 +1,113 @@
+#!/usr/bin/python
+## @package benchmarks.recombine_benchmark
+# Microbenchmark of recombining a block from the parts read from the block devices.
+## @file recombine_benchmark.py Implementation of @ref benchmarks.recombine_benchmark
+#
+# Compares recombining byte by byte, creating a new block for every arriving part
+# (the old decrypt_data behaviour), with xor'ing every part into one accumulator,
+# with and without numpy, for 1 to 16 block devices.
+#
+# Usage: python -m benchmarks.recombine_benchmark [--copies 1 2 3 4 8 16] [--iterations 20]
+#
+import argparse
+import os
+import time
+
+from common import constants
+from common.utilities import integration_util
+
+## Parse args function.
+# @returns (dict) arguments and their values.
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--copies",
+        type=int,
+        nargs="+",
+        default=[1, 2, 3, 4, 8, 16],
+        help="Numbers of block devices to measure. Default: %(default)s",
+    )
+    parser.add_argument(
+        "--iterations",
+        type=int,
+        default=20,
+        help="Blocks recombined per measurement. Default: %(default)s",
+    )
+    return parser.parse_args()
+
+## Recombine a block byte by byte, the way decrypt_data used to for every reply.
+# @param parts (list) data parts.
+# @returns (bytearray) block.
+def recombine_bytes(parts):
+    block = bytearray(len(parts[0]))
+    for part in parts:
+        pair = [block, part]
+        block = bytearray(0)
+        for i in range(len(pair[0])):
+            byte_list = []
+            for d in pair:
+                byte_list.append(ord(d[i:i + 1]))
+            block += chr(integration_util.decrypt_byte(byte_list))
+    return block
+
+## Recombine a block into an accumulator.
+# @param parts (list) data parts.
+# @returns (bytearray) block.
+def recombine(parts):
+    block = bytearray(len(parts[0]))
+    for part in parts:
+        integration_util.xor_into(block, part)
+    return block
+
+## Recombine a block into an accumulator without numpy.
+# @param parts (list) data parts.
+# @returns (bytearray) block.
+def recombine_bulk(parts):
+    numpy = integration_util.numpy
+    integration_util.numpy = None
+    try:
+        return recombine(parts)
+    finally:
+        integration_util.numpy = numpy
+
+## Measure one recombination.
+# @param function (function) recombination function.
+# @param copies (int) number of parts.
+# @param iterations (int) number of blocks.
+# @returns (float) seconds per block.
+def measure(function, copies, iterations):
+    data = bytearray(os.urandom(constants.BLOCK_SIZE))
+    parts = [
+        str(bytearray(part)) for part in integration_util.encrypt_data(data, copies)
+    ]
+    if function(parts) != data:
+        raise RuntimeError("%d copies: block not recombined" % copies)
+    start = time.time()
+    for i in range(iterations):
+        function(parts)
+    return (time.time() - start) / iterations
+
+def __main__():
+    args = parse_args()
+    functions = [
+        ("bytes", recombine_bytes),
+        ("bulk", recombine_bulk),
+    ]
+    if integration_util.numpy is not None:
+        functions.append(("numpy", recombine))
+
+    print("%-8s %-8s %s" % ("copies", "combine", "usec/block"))
+    for copies in args.copies:
+        for name, function in functions:
+            iterations = args.iterations
+            if function is not recombine_bytes:
+                iterations *= 100
+            print("%-8d %-8s %.1f" % (
+                copies,
+                name,
+                measure(function, copies, iterations) * 1e6,
+            ))
+
+
+if __name__ == "__main__":
+    __main__()
@@ -0,0 +1,103 @@
+#!/usr/bin/python
+## @package benchmarks.router_benchmark
+# Microbenchmark of the per-connection cost of finding the service of a request.
+## @file router_benchmark.py Implementation of @ref benchmarks.router_benchmark
+#
+# Compares importing every service module on every connection and rebuilding the
+# registry from ServiceBase subclasses on every request (the old HttpSocket behaviour)
+# with the router built once at startup. Also measures the whole HttpSocket
+# construction and routing of one request, for scale.
+#
+# Usage: python -m benchmarks.router_benchmark [--iterations 100000]
+#
+import argparse
+import importlib
+import socket
+import time
+
+from common import async_server
+from common import constants
+from common import event_object
+from common.pollables.http_socket import HttpSocket
+from common.services import router
+from common.services import service_base
+
+## Request paths routed by the benchmark, the last one falls back to "*".
+PATHS = (
+    "/",
+    "/list",
+    "/download",
+    "/css/list.css",
+)
+
+## Parse args function.
+# @returns (dict) arguments and their values.
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--iterations",
+        type=int,
+        default=100000,
+        help="Connections per measurement. Default: %(default)s",
+    )
+    return parser.parse_args()
+
+## Find services the way HttpSocket used to.
+# @param iterations (int) number of connections.
+# @returns (float) seconds per connection.
+def measure_registry(iterations):
+    start = time.time()
+    for i in range(iterations):
+        for module in constants.MODULE_DICT[0]:
+            importlib.import_module(module)
+        registry = {
+            service.name(): service for service in service_base.ServiceBase.__subclasses__()
+        }
+        registry.get(PATHS[i % len(PATHS)], registry.get("*"))
+    return (time.time() - start) / iterations
+
+## Find services with the router.
+# @param iterations (int) number of connections.
+# @returns (float) seconds per connection.
+def measure_router(iterations):
+    services = router.Router(constants.MODULE_DICT[0])
+    start = time.time()
+    for i in range(iterations):
+        services.get(PATHS[i % len(PATHS)])
+    return (time.time() - start) / iterations
+
+## Construct HttpSocket objects and route one request each.
+# @param iterations (int) number of connections.
+# @returns (float) seconds per connection.
+def measure_http_socket(iterations):
+    app_context = {
+        "event_object": event_object.EVENT_OBJECTS["poll"],
+        "timeout": 0,
+        "idle_timeout": constants.IDLE_TIMEOUT,
+        "router": router.Router(constants.MODULE_DICT[0]),
+    }
+    server = async_server.Server(app_context)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        start = time.time()
+        for i in range(iterations):
+            entry = HttpSocket(sock, constants.ACTIVE, app_context, {})
+            app_context["router"].get(PATHS[i % len(PATHS)])
+            server.cancel_timer(entry._timer)
+        return (time.time() - start) / iterations
+    finally:
+        sock.close()
+
+def __main__():
+    args = parse_args()
+    print("%-14s %s" % ("method", "usec/connection"))
+    for name, measure in (
+        ("registry", measure_registry),
+        ("router", measure_router),
+        ("http-socket", measure_http_socket),
+    ):
+        print("%-14s %.2f" % (name, measure(args.iterations) * 1e6))
+
+
+if __name__ == "__main__":
+    __main__()
@@ -0,0 +1,156 @@
+#!/usr/bin/python
+## @package benchmarks.send_buffer_benchmark
+# Benchmark of bytes copied in user space while sending a download.
+## @file send_buffer_benchmark.py Implementation of @ref benchmarks.send_buffer_benchmark
+#
+# A download is produced as a status line, headers and a block per response call
+# into a request context send buffer, and sent on a socket that accepts a limited
+# window every loop iteration.
+# Compares the old string send buffer, which is concatenated on every append and
+# re-sliced after every send, with util.OutputQueue.
+#
+# Usage: python -m benchmarks.send_buffer_benchmark [--size 8] [--windows 65536 16384]
+#
+import argparse
+import errno
+import socket
+import time
+
+from common import constants
+from common.utilities import util
+
+## Window socket.
+# fake socket that accepts a limited number of bytes every loop iteration, without copying.
+class WindowSocket(object):
+    ## Constructor.
+    # @param window (int) bytes accepted every loop iteration.
+    def __init__(self, window):
+        self._window = window
+        self._left = window
+
+    ## Start the next loop iteration.
+    def next_iteration(self):
+        self._left = self._window
+
+    def send(self, data):
+        if not self._left:
+            raise socket.error(errno.EAGAIN, "Resource temporarily unavailable")
+        sent = min(len(data), self._left)
+        self._left -= sent
+        return sent
+
+## Parse args function.
+# @returns (dict) arguments and their values.
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--size",
+        type=int,
+        default=8,
+        help="Download size in MB. Default: %(default)s",
+    )
+    parser.add_argument(
+        "--burst",
+        type=int,
+        default=16,
+        help="Blocks produced every loop iteration. Default: %(default)s",
+    )
+    parser.add_argument(
+        "--windows",
+        type=int,
+        nargs="+",
+        default=[65536, 32768],
+        help="Bytes the socket accepts every loop iteration. Default: %(default)s",
+    )
+    return parser.parse_args()
+
+## Produce the parts of a download.
+# @param size (int) download size in bytes.
+# @returns (generator) status line, headers and then blocks.
+def produce(size):
+    yield "%s 200 OK\r\n" % constants.HTTP_SIGNATURE
+    yield "Content-Length: %d\r\nContent-Type: text/plain\r\n\r\n" % size
+    block = "x" * constants.BLOCK_SIZE
+    for i in range(size // constants.BLOCK_SIZE):
+        yield block
+
+## Send a download with a string send buffer.
+# @param sock (WindowSocket) socket.
+# @param size (int) download size in bytes.
+# @param burst (int) parts produced every loop iteration.
+# @returns (int) bytes copied.
+def run_string(sock, size, burst):
+    copied = 0
+    request_context = {"send_buffer": ""}
+    parts = produce(size)
+    done = False
+    while not done or request_context["send_buffer"]:
+        for i in range(burst):
+            part = next(parts, None)
+            if part is None:
+                done = True
+                break
+            request_context["send_buffer"] += part
+            copied += len(request_context["send_buffer"])
+        sock.next_iteration()
+        try:
+            while request_context["send_buffer"]:
+                request_context["send_buffer"] = request_context["send_buffer"][
+                    sock.send(request_context["send_buffer"]):
+                ]
+                copied += len(request_context["send_buffer"])
+        except socket.error as e:
+            if e.errno != errno.EAGAIN:
+                raise
+    return copied
+
+## Send a download with an output queue.
+# @param sock (WindowSocket) socket.
+# @param size (int) download size in bytes.
+# @param burst (int) parts produced every loop iteration.
+# @returns (int) bytes copied.
+def run_queue(sock, size, burst):
+    copied = 0
+    request_context = {"send_buffer": util.OutputQueue()}
+    parts = produce(size)
+    done = False
+    while not done or request_context["send_buffer"]:
+        for i in range(burst):
+            part = next(parts, None)
+            if part is None:
+                done = True
+                break
+            request_context["send_buffer"].append(part)
+            if len(part) < constants.OUTPUT_COALESCE_SIZE:
+                copied += len(part)
+        sock.next_iteration()
+        try:
+            while request_context["send_buffer"]:
+                request_context["send_buffer"].send(sock)
+        except socket.error as e:
+            if e.errno != errno.EAGAIN:
+                raise
+    return copied
+
+def __main__():
+    args = parse_args()
+    size = args.size * 1024 * 1024
+    print("%-8s %-8s %-18s %s" % ("buffer", "window", "copied bytes/MB", "msec/MB"))
+    for window in args.windows:
+        for name, function in (
+            ("string", run_string),
+            ("queue", run_queue),
+        ):
+            start = time.time()
+            copied = function(WindowSocket(window), size, args.burst)
+            elapsed = time.time() - start
+            print("%-8s %-8d %-18d %.2f" % (
+                name,
+                window,
+                copied // args.size,
+                elapsed * 1000 / args.size,
+            ))
+
+
+if __name__ == "__main__":
+    __main__()
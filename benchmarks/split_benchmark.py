@@ -0,0 +1,139 @@
+#!/usr/bin/python
+## @package benchmarks.split_benchmark
+# Microbenchmark of splitting a block to the parts stored on the block devices.
+## @file split_benchmark.py Implementation of @ref benchmarks.split_benchmark
+#
+# Compares splitting a block byte by byte with encrypt_byte (the old encrypt_data
+# behaviour) with the bulk split of encrypt_data, with and without numpy,
+# for 1 to 16 block devices.
+# Before measuring, checks that the parts are still what decrypt_data expects,
+# and that the bits and masks have the distribution of encrypt_byte.
+#
+# Usage: python -m benchmarks.split_benchmark [--copies 1 2 3 4 8 16] [--iterations 20]
+#
+import argparse
+import math
+import os
+import time
+
+from common import constants
+from common.utilities import integration_util
+
+## Parse args function.
+# @returns (dict) arguments and their values.
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--copies",
+        type=int,
+        nargs="+",
+        default=[1, 2, 3, 4, 8, 16],
+        help="Numbers of block devices to measure. Default: %(default)s",
+    )
+    parser.add_argument(
+        "--iterations",
+        type=int,
+        default=20,
+        help="Blocks split per measurement. Default: %(default)s",
+    )
+    return parser.parse_args()
+
+## Split data byte by byte, the way encrypt_data used to.
+# @param data (bytearray) data to split.
+# @param copies (int) copies to create.
+# @returns (list) data parts.
+def split_bytes(data, copies):
+    result = [bytearray(0) for i in range(copies)]
+    for byte in data:
+        bytes_to_add = integration_util.encrypt_byte(byte, copies)
+        for i in range(copies):
+            result[i] += chr(bytes_to_add[i])
+    return result
+
+## Check parts of a bulk split.
+# @param split (function) split function.
+# @param copies (int) copies to create.
+#
+# the parts must have the length of the data and xor to it.
+# with all bits set, the parts of two devices xor to the bits they were given, their
+# masks cancel out, so their share of bits must match the chance of a random byte
+# choosing them. the masks of the parts must be uniform bytes.
+#
+def check(split, copies):
+    for length in (0, 1, 17, constants.BLOCK_SIZE):
+        data = bytearray(os.urandom(length))
+        parts = split(data, copies)
+        if len(parts) != copies or any(len(part) != length for part in parts):
+            raise RuntimeError("%d copies: bad part length" % copies)
+        if length and integration_util.decrypt_data(parts) != data:
+            raise RuntimeError("%d copies: parts don't decrypt" % copies)
+
+    if copies < 3:
+        return
+    length = 64 * constants.BLOCK_SIZE
+    parts = split(bytearray("\xff" * length), copies)
+    bits = sum(
+        bin(a ^ b).count("1") for a, b in zip(bytearray(parts[0]), bytearray(parts[1]))
+    )
+    p = len([r for r in range(256) if r % copies in (0, 1)]) / 256.
+    expected = 8 * length * p
+    if abs(bits - expected) > 5 * math.sqrt(8 * length * p * (1 - p)):
+        raise RuntimeError("%d copies: bits of parts not distributed like encrypt_byte" % copies)
+
+    masks = bytearray(split(bytearray(length), copies)[0])
+    mean = float(sum(masks)) / length
+    if abs(mean - 127.5) > 5 * 73.9 / math.sqrt(length):
+        raise RuntimeError("%d copies: masks are not uniform" % copies)
+
+## Measure one split.
+# @param split (function) split function.
+# @param copies (int) copies to create.
+# @param iterations (int) number of blocks.
+# @returns (float) seconds per block.
+def measure(split, copies, iterations):
+    data = bytearray(os.urandom(constants.BLOCK_SIZE))
+    start = time.time()
+    for i in range(iterations):
+        split(data, copies)
+    return (time.time() - start) / iterations
+
+## Split data in bulk without numpy.
+# @param data (bytearray) data to split.
+# @param copies (int) copies to create.
+# @returns (list) data parts.
+def split_bulk(data, copies):
+    numpy = integration_util.numpy
+    integration_util.numpy = None
+    try:
+        return integration_util.encrypt_data(data, copies)
+    finally:
+        integration_util.numpy = numpy
+
+def __main__():
+    args = parse_args()
+    splits = [
+        ("bytes", split_bytes),
+        ("bulk", split_bulk),
+    ]
+    if integration_util.numpy is not None:
+        splits.append(("numpy", integration_util.encrypt_data))
+
+    for copies in args.copies:
+        for name, split in splits[1:]:
+            check(split, copies)
+
+    print("%-8s %-8s %s" % ("copies", "split", "usec/block"))
+    for copies in args.copies:
+        for name, split in splits:
+            iterations = args.iterations
+            if split is not split_bytes:
+                iterations *= 50
+            print("%-8d %-8s %.1f" % (
+                copies,
+                name,
+                measure(split, copies, iterations) * 1e6,
+            ))
+
+
+if __name__ == "__main__":
+    __main__()
@@ -0,0 +1,144 @@
+#!/usr/bin/python
+## @package benchmarks.static_file_benchmark
+# Benchmark of frontend static file serving throughput.
+## @file static_file_benchmark.py Implementation of @ref benchmarks.static_file_benchmark
+#
+# Starts a frontend on a local port and downloads the PNG assets under files/
+# with concurrent clients for a fixed time. Static files don't use the block
+# devices, so none are started.
+# Files are sent with sendfile where available (python 3 or the pysendfile
+# package), otherwise they are read in pieces by the output queue, the fallback
+# mode is printed with the results.
+#
+# Usage: python -m benchmarks.static_file_benchmark [--clients 1 4 16] [--duration 5]
+#
+import argparse
+import ConfigParser
+import glob
+import httplib
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks import worker_scaling_benchmark
+from common.utilities import util
+
+## Parse args function.
+# @returns (dict) arguments and their values.
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--clients",
+        type=int,
+        nargs="+",
+        default=[1, 4, 16],
+        help="Numbers of concurrent clients to measure. Default: %(default)s",
+    )
+    parser.add_argument(
+        "--duration",
+        type=float,
+        default=5,
+        help="Seconds to measure every number of clients. Default: %(default)s",
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=18870,
+        help="Frontend port. Default: %(default)s",
+    )
+    return parser.parse_args()
+
+## Download assets until time is up.
+# @param port (int) frontend port.
+# @param assets (dict) asset uri and its content.
+# @param deadline (float) time to stop at.
+# @returns (tuple) number of requests and bytes downloaded.
+def download(port, assets, deadline):
+    requests = 0
+    total = 0
+    while time.time() < deadline:
+        for uri, content in assets.items():
+            connection = httplib.HTTPConnection("127.0.0.1", port, timeout=60)
+            try:
+                connection.request("GET", uri)
+                data = connection.getresponse().read()
+            finally:
+                connection.close()
+            if data != content:
+                raise RuntimeError("%s downloaded corrupted" % uri)
+            requests += 1
+            total += len(data)
+    return requests, total
+
+## Measure one number of clients.
+# @param args (dict) arguments.
+# @param assets (dict) asset uri and its content.
+# @param clients (int) number of clients.
+# @returns (tuple) requests per second and bytes per second.
+def measure(args, assets, clients):
+    results = []
+    lock = threading.Lock()
+    deadline = time.time() + args.duration
+
+    def run(index):
+        result = download(args.port, assets, deadline)
+        with lock:
+            results.append(result)
+
+    elapsed = worker_scaling_benchmark.run_clients(clients, run)
+    return (
+        sum(r[0] for r in results) / elapsed,
+        sum(r[1] for r in results) / elapsed,
+    )
+
+def __main__():
+    args = parse_args()
+    assets = {}
+    for path in glob.glob("files/*.png"):
+        with open(path, "rb") as f:
+            assets["/%s" % os.path.basename(path)] = f.read()
+
+    directory = tempfile.mkdtemp()
+    config = ConfigParser.ConfigParser()
+    config.read("frontend/config.ini")
+    config.set("frontend", "bind.port", str(args.port))
+    fe_config = os.path.join(directory, "frontend.ini")
+    with open(fe_config, "w") as f:
+        config.write(f)
+
+    frontend = subprocess.Popen(
+        [
+            sys.executable, "-m", "frontend",
+            "--config", fe_config,
+            "--max-connections", str(max(args.clients) * 2),
+            "--log-file", os.devnull,
+        ],
+        stderr=worker_scaling_benchmark.DEVNULL,
+    )
+    try:
+        worker_scaling_benchmark.wait_port(args.port)
+        print("sending with %s, %d assets, %d bytes" % (
+            "sendfile" if util._sendfile is not None else "read",
+            len(assets),
+            sum(len(c) for c in assets.values()),
+        ))
+        print("%-8s %-14s %s" % ("clients", "requests/s", "MB/s"))
+        for clients in args.clients:
+            rate, throughput = measure(args, assets, clients)
+            print("%-8d %-14.1f %.1f" % (
+                clients,
+                rate,
+                throughput / 1024 / 1024,
+            ))
+    finally:
+        frontend.terminate()
+        frontend.wait()
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    __main__()
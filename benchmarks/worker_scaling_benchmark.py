@@ -0,0 +1,266 @@
+#!/usr/bin/python
+## @package benchmarks.worker_scaling_benchmark
+# Benchmark of frontend upload and download throughput with a growing number of worker processes.
+## @file worker_scaling_benchmark.py Implementation of @ref benchmarks.worker_scaling_benchmark
+#
+# Starts three block devices and a frontend on local ports, initializes the disks
+# and measures uploads and concurrent downloads for every number of workers.
+# An upload locks the disk exclusively, so uploads are sequential and mostly show
+# the per-request cost; downloads share the disk and show the scaling over cores.
+#
+# Usage: python -m benchmarks.worker_scaling_benchmark [--workers 1 2 4] [--clients 8]
+#
+import argparse
+import ConfigParser
+import httplib
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+## Number of block devices in the frontend config.
+DEVICES = 3
+## Output of the servers, connection probes make them log disconnections.
+DEVNULL = open(os.devnull, "w")
+
+## Parse args function.
+# @returns (dict) arguments and their values.
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--workers",
+        type=int,
+        nargs="+",
+        default=[1, 2, 4],
+        help="Numbers of frontend workers to measure. Default: %(default)s",
+    )
+    parser.add_argument(
+        "--clients",
+        type=int,
+        default=8,
+        help="Number of concurrent clients. Default: %(default)s",
+    )
+    parser.add_argument(
+        "--size",
+        type=int,
+        default=32768,
+        help="Size of every uploaded file in bytes. Default: %(default)s",
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=18880,
+        help="Frontend port, block devices use the following ports. Default: %(default)s",
+    )
+    return parser.parse_args()
+
+## Write config files of the block devices and the frontend.
+# @param directory (str) directory of configs and disks.
+# @param port (int) frontend port.
+# @returns (tuple) block device config paths and frontend config path.
+def write_configs(directory, port):
+    bd_configs = []
+    for i in range(1, DEVICES + 1):
+        config = ConfigParser.ConfigParser()
+        config.read("block_device/config.ini")
+        config.set("blockdevice", "bind.port", str(port + i))
+        config.set("blockdevice", "file.name", os.path.join(directory, "disk%d" % i))
+        config.set("blockdevice", "file.size", str(64 * 1024 * 1024))
+        path = os.path.join(directory, "bd%d.ini" % i)
+        with open(path, "w") as f:
+            config.write(f)
+        bd_configs.append(path)
+
+    config = ConfigParser.ConfigParser()
+    config.read("frontend/config.ini")
+    config.set("frontend", "bind.port", str(port))
+    for i in range(1, DEVICES + 1):
+        config.set("blockdevice.%d" % i, "port", str(port + i))
+    fe_config = os.path.join(directory, "frontend.ini")
+    with open(fe_config, "w") as f:
+        config.write(f)
+    return bd_configs, fe_config
+
+## Send a request to the frontend.
+# @param port (int) frontend port.
+# @param method (str) HTTP method.
+# @param uri (str) request uri.
+# @param body (str) request content.
+# @param headers (dict) request headers.
+# @returns (str) response content.
+def request(port, method, uri, body=None, headers={}):
+    connection = httplib.HTTPConnection("127.0.0.1", port, timeout=600)
+    try:
+        connection.request(method, uri, body, headers)
+        response = connection.getresponse()
+        data = response.read()
+        if response.status != 200:
+            raise RuntimeError("%s %s: %s" % (uri, response.status, data[:200]))
+        return data
+    finally:
+        connection.close()
+
+## Upload a file.
+# @param port (int) frontend port.
+# @param name (str) file name.
+# @param data (str) file content.
+def upload(port, name, data):
+    boundary = "benchmarkboundary"
+    body = (
+        "--%s\r\n"
+        "Content-Disposition: form-data; name=\"fileupload\"; filename=\"%s\"\r\n"
+        "Content-Type: application/octet-stream\r\n"
+        "\r\n"
+        "%s\r\n"
+        "--%s--\r\n"
+    ) % (boundary, name, data, boundary)
+    request(
+        port,
+        "POST",
+        "/fileupload?password=benchmark",
+        body,
+        {"Content-Type": "multipart/form-data; boundary=%s" % boundary},
+    )
+
+## Run concurrent clients.
+# @param clients (int) number of clients.
+# @param function (function) function every client runs with its index.
+# @returns (float) elapsed seconds.
+def run_clients(clients, function):
+    errors = []
+
+    def run(index):
+        try:
+            function(index)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [
+        threading.Thread(target=run, args=(i,)) for i in range(clients)
+    ]
+    start = time.time()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    if errors:
+        raise errors[0]
+    return time.time() - start
+
+## Wait for a port to accept connections.
+# @param port (int) port.
+def wait_port(port):
+    for i in range(100):
+        try:
+            connection = httplib.HTTPConnection("127.0.0.1", port)
+            connection.connect()
+            connection.close()
+            return
+        except Exception:
+            time.sleep(0.1)
+    raise RuntimeError("port %d is not listening" % port)
+
+## Measure one number of workers.
+# @param args (dict) arguments.
+# @param fe_config (str) frontend config path.
+# @param workers (int) number of workers.
+# @returns (tuple) upload and download throughput in bytes per second.
+def measure(args, fe_config, workers):
+    frontend = subprocess.Popen(
+        [
+            sys.executable, "-m", "frontend",
+            "--config", fe_config,
+            "--workers", str(workers),
+            "--max-connections", str(args.clients * 2),
+            "--log-file", os.devnull,
+        ],
+        stderr=DEVNULL,
+    )
+    try:
+        wait_port(args.port)
+        data = os.urandom(args.size)
+        names = ["w%d-%d" % (workers, i) for i in range(args.clients)]
+
+        # writers hold the disk exclusively, so uploads are sent one at a time
+        start = time.time()
+        for name in names:
+            upload(args.port, name, data)
+        up = time.time() - start
+
+        def download(i):
+            content = request(
+                args.port,
+                "GET",
+                "/download?password=benchmark&filename=%s" % names[i],
+            )
+            if content[:len(data)] != data:
+                raise RuntimeError("%s downloaded corrupted" % names[i])
+
+        down = run_clients(args.clients, download)
+
+        for name in names:
+            request(
+                args.port,
+                "GET",
+                "/delete?password=benchmark&filename=%s" % name,
+            )
+        total = args.clients * args.size
+        return total / up, total / down
+    finally:
+        frontend.terminate()
+        frontend.wait()
+
+def __main__():
+    args = parse_args()
+    directory = tempfile.mkdtemp()
+    devices = []
+    try:
+        bd_configs, fe_config = write_configs(directory, args.port)
+        for config in bd_configs:
+            devices.append(subprocess.Popen(
+                [
+                    sys.executable, "-m", "block_device",
+                    "--config", config,
+                    "--max-connections", str(args.clients * 4),
+                    "--log-file", os.devnull,
+                ],
+                stderr=DEVNULL,
+            ))
+        for i in range(1, DEVICES + 1):
+            wait_port(args.port + i)
+
+        frontend = subprocess.Popen(
+            [
+                sys.executable, "-m", "frontend",
+                "--config", fe_config,
+                "--log-file", os.devnull,
+            ],
+            stderr=DEVNULL,
+        )
+        try:
+            wait_port(args.port)
+            request(
+                args.port,
+                "GET",
+                "/init?password=admin&bitmaps=1&dir_roots=1",
+            )
+        finally:
+            frontend.terminate()
+            frontend.wait()
+
+        print("%-8s %-14s %s" % ("workers", "upload KB/s", "download KB/s"))
+        for workers in args.workers:
+            up, down = measure(args, fe_config, workers)
+            print("%-8d %-14.1f %.1f" % (workers, up / 1024, down / 1024))
+    finally:
+        for device in devices:
+            device.terminate()
+            device.wait()
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    __main__()
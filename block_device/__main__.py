@@ -13,7 +13,10 @@ import signal
 from common import async_server
 from common import constants
 from common import event_object
+from common.services import router
+from common.utilities import encryption_util
 from common.utilities import util
+from common.pollables import http_socket
 from common.pollables.http_socket import HttpSocket
 
 ## Daemon function.
@@ -39,8 +42,20 @@ def parse_args():
     parser.add_argument(
         "--max-connections",
         type=int,
-        default=10,
-        help="Number of connections the server accepts. Default: %(default)s",
+        default=100,
+        help="Number of concurrent connections the server accepts. Default: %(default)s",
+    )
+    parser.add_argument(
+        "--accept-batch",
+        type=int,
+        default=constants.ACCEPT_BATCH,
+        help="Maximum connections accepted in one loop iteration. Default: %(default)s",
+    )
+    parser.add_argument(
+        "--recv-window",
+        type=int,
+        default=constants.RECV_WINDOW,
+        help="Receive buffer size of a connection in bytes. Default: %(default)s",
     )
     parser.add_argument(
         "--log-file",
@@ -50,8 +65,38 @@ def parse_args():
     parser.add_argument(
         "--timeout",
         type=int,
-        default=0,
-        help="Optional server polling timeout",
+        default=-1,
+        help="Maximum server polling timeout in milliseconds, -1 to block until an event. Default: %(default)s",
+    )
+    parser.add_argument(
+        "--keep-alive-timeout",
+        type=float,
+        default=constants.KEEP_ALIVE_TIMEOUT,
+        help="Seconds a persistent connection may wait for its next request. Default: %(default)s",
+    )
+    parser.add_argument(
+        "--keep-alive-requests",
+        type=int,
+        default=constants.KEEP_ALIVE_REQUESTS,
+        help="Maximum requests on a persistent connection, 1 to close after every response. Default: %(default)s",
+    )
+    parser.add_argument(
+        "--idle-timeout",
+        type=float,
+        default=constants.IDLE_TIMEOUT,
+        help="Seconds a connection may make no progress. Default: %(default)s",
+    )
+    parser.add_argument(
+        "--header-timeout",
+        type=float,
+        default=constants.HEADER_TIMEOUT,
+        help="Seconds to receive request line and headers. Default: %(default)s",
+    )
+    parser.add_argument(
+        "--body-timeout",
+        type=float,
+        default=constants.BODY_TIMEOUT,
+        help="Seconds request content may stop arriving. Default: %(default)s",
     )
     parser.add_argument(
         "--foreground",
@@ -61,11 +106,9 @@ def parse_args():
     )
     parser.add_argument(
         "--event-method",
-        help="whether to use select instead of poll. Default: %s" % (
-            "select" if os.name == "nt" else "poll"
-        ),
-        choices=["select", "poll"],
-        default="select" if os.name == "nt" else "poll"
+        help="event method to use for polling. Default: %(default)s",
+        choices=sorted(event_object.EVENT_OBJECTS.keys()),
+        default=event_object.DEFAULT_EVENT_METHOD,
     ),
     parser.add_argument(
         "--config",
@@ -119,10 +162,7 @@ def __main__():
     signal.signal(signal.SIGINT, terminate)
     signal.signal(signal.SIGTERM, terminate)
 
-    poll_object = {
-        "poll": event_object.PollEvents,
-        "select": event_object.SelectEvents,
-    }[args.event_method]
+    poll_object = event_object.EVENT_OBJECTS[args.event_method]
 
     app_context = {
         "log": args.log_file,
@@ -130,10 +170,25 @@ def __main__():
         "bind_address": bind_address,
         "bind_port": bind_port,
         "timeout": args.timeout,
+        "idle_timeout": args.idle_timeout,
+        "keep_alive_timeout": args.keep_alive_timeout,
+        "keep_alive_requests": args.keep_alive_requests,
+        "header_timeout": args.header_timeout,
+        "body_timeout": args.body_timeout,
         "max_connections": args.max_connections,
+        "accept_batch": args.accept_batch,
+        "recv_window": args.recv_window,
         "sparse": sparse,
         "block_device": True,
         "config": Config,
+        "credentials": encryption_util.load_credentials(Config),
+        # the accepted authorization header is kept for the connection
+        "session_keys": http_socket.SESSION_KEYS + ("authenticated_header",),
+        "block_key": encryption_util.BlockKey(
+            Config.get('blockdevice', 'key'),
+            Config.get('blockdevice', 'ivkey'),
+        ),
+        "router": router.Router(constants.MODULE_DICT[1]),
         "admin": admin,
         "password_dict": {},
         "semaphore": multiprocessing.BoundedSemaphore(constants.MAX_SEMAPHORE),
@@ -1,4 +1,7 @@
 service_list = [
     "block_device_read_service",
+    "block_device_readv_service",
+    "block_device_upgrade_service",
     "block_device_write_service",
+    "block_device_writev_service",
 ]
\ No newline at end of file
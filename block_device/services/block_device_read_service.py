@@ -72,12 +72,8 @@ class BlockDeviceRead(ServiceBase):
                     if not read_buffer:
                         break
                     data += read_buffer
-            aes = encryption_util.get_aes(
-                key=request_context["app_context"]["config"].get(
-                    'blockdevice', 'key'),
-                ivkey=request_context["app_context"]["config"].get(
-                    'blockdevice', 'ivkey'),
-                block_num=request_context["block"],
+            aes = request_context["app_context"]["block_key"].get_aes(
+                request_context["block"],
             )
             data = encryption_util.decrypt_block_aes(aes, data)
 
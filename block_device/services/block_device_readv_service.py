@@ -0,0 +1,96 @@
+## @package block_device.services.block_device_readv_service
+#
+# Block device service for handling vectored block read requests.
+## @file block_device_readv_service.py Implementation of @ref block_device.services.block_device_readv_service
+import struct
+import urlparse
+
+from common import constants
+from common.utilities import util
+from common.services.service_base import ServiceBase
+from common.utilities import disk_util
+from common.utilities import encryption_util
+
+## Block device vectored read request handler class.
+# receives requests with several block numbers from authorized client and sends reply with all blocks content.
+# blocks are given as a list, blocks=a,b,c, or as a range, start=a&count=n.
+# every block in the reply is framed by its block number, blocks are sent once each in ascending order.
+class BlockDeviceReadv(ServiceBase):
+    ## Service name function.
+    # @returns (str) service name.
+    @staticmethod
+    def name():
+        return "/readv"
+
+    ## Function called before sending HTTP status.
+    #
+    # checks client authorization and parses block numbers from query string.
+    # all block numbers are checked before any block is read.
+    #
+    def before_response_status(
+        self,
+        request_context,
+    ):
+        if not encryption_util.check_login(request_context):
+            raise util.HTTPError(401, "Unathorized", "Bad block device authentication")
+        qs = urlparse.parse_qs(request_context["parsed"].query)
+        # the number of blocks is checked before the block numbers are built
+        try:
+            if "blocks" in qs:
+                blocks = qs["blocks"][0].split(",")
+                if len(blocks) > constants.READV_MAX_BLOCKS:
+                    raise util.HTTPError(500, "Invalid number of blocks")
+                blocks = [int(block) for block in blocks]
+            else:
+                start = int(qs["start"][0])
+                count = int(qs["count"][0])
+                if count < 1 or count > constants.READV_MAX_BLOCKS:
+                    raise util.HTTPError(500, "Invalid number of blocks")
+                blocks = xrange(start, start + count)
+        except (KeyError, ValueError, OverflowError):
+            raise util.HTTPError(500, "Invalid block numbers")
+        blocks = sorted(set(blocks))
+        disk_util.check_blocks(request_context["app_context"], blocks)
+        request_context["blocks"] = blocks
+
+    ## Function called before sending HTTP headers.
+    #
+    # updates content length header to match the framed blocks.
+    #
+    def before_response_headers(
+        self,
+        request_context,
+    ):
+        request_context["headers"][constants.CONTENT_LENGTH] = len(
+            request_context["blocks"]
+        ) * (constants.BLOCK_HEADER_SIZE + constants.BLOCK_SIZE)
+
+    ## Function called during HTTP resposne.
+    #
+    # reads the blocks from disk, decrypted with block device key, and sends them framed.
+    #
+    def response(
+        self,
+        request_context,
+    ):
+        if request_context["blocks"] is None:
+            return
+        blocks = disk_util.read_blocks(
+            request_context["app_context"],
+            request_context["blocks"],
+        )
+        frames = bytearray(0)
+        for block_num, block in zip(request_context["blocks"], blocks):
+            frames += struct.pack(">I", block_num)
+            frames += block
+        request_context["blocks"] = None
+        request_context["response"] = frames
+
+    ## Get header dictionary.
+    # @returns (dict) dictionary of wanted headers to parse.
+    def get_header_dict(
+        self,
+    ):
+        return {
+            constants.AUTHORIZATION: None,
+        }
@@ -0,0 +1,49 @@
+## @package block_device.services.block_device_upgrade_service
+#
+# Block device service for switching a connection to the binary block protocol.
+## @file block_device_upgrade_service.py Implementation of @ref block_device.services.block_device_upgrade_service
+
+from common import constants
+from common.utilities import util
+from common.services.service_base import ServiceBase
+from common.utilities import encryption_util
+from common.pollables.block_socket import BlockSocket
+
+## Block device upgrade request handler class.
+# receives an upgrade request from authorized client and switches the connection to the binary
+# block protocol, so the client is authenticated once for the whole connection.
+class BlockDeviceUpgrade(ServiceBase):
+    ## Service name function.
+    # @returns (str) service name.
+    @staticmethod
+    def name():
+        return "/upgrade"
+
+    ## Function called before sending HTTP status.
+    #
+    # checks client authorization and the requested protocol.
+    # the connection is taken over by a block socket once the response is sent.
+    #
+    def before_response_status(
+        self,
+        request_context,
+    ):
+        if not encryption_util.check_login(request_context):
+            raise util.HTTPError(401, "Unathorized", "Bad block device authentication")
+        if request_context["req_headers"].get("Upgrade") != constants.BLOCK_PROTOCOL:
+            raise util.HTTPError(500, "Internal Error", "Unsupported protocol")
+        request_context["code"] = 101
+        request_context["status"] = util.STATUS_CODES[101]
+        request_context["headers"]["Connection"] = "Upgrade"
+        request_context["headers"]["Upgrade"] = constants.BLOCK_PROTOCOL
+        request_context["upgrade"] = BlockSocket
+
+    ## Get header dictionary.
+    # @returns (dict) dictionary of wanted headers to parse.
+    def get_header_dict(
+        self,
+    ):
+        return {
+            constants.AUTHORIZATION: None,
+            "Upgrade": None,
+        }
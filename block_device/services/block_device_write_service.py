@@ -54,20 +54,17 @@ class BlockDeviceWrite(ServiceBase):
         self,
         request_context,
     ):
-        request_context["content_length"] -= len(
-            request_context["recv_buffer"])
-        self._data += request_context["recv_buffer"]
-        request_context["recv_buffer"] = ""
+        data = request_context["recv_buffer"].view(
+            request_context["content_length"])
+        request_context["content_length"] -= len(data)
+        self._data += data
+        request_context["recv_buffer"].consume(len(data))
 
         if request_context["content_length"] > 0:
             return False
 
-        aes = encryption_util.get_aes(
-            key=request_context["app_context"]["config"].get(
-                'blockdevice', 'key'),
-            ivkey=request_context["app_context"]["config"].get(
-                'blockdevice', 'ivkey'),
-            block_num=request_context["block"],
+        aes = request_context["app_context"]["block_key"].get_aes(
+            request_context["block"],
         )
         self._data = encryption_util.encrypt_block_aes(aes, self._data)
 
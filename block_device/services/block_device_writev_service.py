@@ -0,0 +1,88 @@
+## @package block_device.services.block_device_writev_service
+#
+# Block device service for handling vectored block write requests.
+## @file block_device_writev_service.py Implementation of @ref block_device.services.block_device_writev_service
+import struct
+
+from common import constants
+from common.utilities import util
+from common.services.service_base import ServiceBase
+from common.utilities import disk_util
+from common.utilities import encryption_util
+
+## Block device vectored write request handler class.
+# receives requests with several blocks from authorized client and writes every block to its index.
+# the content is a sequence of records, every block framed by its block number.
+# all records are checked before any block is written.
+class BlockDeviceWritev(ServiceBase):
+    ## Service name function.
+    # @returns (str) service name.
+    @staticmethod
+    def name():
+        return "/writev"
+
+    ## Function called before receiving HTTP content.
+    #
+    # checks client authorization and that content length matches whole records.
+    #
+    def before_request_content(
+        self,
+        request_context,
+    ):
+        if not encryption_util.check_login(request_context):
+            raise util.HTTPError(401, "Unathorized", "Bad block device authentication")
+        length = int(request_context["req_headers"].get("Content-Length"))
+        frame_size = constants.BLOCK_HEADER_SIZE + constants.BLOCK_SIZE
+        if (
+            length == 0 or
+            length % frame_size or
+            length / frame_size > constants.WRITEV_MAX_BLOCKS
+        ):
+            raise util.HTTPError(500, "Invalid number of blocks")
+        self._data = bytearray(0)
+
+    ## Function called during receive of HTTP content.
+    #
+    # receives all records until the end, then checks their block numbers.
+    # every block may be written once, a repeated block number fails the request.
+    # writes the blocks to disk, encrypted with AES and block device key.
+    #
+    def handle_content(
+        self,
+        request_context,
+    ):
+        data = request_context["recv_buffer"].view(
+            request_context["content_length"])
+        request_context["content_length"] -= len(data)
+        self._data += data
+        request_context["recv_buffer"].consume(len(data))
+
+        if request_context["content_length"] > 0:
+            return False
+
+        frame_size = constants.BLOCK_HEADER_SIZE + constants.BLOCK_SIZE
+        blocks = {}
+        for index in range(0, len(self._data), frame_size):
+            block = struct.unpack(
+                ">I",
+                str(self._data[index:index + constants.BLOCK_HEADER_SIZE]),
+            )[0]
+            if block in blocks:
+                raise util.HTTPError(500, "Invalid number of blocks")
+            blocks[block] = self._data[
+                index + constants.BLOCK_HEADER_SIZE:index + frame_size
+            ]
+        self._data = None
+        disk_util.check_blocks(request_context["app_context"], blocks)
+        disk_util.write_blocks(request_context["app_context"], blocks)
+        return None
+
+    ## Get header dictionary.
+    # @returns (dict) dictionary of wanted headers to parse.
+    def get_header_dict(
+        self,
+    ):
+        return {
+            constants.AUTHORIZATION: None,
+            constants.CONTENT_LENGTH: 0,
+        }
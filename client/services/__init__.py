@@ -1,4 +1,7 @@
 __all__ = [
     "bd_client_read",
+    "bd_client_readv",
+    "bd_client_upgrade",
     "bd_client_write",
+    "bd_client_writev",
 ]
\ No newline at end of file
@@ -2,7 +2,6 @@
 #
 # Client service for requesting block read from block device server.
 ## @file bd_client_read.py Implementation of @ref client.services.bd_client_read
-import base64
 import logging
 
 from common import constants
@@ -19,13 +18,13 @@ class BDClientRead(ServiceBase):
     def name():
         return constants.READ
 
-    ## Constructor.
+    ## Function called before sending HTTP status.
     # @param request_context (dict) request context.
     #
     # sets block read command with parameters provided from request context.
     # sets headers to match authorization with block device server.
     #
-    def __init__(
+    def before_response_status(
         self,
         request_context,
     ):
@@ -34,16 +33,19 @@ class BDClientRead(ServiceBase):
             request_context["block_num"],
             constants.HTTP_SIGNATURE
         )
-        request_context["send_buffer"] += cmd
-        parent_context = request_context["parent"].request_context
-        request_context["headers"]["Authorization"] = "Basic %s" % (
-            base64.b64encode(
-                "%s:%s" % (
-                    parent_context["user_to_send"],
-                    parent_context["password_to_send"],
-                )
-            )
-        )
+        request_context["send_buffer"].append(cmd)
+        request_context["headers"]["Authorization"] = request_context["app_context"][
+            "devices"
+        ][request_context["device"]]["authorization"]
+
+    ## Binary block protocol frame.
+    # @param request_context (dict) request context.
+    # @returns (tuple) operation, block index, count and payload of the request.
+    def frame(
+        self,
+        request_context,
+    ):
+        return constants.OP_READ, request_context["block_num"], 1, ""
 
     ## Function called before receiveing HTTP response.
     # cleans up block reference for later read.
@@ -62,9 +64,8 @@ class BDClientRead(ServiceBase):
         self,
         request_context,
     ):
-        data = request_context["recv_buffer"][:request_context["content_length"]]
-        request_context["recv_buffer"] = request_context["recv_buffer"][len(
-            data):]
+        data = request_context["recv_buffer"].read(
+            request_context["content_length"])
         request_context["block"] += data
         request_context["content_length"] -= len(data)
         if len(request_context["block"]) == constants.BLOCK_SIZE:
@@ -86,7 +87,10 @@ class BDClientRead(ServiceBase):
         self,
         request_context,
     ):
-        request_context["parent"].on_finish(block=request_context["block"])
+        request_context["parent"].on_finish(
+            block=request_context["block"],
+            block_num=request_context["block_num"],
+        )
 
     ## Get header dictionary.
     # @returns (dict) dictionary of wanted headers to parse.
@@ -0,0 +1,144 @@
+## @package client.services.bd_client_readv
+#
+# Client service for requesting vectored block read from block device server.
+## @file bd_client_readv.py Implementation of @ref client.services.bd_client_readv
+import struct
+
+from common import constants
+from common.services.service_base import ServiceBase
+
+## Client vectored read service class.
+#
+# requests read of several blocks at once from block device, then wakes up parent server
+# with all of them.
+#
+class BDClientReadv(ServiceBase):
+    ## Class name.
+    # @returns (str) name.
+    @staticmethod
+    def name():
+        return constants.READV
+
+    ## Constructor.
+    # @param request_context (dict) request context.
+    # sorts the block numbers of request context, the order blocks are sent in.
+    def __init__(
+        self,
+        request_context,
+    ):
+        request_context["block_num"] = sorted(set(request_context["block_num"]))
+
+    ## Function called before sending HTTP status.
+    # @param request_context (dict) request context.
+    #
+    # sets vectored read command with the block numbers of request context,
+    # contiguous blocks are requested as a range.
+    # sets headers to match authorization with block device server.
+    #
+    def before_response_status(
+        self,
+        request_context,
+    ):
+        block_nums = request_context["block_num"]
+        if block_nums == range(block_nums[0], block_nums[0] + len(block_nums)):
+            query = "start=%d&count=%d" % (block_nums[0], len(block_nums))
+        else:
+            query = "blocks=%s" % ",".join(str(block_num) for block_num in block_nums)
+        cmd = "GET /%s?%s %s\r\n" % (
+            "readv",
+            query,
+            constants.HTTP_SIGNATURE
+        )
+        request_context["send_buffer"].append(cmd)
+        request_context["headers"]["Authorization"] = request_context["app_context"][
+            "devices"
+        ][request_context["device"]]["authorization"]
+
+    ## Binary block protocol frame.
+    # @param request_context (dict) request context.
+    # @returns (tuple) operation, block index, count and payload of the request.
+    def frame(
+        self,
+        request_context,
+    ):
+        block_nums = request_context["block_num"]
+        return (
+            constants.OP_READV,
+            0,
+            len(block_nums),
+            struct.pack(">%dI" % len(block_nums), *block_nums),
+        )
+
+    ## Function called before receiveing HTTP response.
+    # cleans up block reference for later read.
+    def before_request_content(
+        self,
+        request_context,
+    ):
+        super(BDClientReadv, self).before_request_content(request_context)
+        request_context["block"] = bytearray(0)
+
+    ## Function called during receiving HTTP response.
+    # adds read data to block until the whole response is received.
+    # @returns None if finished, (bool) True if there's more data in received buffer,
+    # (bool) False if needs to receive more data in response.
+    def handle_content(
+        self,
+        request_context,
+    ):
+        data = request_context["recv_buffer"].read(
+            request_context["content_length"])
+        request_context["block"] += data
+        request_context["content_length"] -= len(data)
+        if request_context["content_length"] == 0:
+            return None
+        else:
+            return bool(request_context["recv_buffer"])
+
+    ## Function called before sending HTTP headers.
+    # overrides service base function to not send content length for nothing.
+    def before_response_headers(
+        self,
+        request_context,
+    ):
+        return
+
+    ## Function called before service termination
+    # splits the response to its blocks and wakes up parent with all of them.
+    # a response missing any requested block wakes up parent with an error.
+    def before_terminate(
+        self,
+        request_context,
+    ):
+        data = request_context["block"]
+        frame_size = constants.BLOCK_HEADER_SIZE + constants.BLOCK_SIZE
+        blocks = {}
+        for index in range(0, len(data) - frame_size + 1, frame_size):
+            block_num = struct.unpack(
+                ">I",
+                str(data[index:index + constants.BLOCK_HEADER_SIZE]),
+            )[0]
+            blocks[block_num] = data[
+                index + constants.BLOCK_HEADER_SIZE:index + frame_size
+            ]
+        if sorted(blocks) != request_context["block_num"]:
+            request_context["parent"].on_finish(
+                error=RuntimeError(
+                    "Incomplete vectored read from block device %s" % (
+                        request_context["device"],
+                    )
+                ),
+            )
+            return
+        request_context["parent"].on_finish(
+            blocks=blocks,
+        )
+
+    ## Get header dictionary.
+    # @returns (dict) dictionary of wanted headers to parse.
+    def get_header_dict(
+        self,
+    ):
+        return {
+            constants.CONTENT_LENGTH: 0
+        }
@@ -0,0 +1,68 @@
+## @package client.services.bd_client_upgrade
+#
+# Client service for switching a block device connection to the binary block protocol.
+## @file bd_client_upgrade.py Implementation of @ref client.services.bd_client_upgrade
+
+from common import constants
+from common.services.service_base import ServiceBase
+
+## Client upgrade service class.
+#
+# requests the block device to switch the connection to the binary block protocol.
+# the request authenticates the connection, it doesn't wake up the parent.
+#
+class BDClientUpgrade(ServiceBase):
+    ## Class name.
+    # @returns (str) name.
+    @staticmethod
+    def name():
+        return constants.UPGRADE
+
+    ## Function called before sending HTTP status.
+    # @param request_context (dict) request context.
+    #
+    # sets upgrade command and headers, with authorization with block device server.
+    #
+    def before_response_status(
+        self,
+        request_context,
+    ):
+        cmd = "GET /%s %s\r\n" % (
+            "upgrade",
+            constants.HTTP_SIGNATURE
+        )
+        request_context["send_buffer"].append(cmd)
+        request_context["headers"]["Connection"] = "Upgrade"
+        request_context["headers"]["Upgrade"] = constants.BLOCK_PROTOCOL
+        request_context["headers"]["Authorization"] = request_context["app_context"][
+            "devices"
+        ][request_context["device"]]["authorization"]
+
+    ## Function called before receiveing HTTP content.
+    # makes sure the block device switched to the requested protocol.
+    def before_request_content(
+        self,
+        request_context,
+    ):
+        if request_context["req_headers"].get("Upgrade") != constants.BLOCK_PROTOCOL:
+            raise RuntimeError(
+                "Block device %s did not switch protocols" % request_context["device"]
+            )
+
+    ## Function called before sending HTTP headers.
+    # overrides service base function to not send content length for nothing.
+    def before_response_headers(
+        self,
+        request_context,
+    ):
+        return
+
+    ## Get header dictionary.
+    # @returns (dict) dictionary of wanted headers to parse.
+    def get_header_dict(
+        self,
+    ):
+        return {
+            constants.CONTENT_LENGTH: 0,
+            "Upgrade": None,
+        }
@@ -2,7 +2,6 @@
 #
 # Client service for requesting block write to block device server
 ## @file bd_client_write.py Implementation of @ref client.services.bd_client_write
-import base64
 import logging
 
 from common import constants
@@ -19,13 +18,13 @@ class BDClientWrite(ServiceBase):
     def name():
         return constants.WRITE
 
-    ## Constructor.
+    ## Function called before sending HTTP status.
     # @param request_context (dict) request context.
     #
     # sets block write command with parameters provided from request context.
     # sets headers to match authorization with block device server.
     #
-    def __init__(
+    def before_response_status(
         self,
         request_context,
     ):
@@ -34,15 +33,28 @@ class BDClientWrite(ServiceBase):
             request_context["block_num"],
             constants.HTTP_SIGNATURE
         )
-        request_context["send_buffer"] += cmd
-        parent_context = request_context["parent"].request_context
-        request_context["headers"]["Authorization"] = "Basic %s" % (
-            base64.b64encode(
-                "%s:%s" % (
-                    parent_context["user_to_send"],
-                    parent_context["password_to_send"],
-                )
-            )
+        request_context["send_buffer"].append(cmd)
+        request_context["headers"]["Authorization"] = request_context["app_context"][
+            "devices"
+        ][request_context["device"]]["authorization"]
+
+    ## Binary block protocol frame.
+    # @param request_context (dict) request context.
+    # @returns (tuple) operation, block index, count and payload of the request.
+    # the block is padded to block size.
+    def frame(
+        self,
+        request_context,
+    ):
+        block = request_context["block"]
+        request_context["block"] = ""
+        if len(block) < constants.BLOCK_SIZE:
+            block = bytearray(block) + bytearray(constants.BLOCK_SIZE - len(block))
+        return (
+            constants.OP_WRITE,
+            request_context["block_num"],
+            1,
+            block,
         )
 
     ## Function called before sending HTTP headers.
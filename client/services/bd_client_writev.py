@@ -0,0 +1,112 @@
+## @package client.services.bd_client_writev
+#
+# Client service for requesting vectored block write to block device server
+## @file bd_client_writev.py Implementation of @ref client.services.bd_client_writev
+import struct
+
+from common import constants
+from common.services.service_base import ServiceBase
+
+## Client vectored write service class.
+#
+# requests write of several blocks at once to block device.
+# block numbers are in request context block num, and the blocks in request context block.
+#
+class BDClientWritev(ServiceBase):
+    ## Class name.
+    # @returns (str) name.
+    @staticmethod
+    def name():
+        return constants.WRITEV
+
+    ## Constructor.
+    # @param request_context (dict) request context.
+    # frames every block with its block number.
+    def __init__(
+        self,
+        request_context,
+    ):
+        frames = bytearray(0)
+        for block_num, block in zip(
+            request_context["block_num"],
+            request_context["block"],
+        ):
+            frames += struct.pack(">I", block_num)
+            frames += block
+            frames += bytearray(constants.BLOCK_SIZE - len(block))
+        request_context["block"] = frames
+
+    ## Function called before sending HTTP status.
+    # @param request_context (dict) request context.
+    #
+    # sets vectored write command.
+    # sets headers to match authorization with block device server.
+    #
+    def before_response_status(
+        self,
+        request_context,
+    ):
+        cmd = "GET /%s %s\r\n" % (
+            "writev",
+            constants.HTTP_SIGNATURE
+        )
+        request_context["send_buffer"].append(cmd)
+        request_context["headers"]["Authorization"] = request_context["app_context"][
+            "devices"
+        ][request_context["device"]]["authorization"]
+
+    ## Binary block protocol frame.
+    # @param request_context (dict) request context.
+    # @returns (tuple) operation, block index, count and payload of the request.
+    def frame(
+        self,
+        request_context,
+    ):
+        frames = request_context["block"]
+        request_context["block"] = ""
+        return (
+            constants.OP_WRITEV,
+            0,
+            len(request_context["block_num"]),
+            frames,
+        )
+
+    ## Function called before sending HTTP headers.
+    # sets proper content length header.
+    def before_response_headers(
+        self,
+        request_context,
+    ):
+        request_context["headers"][constants.CONTENT_LENGTH] = len(
+            request_context["block"]
+        )
+
+    ## Function called during sending HTTP content.
+    # sends to server the framed blocks provided by parent.
+    def response(
+        self,
+        request_context,
+    ):
+        if request_context["block"]:
+            data = request_context["block"]
+            request_context["block"] = ""
+            return data
+        else:
+            return None
+
+    ## Function called before service termination
+    # wakes up parent once all blocks are written.
+    def before_terminate(
+        self,
+        request_context,
+    ):
+        request_context["parent"].on_finish()
+
+    ## Get header dictionary.
+    # @returns (dict) dictionary of wanted headers to parse.
+    def get_header_dict(
+        self,
+    ):
+        return {
+            constants.CONTENT_LENGTH: 0
+        }
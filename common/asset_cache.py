@@ -0,0 +1,193 @@
+## @package common.asset_cache
+# Cache of static assets served by the frontend.
+## @file asset_cache.py Implementation of @ref common.asset_cache
+import gzip
+import hashlib
+import io
+import os
+import time
+
+from common import constants
+from common.utilities import util
+
+## Asset.
+#
+# Content of a cached file with its strong ETag and gzip variant.
+# The gzip variant is None when compressing doesn't make the file smaller.
+#
+class Asset(object):
+    ## Constructor.
+    # @param content (str) file content.
+    # @param stat (stat_result) stat of the file when it was read.
+    # @param checked (float) time of the stat.
+    def __init__(
+        self,
+        content,
+        stat,
+        checked,
+    ):
+        self.content = content
+        self.key = stat_key(stat)
+        self.checked = checked
+        digest = hashlib.sha1(content).hexdigest()
+        self.etag = '"%s"' % digest
+        self.gzip = None
+        self.gzip_etag = None
+        compressed = compress(content)
+        if len(compressed) < len(content):
+            self.gzip = compressed
+            self.gzip_etag = '"%s-gzip"' % digest
+
+## Asset cache.
+#
+# Keeps the content of small files keyed by their normalized path.
+# A cached file is checked with stat at most once every check interval, and is
+# read again when its mtime, size or inode changed, so most requests for an
+# asset don't touch the disk at all.
+# Files larger than the maximum size are not cached.
+#
+class AssetCache(object):
+    ## Constructor.
+    # @param check_interval (float) seconds between stat checks of an asset.
+    # @param max_size (int) maximum size of a cached file in bytes.
+    def __init__(
+        self,
+        check_interval=constants.ASSET_CHECK_INTERVAL,
+        max_size=constants.ASSET_MAX_SIZE,
+    ):
+        self._check_interval = check_interval
+        self._max_size = max_size
+        self._assets = {}
+
+    ## Get asset.
+    # @param path (str) normalized file path.
+    # @returns (Asset) asset, None if the file is too large to be cached.
+    #
+    # errors of stat or read, such as a missing file, are raised to the caller.
+    #
+    def get(
+        self,
+        path,
+    ):
+        now = time.time()
+        asset = self._assets.get(path)
+        if asset is not None and now - asset.checked < self._check_interval:
+            return asset
+
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self._assets.pop(path, None)
+            raise
+        if asset is not None and asset.key == stat_key(stat):
+            asset.checked = now
+            return asset
+
+        self._assets.pop(path, None)
+        if stat.st_size > self._max_size:
+            return None
+        with util.FDOpen(path, os.O_RDONLY) as fd:
+            content = read_all(fd, stat.st_size)
+            # the file may be replaced while reading it
+            if stat_key(os.fstat(fd)) != stat_key(stat):
+                return None
+        asset = self._assets[path] = Asset(content, stat, now)
+        return asset
+
+## Stat key.
+# @param stat (stat_result) stat of file.
+# @returns (tuple) fields that change when a file is modified or replaced.
+def stat_key(stat):
+    return (stat.st_mtime, stat.st_size, stat.st_ino)
+
+## Read all file content.
+# @param fd (int) file descriptor.
+# @param size (int) file size.
+# @returns (str) content.
+def read_all(fd, size):
+    parts = []
+    while size > 0:
+        buf = os.read(fd, size)
+        if not buf:
+            break
+        parts.append(buf)
+        size -= len(buf)
+    return b"".join(parts)
+
+## Compress with gzip.
+# @param content (str) content.
+# @returns (str) gzip compressed content.
+#
+# the gzip header holds no time, so the result only depends on the content.
+#
+def compress(content):
+    buf = io.BytesIO()
+    f = gzip.GzipFile(fileobj=buf, mode="wb", compresslevel=9, mtime=0)
+    try:
+        f.write(content)
+    finally:
+        f.close()
+    return buf.getvalue()
+
+## Whether gzip encoding is accepted.
+# @param accept_encoding (str) Accept-Encoding header value.
+# @returns (bool) true if gzip or any encoding is accepted with a non zero quality.
+def accepts_gzip(accept_encoding):
+    if not accept_encoding:
+        return False
+    for coding in accept_encoding.split(","):
+        params = coding.split(";")
+        if params[0].strip().lower() not in ("gzip", "*"):
+            continue
+        quality = 1.0
+        for param in params[1:]:
+            name, sep, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0
+        return quality > 0
+    return False
+
+## Whether an ETag matches an If-None-Match header.
+# @param etag (str) ETag.
+# @param if_none_match (str) If-None-Match header value.
+# @returns (bool) true if the header is "*" or lists the ETag, weak or strong.
+def etag_matches(etag, if_none_match):
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag == etag or tag == "W/" + etag:
+            return True
+    return False
+
+## Respond with asset.
+# @param request_context (dict) request context.
+# @param asset (Asset) asset.
+# @returns (str) response content.
+#
+# picks the gzip variant when the client accepts it and sets the response
+# headers. answers 304 with no content when If-None-Match lists the ETag of
+# the picked variant.
+#
+def respond(
+    request_context,
+    asset,
+):
+    content = asset.content
+    etag = asset.etag
+    if asset.gzip is not None:
+        request_context["headers"]["Vary"] = "Accept-Encoding"
+        if accepts_gzip(request_context["req_headers"].get("Accept-Encoding")):
+            content = asset.gzip
+            etag = asset.gzip_etag
+            request_context["headers"]["Content-Encoding"] = "gzip"
+    request_context["headers"]["ETag"] = etag
+    request_context["headers"][constants.CONTENT_LENGTH] = len(content)
+    if etag_matches(etag, request_context["req_headers"].get("If-None-Match")):
+        request_context["code"] = 304
+        request_context["status"] = util.STATUS_CODES[304]
+        return ""
+    return content
@@ -1,24 +1,29 @@
 ## @package common.async_server
 # Server for handling asynchronous I/O.
 ## @file async_server.py Implementation of @ref common.async_server
+import collections
 import errno
 import logging
 import select
+import time
 import traceback
 
 from common import constants
+from common.timer_wheel import TimerWheel
 from common.pollables import http_socket
+from common.pollables.self_pipe import SelfPipe
 from common.pollables.tcp_listener import TCPListener
 
 ## Asynchronous Server.
 #
 # Handles events of all participating sockets.
+# Only entries that are marked runnable are idled on every loop iteration,
+# so the cost of an iteration follows the active work and not the number of connections.
+# The server blocks in the poller while nothing is runnable or due, and is woken up through a self pipe.
+# Timeouts are kept in a timer wheel and expired after every poll.
 #
 class Server(object):
 
-    ## Database of all participating sockets.
-    _fd_dict = {}
-
     ## Whether to terminate server.
     _terminate = False
 
@@ -31,17 +36,30 @@ class Server(object):
     ):
         self._event_object = app_context["event_object"]
         self._timeout = app_context["timeout"]
+        self._idle_budget = app_context.get("idle_budget", constants.IDLE_BUDGET)
         self._app_context = app_context
+        self._app_context["server"] = self
+        self._fd_dict = {}
+        self._poller = self._event_object()
+        self._masks = {}
+        self._ready = collections.deque()
+        self._ready_set = set()
+        self._timers = TimerWheel()
+        self._self_pipe = SelfPipe()
+        self._fd_dict[self._self_pipe.fileno()] = self._self_pipe
+        self.schedule(self._self_pipe)
 
     ## Add listener.
     # create TCPListener object,
     # add it to fd dictionary.
+    # @param sock (socket) optional already listening socket.
     #
     def add_listener(
         self,
         bind_address,
         bind_port,
         initiate,
+        sock=None,
     ):
         listener = TCPListener(
             bind_address,
@@ -49,22 +67,76 @@ class Server(object):
             initiate,
             app_context=self._app_context,
             fd_dict=self._fd_dict,
+            sock=sock,
         )
         self._fd_dict[listener.fileno()] = listener
+        self.schedule(listener)
 
     ## Stop server function.
+    # may be called from a signal handler, so it only raises the flag and wakes up the loop.
     def stop(self, signum, frame):
         self._terminate = True
+        self.wake_up()
+
+    ## Wake up the server loop.
+    # @param function (function) optional function to call from the server loop.
+    #
+    # safe to call from signal handlers and other threads.
+    #
+    def wake_up(self, function=None):
+        self._self_pipe.wake_up(function)
+
+    ## Arm a timer.
+    # @param delay (float) seconds until expiry.
+    # @param callback (function) function to call from the server loop on expiry.
+    # @returns (Timer) timer that can be passed to cancel_timer().
+    #
+    def add_timer(self, delay, callback):
+        return self._timers.add(delay, callback)
+
+    ## Cancel a timer.
+    # @param timer (Timer) timer returned by add_timer(), may be None or already expired.
+    #
+    def cancel_timer(self, timer):
+        self._timers.cancel(timer)
+
+    ## Mark an entry as runnable.
+    # @param entry (Pollable) entry.
+    #
+    # called when something changed for the entry: it was created, received data,
+    # drained it's send buffer or was woken up by a client.
+    # the entry will be idled on the next loop iteration.
+    #
+    def schedule(self, entry):
+        if entry not in self._ready_set:
+            self._ready_set.add(entry)
+            self._ready.append(entry)
 
     ## Unregister an entry.
     # deletes entry from fd dict,
     # raises close flag on entry,
     # sets entry to closing state.
+    # errors while closing are logged, so a peer that reset the connection
+    # does not take the server down.
+    # @param entry (Pollable) entry.
+    # @param fd (int) fd the entry is registered with, by default the fd of the entry.
     #
-    def _unregister(self, entry):
-        logging.debug("Unregistered fd %s\n", entry.fileno())
-        del self._fd_dict[entry.fileno()]
-        entry.on_close()
+    def _unregister(self, entry, fd=None):
+        if fd is None:
+            fd = entry.fileno()
+        logging.debug("Unregistered fd %s\n", fd)
+        if fd in self._masks:
+            del self._masks[fd]
+            try:
+                self._poller.unregister(fd)
+            except (IOError, OSError):
+                # a closed fd has already left the poller
+                pass
+        del self._fd_dict[fd]
+        try:
+            entry.on_close()
+        except Exception:
+            logging.error(traceback.format_exc())
         entry.request_context["state"] = constants.CLOSING
 
     ## Terminate the server.
@@ -75,34 +147,162 @@ class Server(object):
         self._terminate = False
         for entry in self._fd_dict.values():
             entry.request_context["state"] = constants.CLOSING
+            self.schedule(entry)
 
-    ## Create a new poller object.
-    # @returns (dict) key - socket fd, value - event.
-    # for each entry, decide it's mask according to the state and register in poller object.
+    ## Get the event mask of an entry.
+    # @param entry (Pollable) entry.
+    # @returns (int) event mask according to entry state and buffers, None if entry should not be polled.
     #
-    def create_poller(self):
-        poller = self._event_object()
-        for entry in self._fd_dict.values():
-            if entry.request_context["state"] == constants.SLEEPING:
-                continue
-            mask = select.POLLERR
-            if (
-                entry.request_context["send_buffer"]
-            ):
-                mask |= select.POLLOUT
-            if (
-                entry.request_context["state"] == constants.LISTENER or
-                (
-                    entry.request_context["state"] == constants.ACTIVE and
-                    len(entry.request_context["recv_buffer"]
-                        ) < constants.BLOCK_SIZE
-                )
-            ):
-                mask |= select.POLLIN
-            poller.register(
-                entry.fileno(), mask
+    def _get_mask(self, entry):
+        if entry.request_context["state"] == constants.SLEEPING:
+            return None
+        mask = select.POLLERR
+        if (
+            entry.request_context["send_buffer"]
+        ):
+            mask |= select.POLLOUT
+        if (
+            entry.request_context["state"] == constants.LISTENER or
+            (
+                entry.request_context["state"] == constants.ACTIVE and
+                not entry.request_context["recv_buffer"].full()
             )
-        return poller
+        ):
+            mask |= select.POLLIN
+        return mask
+
+    ## Update the poller with the mask of an entry.
+    # @param entry (Pollable) entry.
+    #
+    # entries are registered once, and the poller is only modified when an entry's mask changes.
+    # sleeping entries are removed from the poller until they wake up.
+    #
+    def _update_mask(self, entry):
+        fd = entry.fileno()
+        mask = self._get_mask(entry)
+        old_mask = self._masks.get(fd)
+        if mask == old_mask:
+            return
+        if mask is None:
+            del self._masks[fd]
+            self._poller.unregister(fd)
+        elif old_mask is None:
+            self._masks[fd] = mask
+            self._poller.register(fd, mask)
+        else:
+            self._masks[fd] = mask
+            self._poller.modify(fd, mask)
+
+    ## Whether an entry is done and should be unregistered.
+    # @param entry (Pollable) entry.
+    # @returns (bool) true if entry is closing and has nothing left to send.
+    #
+    def _is_done(self, entry):
+        return (
+            entry.request_context["state"] == constants.CLOSING and
+            not entry.request_context["send_buffer"]
+        )
+
+    ## Get the fd an entry is registered with.
+    # @param entry (Pollable) entry.
+    # @returns (int) fd of the entry in the fd dict, None if the entry isn't registered.
+    #
+    # an entry whose socket was already closed can't tell it's fd anymore, its fileno
+    # fails or is negative, so it is looked up in the fd dict instead.
+    #
+    def _registered_fd(self, entry):
+        try:
+            fd = entry.fileno()
+        except Exception:
+            fd = -1
+        if fd >= 0:
+            if self._fd_dict.get(fd) is not entry:
+                return None
+            return fd
+        for fd, registered in self._fd_dict.items():
+            if registered is entry:
+                return fd
+        return None
+
+    ## Run all runnable entries.
+    #
+    # each entry that was marked runnable before this call is idled until it waits for I/O,
+    # goes to sleep or uses up it's idle budget. entries that used up their budget stay runnable
+    # for the next iteration, so one busy entry can't starve the others.
+    # after idling, closed entries are unregistered and the masks of the rest are updated.
+    # an entry that fails is unregistered, the other entries keep running.
+    #
+    def _run_ready(self):
+        for i in range(len(self._ready)):
+            entry = self._ready.popleft()
+            self._ready_set.discard(entry)
+            try:
+                fd = self._registered_fd(entry)
+                if fd is None:
+                    continue
+                if self._is_done(entry):
+                    self._unregister(entry, fd)
+                    continue
+                budget = self._idle_budget
+                while entry.request_context["state"] != constants.SLEEPING:
+                    if not budget:
+                        self.schedule(entry)
+                        break
+                    budget -= 1
+                    if not entry.on_idle():
+                        break
+                if self._is_done(entry):
+                    self._unregister(entry, fd)
+                else:
+                    self._update_mask(entry)
+            except Exception as e:
+                logging.error(traceback.format_exc())
+                fd = self._registered_fd(entry)
+                if fd is not None:
+                    self._unregister(entry, fd)
+
+    ## Poll for events and handle them.
+    # @param timeout (int) poll timeout.
+    #
+    # every entry that had an event is marked runnable for the next iteration.
+    #
+    def _poll(self, timeout):
+        try:
+            for fd, flag in self._poller.poll(timeout):
+                entry = self._fd_dict.get(fd)
+                if entry is None:
+                    continue
+                try:
+                    if flag & (select.POLLHUP | select.POLLERR):
+                        raise RuntimeError(
+                            "socket hung up or experienced error"
+                        )
+                    if flag & select.POLLIN:
+                        entry.on_read()
+                    if flag & select.POLLOUT:
+                        entry.on_write()
+                    self.schedule(entry)
+                except Exception as e:
+                    logging.error(traceback.format_exc())
+                    self._unregister(entry)
+        except (select.error, IOError) as e:
+            if e.args[0] != errno.EINTR:
+                raise
+
+    ## Get poll timeout.
+    # @returns (int) poll timeout in milliseconds, negative to block until an event.
+    #
+    # doesn't block at all when there are runnable entries.
+    # otherwise blocks until an event, a wake up or the next timer,
+    # limited by the configured timeout.
+    #
+    def _get_timeout(self):
+        if self._ready or self._terminate:
+            return 0
+        timeout = self._timers.next_timeout()
+        if timeout < 0 or 0 <= self._timeout < timeout:
+            timeout = self._timeout
+        return timeout
 
     ## Main loop - running server.
     def run(self):
@@ -112,39 +312,10 @@ class Server(object):
                 if self._terminate:
                     self.terminate()
 
-                for entry in self._fd_dict.values():
-                    if (
-                        entry.request_context["state"] == constants.CLOSING and
-                        not entry.request_context["send_buffer"]
-                    ):
-                        self._unregister(entry)
-
-                for entry in self._fd_dict.values():
-                    try:
-                        while entry.request_context["state"] != constants.SLEEPING and entry.on_idle(
-                        ):
-                            pass
-                    except Exception as e:
-                        logging.error(traceback.format_exc())
-                        self._unregister(entry)
-                try:
-                    for fd, flag in self.create_poller().poll(self._timeout):
-                        entry = self._fd_dict[fd]
-                        try:
-                            if flag & (select.POLLHUP | select.POLLERR):
-                                raise RuntimeError(
-                                    "socket hung up or experienced error"
-                                )
-                            if flag & select.POLLIN:
-                                entry.on_read()
-                            if flag & select.POLLOUT:
-                                entry.on_write()
-                        except Exception as e:
-                            logging.error(traceback.format_exc())
-                            self._unregister(entry)
-                except select.error as e:
-                    if e[0] != errno.EINTR:
-                        raise
+                self._run_ready()
+                if self._fd_dict:
+                    self._poll(self._get_timeout())
+                self._timers.expire(time.time())
             except Exception as e:
                 logging.error(traceback.format_exc())
                 self._terminate = True
@@ -0,0 +1,95 @@
+## @package common.connection_pool
+# Pool of persistent connections to block devices.
+## @file connection_pool.py Implementation of @ref common.connection_pool
+import errno
+import logging
+import socket
+import time
+
+from common import constants
+
+## Connection pool.
+#
+# Keeps idle connected sockets per block device, so block requests reuse
+# connections instead of connecting for every block.
+# At most size idle connections are kept per device, connections beyond that
+# are closed when released. Requests that find no idle connection connect a new one.
+#
+# Idle connections are not polled. A connection is checked when it's taken:
+# connections idle longer than the idle timeout are dropped, since the block
+# device may be about to close them, and so are connections the block device
+# already closed or reset.
+#
+class ConnectionPool(object):
+    ## Constructor.
+    # @param size (int) maximum number of idle connections per device.
+    # @param idle_timeout (float) seconds a connection may stay idle in the pool.
+    def __init__(
+        self,
+        size=constants.POOL_SIZE,
+        idle_timeout=constants.POOL_IDLE_TIMEOUT,
+    ):
+        self._size = size
+        self._idle_timeout = idle_timeout
+        self._idle = {}
+
+    ## Take an idle connection.
+    # @param device (str) block device id.
+    # @returns (socket) connected socket, None if there's no usable idle connection.
+    def get(
+        self,
+        device,
+    ):
+        idle = self._idle.get(device)
+        now = time.time()
+        while idle:
+            sock, released = idle.pop()
+            if now - released < self._idle_timeout and is_alive(sock):
+                return sock
+            logging.debug("Dropped stale connection to %s" % device)
+            close(sock)
+        return None
+
+    ## Release a connection after a complete request.
+    # @param device (str) block device id.
+    # @param sock (socket) connected socket with no pending data.
+    def put(
+        self,
+        device,
+        sock,
+    ):
+        idle = self._idle.setdefault(device, [])
+        if len(idle) >= self._size:
+            close(sock)
+            return
+        idle.append((sock, time.time()))
+
+    ## Close all idle connections.
+    def clear(self):
+        for idle in self._idle.values():
+            for sock, released in idle:
+                close(sock)
+        self._idle.clear()
+
+## Whether an idle connection is still open.
+# @param sock (socket) non-blocking socket.
+# @returns (bool) true if the peer didn't close it and sent nothing.
+#
+# an idle connection has nothing to read, so readable data, end of stream
+# or an error all mean the connection can't be used.
+#
+def is_alive(sock):
+    try:
+        sock.recv(1, socket.MSG_PEEK)
+    except socket.error as e:
+        return e.errno in (errno.EAGAIN, errno.EWOULDBLOCK)
+    return False
+
+## Close a socket, ignoring errors of a connection the peer already closed.
+# @param sock (socket) socket.
+def close(sock):
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except socket.error:
+        pass
+    sock.close()
@@ -58,8 +58,34 @@ MIME_MAPPING = {
 ## Names of block device client services.
 # - READ: Block read service.
 # - WRITE: Block write service.
+# - READV: Vectored block read service.
+# - WRITEV: Vectored block write service.
+# - UPGRADE: Switch of a connection to the binary block protocol.
 #
-[READ, WRITE] = ["/bd_client_read", "/bd_client_write"]
+[READ, WRITE, READV, WRITEV, UPGRADE] = [
+    "/bd_client_read",
+    "/bd_client_write",
+    "/bd_client_readv",
+    "/bd_client_writev",
+    "/bd_client_upgrade",
+]
+
+## Protocols between frontend and block devices.
+# - HTTP_PROTOCOL: HTTP request for every block action.
+# - BINARY_PROTOCOL: Binary frames, after the connection is upgraded from HTTP.
+#
+[HTTP_PROTOCOL, BINARY_PROTOCOL] = ["http", "binary"]
+## Name of the binary block protocol in HTTP upgrade headers.
+BLOCK_PROTOCOL = "blockdevice/1"
+
+## Operations of binary block protocol frames.
+# - OP_READ: Read count blocks from block index, replied with the blocks.
+# - OP_WRITE: Write count blocks from block index, replied with no payload.
+# - OP_READV: Read the blocks listed in the payload, replied like /readv.
+# - OP_WRITEV: Write the block records in the payload, like /writev.
+# - OP_ERROR: Reply of a failed operation, with the error message as payload.
+#
+[OP_READ, OP_WRITE, OP_READV, OP_WRITEV, OP_ERROR] = range(1, 6)
 
 ## HTTP methods supported by server.
 SUPPORTED_METHODS = ["GET", "POST"]
@@ -78,6 +104,76 @@ BASE = "./files/"
 ## Multipurpose block size for use at block device and frontend.
 BLOCK_SIZE = 4096
 
+## Maximum number of blocks in one vectored read request.
+READV_MAX_BLOCKS = 64
+## Maximum number of blocks in one vectored write request.
+WRITEV_MAX_BLOCKS = 64
+## Size of the header of every block in vectored read responses and write requests,
+# the big endian block number.
+BLOCK_HEADER_SIZE = 4
+## Number of file blocks a download reads from block devices at once.
+DOWNLOAD_PREFETCH = 16
+
+## Default receive window of a connection in bytes.
+RECV_WINDOW = 65536
+
+## Chunks smaller than this are merged together in output queues.
+OUTPUT_COALESCE_SIZE = 1024
+## Maximum number of chunks sent in one scatter/gather call.
+IOV_MAX = 64
+## Size of file pieces read for sending where sendfile isn't available.
+FILE_CHUNK_SIZE = 65536
+
+## Maximum number of on_idle calls per entry in one server loop iteration.
+IDLE_BUDGET = 64
+## Maximum number of connections a listener accepts in one server loop iteration.
+ACCEPT_BATCH = 32
+
+## Timer wheel tick length in milliseconds.
+TIMER_RESOLUTION = 10
+## Number of slots in every timer wheel level.
+TIMER_SLOTS = 64
+## Number of timer wheel levels.
+TIMER_LEVELS = 4
+
+## Timeouts in seconds.
+# - IDLE_TIMEOUT: Connection without any progress while not receiving a request.
+# - HEADER_TIMEOUT: Receiving request line and headers, from the first byte.
+# - BODY_TIMEOUT: Connection without any progress while receiving request content.
+# - KEEP_ALIVE_TIMEOUT: Persistent connection waiting for its next request.
+# - BLOCK_TIMEOUT: Block device request, from connect to the end of the response.
+#
+IDLE_TIMEOUT = 60
+HEADER_TIMEOUT = 10
+BODY_TIMEOUT = 30
+KEEP_ALIVE_TIMEOUT = 5
+BLOCK_TIMEOUT = 10
+
+## Maximum number of requests on a persistent connection.
+KEEP_ALIVE_REQUESTS = 100
+
+## Maximum number of idle connections kept per block device.
+POOL_SIZE = 8
+## Seconds a connection to a block device may stay idle in the pool,
+# lower than the keep alive timeout of block devices.
+POOL_IDLE_TIMEOUT = 2
+## Maximum number of requests sent on a block device connection before their responses arrive.
+PIPELINE_DEPTH = 8
+
+## Seconds between checks of worker processes by the supervisor.
+WORKER_CHECK_INTERVAL = 1
+## Seconds a worker must run for its exit not to count as a startup failure.
+WORKER_STARTUP_TIME = 10
+## Consecutive startup failures of a worker after which the supervisor gives up.
+WORKER_MAX_FAILURES = 5
+## Maximum seconds between restarts of a failing worker.
+WORKER_MAX_RESTART_DELAY = 60
+
+## Seconds between stat checks of a cached static asset.
+ASSET_CHECK_INTERVAL = 1
+## Maximum size of a cached static asset in bytes, larger files are sent from disk.
+ASSET_MAX_SIZE = 1024 * 1024
+
 CONTENT_TYPE = "Content-Type"
 CONTENT_LENGTH = "Content-Length"
 INTERNAL_ERROR = "Internal Error"
@@ -86,6 +182,8 @@ UNATHORIZED = "Unathorized"
 
 ## Length of init vector for AES encryption.
 IV_LENGTH = 16
+## Maximum number of expanded AES keys cached for user keys.
+AES_SCHEDULE_CACHE_SIZE = 64
 ## Size of root entry at file system.
 ROOT_ENTRY_SIZE = 256
 ## Maximum allowed paralel readers from file system.
@@ -103,7 +201,10 @@ BOUNDARY_LENGTH = 10
 MODULE_DICT = {
     1: [
         "block_device.services.block_device_read_service",
+        "block_device.services.block_device_readv_service",
+        "block_device.services.block_device_upgrade_service",
         "block_device.services.block_device_write_service",
+        "block_device.services.block_device_writev_service",
     ],
     0: [
         "frontend.services.get_menu_service",
@@ -117,7 +218,10 @@ MODULE_DICT = {
     ],
     "client": [
         "client.services.bd_client_read",
+        "client.services.bd_client_readv",
+        "client.services.bd_client_upgrade",
         "client.services.bd_client_write",
+        "client.services.bd_client_writev",
     ],
 }
 
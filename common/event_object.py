@@ -1,6 +1,7 @@
 ## @package common.events_object
 # Asynchronous I/O event handler.
 ## @file event_object.py Implementation of @ref common.event_object
+import os
 import select
 
 ## Event base object.
@@ -24,13 +25,21 @@ class EventBase(object):
     def register(self, fd, mask):
         pass
 
+    ## Changes the mask of a socket already registered in the event object.
+    #
+    # @param fd (int) file descriptor of socket.
+    # @param mask (int) new event mask of socket.
+    #
+    def modify(self, fd, mask):
+        pass
+
     ## Unregisters a socket from the event object
     def unregister(self, fd):
         pass
 
     ## Returns the poll result of the event object
     #   
-    #   @param timeout (int) poll timeout.
+    #   @param timeout (int) poll timeout in milliseconds, negative to block.
     #
     def poll(self, timeout):
         raise NotImplementedError()
@@ -60,18 +69,76 @@ class PollEvents(EventBase):
     def register(self, fd, mask):
         self._poll_object.register(fd, mask)
 
+    ## Changes the mask of a socket already registered in the event object.
+    #
+    # @param fd (int) file descriptor of socket.
+    # @param mask (int) new event mask of socket.
+    #
+    def modify(self, fd, mask):
+        self._poll_object.modify(fd, mask)
+
     ## Unregisters a socket from the event object
     def unregister(self, fd):
         self._poll_object.unregister(fd)
 
     ## Returns the poll result of the event object
     #   
-    #   @param timeout (int) poll timeout.
+    #   @param timeout (int) poll timeout in milliseconds, negative to block.
     #   @returns poll object
     #
     def poll(self, timeout):
         return self._poll_object.poll(timeout)
 
+## Epoll events object.
+#
+# Uses select.epoll() for event handling.
+# The kernel keeps the interest list between calls, so sockets are registered once
+# and only modified when their mask changes.
+# Poll masks are used as is, since epoll shares their values for POLLIN, POLLOUT, POLLERR and POLLHUP.
+#
+class EpollEvents(EventBase):
+    ## Constructor.
+    def __init__(self):
+        super(EpollEvents, self).__init__()
+        self._epoll_object = select.epoll()
+
+    ## Class name.
+    # @returns (str) class name
+    #
+    @staticmethod
+    def name():
+        return "epoll"
+
+    ## Registers a socket with a mask into the event object.
+    #
+    # @param fd (int) file descriptor of socket.
+    # @param mask (int) event mask of socket.
+    #
+    def register(self, fd, mask):
+        self._epoll_object.register(fd, mask)
+
+    ## Changes the mask of a socket already registered in the event object.
+    #
+    # @param fd (int) file descriptor of socket.
+    # @param mask (int) new event mask of socket.
+    #
+    def modify(self, fd, mask):
+        self._epoll_object.modify(fd, mask)
+
+    ## Unregisters a socket from the event object
+    def unregister(self, fd):
+        self._epoll_object.unregister(fd)
+
+    ## Returns the poll result of the event object
+    #   
+    #   @param timeout (int) poll timeout in milliseconds, negative to block.
+    #   @returns poll object
+    #
+    def poll(self, timeout):
+        if timeout is None or timeout < 0:
+            return self._epoll_object.poll(-1)
+        return self._epoll_object.poll(timeout / 1000.0)
+
 ## Select events object.
 #
 # Wraps the select functions to be used as poll functions, with same inputs and outputs.
@@ -97,13 +164,21 @@ class SelectEvents(EventBase):
     def register(self, fd, mask):
         self._fd_dict[fd] = mask
 
+    ## Changes the mask of a socket already registered in the event object.
+    #
+    # @param fd (int) file descriptor of socket.
+    # @param mask (int) new event mask of socket.
+    #
+    def modify(self, fd, mask):
+        self._fd_dict[fd] = mask
+
     ## Unregisters a socket from the event object
     def unregister(self, fd):
         del self._fd_dict[fd]
 
     ## Returns the poll result of the event object
     #   
-    #   @param timeout (int) poll timeout.
+    #   @param timeout (int) poll timeout in milliseconds, negative to block.
     #   @returns poll object
     #
     def poll(self, timeout):
@@ -122,6 +197,10 @@ class SelectEvents(EventBase):
                         mask_to_list[select_mask].append(fd)
                 events_dict[fd] = 0
 
+        if timeout is None or timeout < 0:
+            timeout = None
+        else:
+            timeout = timeout / 1000.0
         r_ready, w_ready, x_ready = select.select(rlist, wlist, xlist, timeout)
         select_to_poll = {
             tuple(w_ready): select.POLLOUT,
@@ -132,3 +211,21 @@ class SelectEvents(EventBase):
             for fd in ready_list:
                 events_dict[fd] |= select_to_poll[ready_list]
         return events_dict.items()
+
+
+## Event objects by event method name.
+# epoll is only offered where the platform supports it.
+EVENT_OBJECTS = {
+    PollEvents.name(): PollEvents,
+    SelectEvents.name(): SelectEvents,
+}
+if hasattr(select, "epoll"):
+    EVENT_OBJECTS[EpollEvents.name()] = EpollEvents
+
+## Default event method of the platform.
+if hasattr(select, "epoll"):
+    DEFAULT_EVENT_METHOD = EpollEvents.name()
+elif os.name == "nt":
+    DEFAULT_EVENT_METHOD = SelectEvents.name()
+else:
+    DEFAULT_EVENT_METHOD = PollEvents.name()
@@ -0,0 +1,320 @@
+## @package common.pollables.block_socket
+# Class which handles the binary block protocol on block devices.
+## @file block_socket.py Implementation of @ref common.pollables.block_socket
+import errno
+import logging
+import socket
+import struct
+import traceback
+
+from common import constants
+from common.utilities import disk_util
+from common.utilities import frame_util
+from common.utilities import util
+from common.pollables.pollable import Pollable
+
+## Block Socket.
+# pollable class.
+# takes over a connection of an HTTP socket after the client upgraded it to the binary block protocol.
+# the client was authenticated by the upgrade request, so frames carry no credentials.
+# every request frame is answered by a reply frame in the order received,
+# failed operations are answered by an error frame and the connection is kept,
+# malformed frames close the connection.
+# the connection is closed if the client doesn't start the next frame within the keep alive timeout,
+# or makes no progress within the idle timeout while a frame is received or a reply sent.
+class BlockSocket(Pollable):
+    __slots__ = (
+        "socket",
+        "request_context",
+        "_listener",
+        "_header",
+        "_payload",
+        "_timer",
+    )
+
+    ## Constructor.
+    # @param socket (socket) socket.
+    # @param request_context (dict) connection part of the request context of the HTTP socket.
+    # @param listener (TCPListener) listener which accepted the connection, notified on close.
+    def __init__(
+        self,
+        socket,
+        request_context,
+        listener=None,
+    ):
+        self.socket = socket
+        self.request_context = request_context
+        self._listener = listener
+        self._header = None
+        self._payload = None
+        self._timer = None
+        self._on_progress()
+
+    ## Restart own timeout after progress.
+    def _on_progress(
+        self,
+    ):
+        app_context = self.request_context.app_context
+        timeout = app_context["idle_timeout"]
+        if (
+            self._header is None and
+            not self.request_context.recv_buffer and
+            not self.request_context.send_buffer
+        ):
+            timeout = app_context["keep_alive_timeout"]
+        server = app_context["server"]
+        server.cancel_timer(self._timer)
+        self._timer = server.add_timer(timeout, self._on_timeout)
+
+    ## On timeout.
+    # called by the asynchronous server when the connection made no progress in time.
+    def _on_timeout(
+        self,
+    ):
+        logging.debug("fd %d timed out" % self.fileno())
+        self._timer = None
+        self.request_context.send_buffer.clear()
+        self.on_error()
+        self.request_context.app_context["server"].schedule(self)
+
+    ## On read.
+    # called when there's data ready to be received, reads that data to own request context.
+    def on_read(
+        self,
+    ):
+        try:
+            util.receive_buffer(self)
+            self._on_progress()
+        except Exception:
+            logging.debug("fd %d closed by client" % self.fileno())
+            self.on_error()
+
+    ## On idle.
+    # @returns (bool) whether to call this function again or whether finished idle processes.
+    # receives the next frame, and once it's complete performs it and queues the reply.
+    def on_idle(
+        self,
+    ):
+        if self.request_context.state == constants.CLOSING:
+            return False
+        try:
+            if self._header is None:
+                self._header = frame_util.read_header(
+                    self.request_context.recv_buffer,
+                )
+                if self._header is None:
+                    return False
+                self._payload = bytearray(0)
+            length = self._header[4]
+            self._payload += self.request_context.recv_buffer.read(
+                length - len(self._payload),
+            )
+            if len(self._payload) < length:
+                return False
+            self._reply()
+            self._on_progress()
+            return True
+        except Exception:
+            traceback.print_exc()
+            self.request_context.send_buffer.clear()
+            self.on_error()
+            return False
+
+    ## Perform the received frame and queue its reply.
+    def _reply(
+        self,
+    ):
+        opcode, request_id, block_index, count, length = self._header
+        payload = self._payload
+        self._header = None
+        self._payload = None
+        operation = self._operations.get(opcode)
+        if operation is None:
+            raise RuntimeError("Unknown block protocol operation %d" % opcode)
+        try:
+            reply = operation(self, block_index, count, payload)
+        except Exception as e:
+            logging.debug("fd %d operation %d failed: %s" % (self.fileno(), opcode, e))
+            opcode = constants.OP_ERROR
+            reply = str(e)
+        self.request_context.send_buffer.append(
+            frame_util.pack_header(
+                opcode,
+                request_id,
+                block_index,
+                count,
+                len(reply),
+            )
+        )
+        if reply:
+            self.request_context.send_buffer.append(reply)
+
+    ## Read operation.
+    # @param block_index (int) first block.
+    # @param count (int) number of blocks.
+    # @param payload (bytearray) empty payload.
+    # @returns (bytearray) the blocks.
+    def _read(
+        self,
+        block_index,
+        count,
+        payload,
+    ):
+        if count < 1 or count > constants.READV_MAX_BLOCKS:
+            raise util.HTTPError(500, "Invalid number of blocks")
+        block_nums = range(block_index, block_index + count)
+        disk_util.check_blocks(self.request_context.app_context, block_nums)
+        data = bytearray(0)
+        for block in disk_util.read_blocks(
+            self.request_context.app_context,
+            block_nums,
+        ):
+            data += block
+        return data
+
+    ## Write operation.
+    # @param block_index (int) first block.
+    # @param count (int) number of blocks.
+    # @param payload (bytearray) the blocks.
+    # @returns (str) empty reply.
+    def _write(
+        self,
+        block_index,
+        count,
+        payload,
+    ):
+        if (
+            count < 1 or
+            count > constants.WRITEV_MAX_BLOCKS or
+            len(payload) != count * constants.BLOCK_SIZE
+        ):
+            raise util.HTTPError(500, "Invalid number of blocks")
+        block_nums = range(block_index, block_index + count)
+        disk_util.check_blocks(self.request_context.app_context, block_nums)
+        disk_util.write_blocks(
+            self.request_context.app_context,
+            {
+                block_num: payload[
+                    i * constants.BLOCK_SIZE:(i + 1) * constants.BLOCK_SIZE
+                ] for i, block_num in enumerate(block_nums)
+            },
+        )
+        return ""
+
+    ## Vectored read operation.
+    # @param block_index (int) unused.
+    # @param count (int) number of blocks.
+    # @param payload (bytearray) block numbers.
+    # @returns (bytearray) every block framed by its block number, like /readv.
+    def _readv(
+        self,
+        block_index,
+        count,
+        payload,
+    ):
+        if (
+            count < 1 or
+            count > constants.READV_MAX_BLOCKS or
+            len(payload) != count * constants.BLOCK_HEADER_SIZE
+        ):
+            raise util.HTTPError(500, "Invalid number of blocks")
+        block_nums = sorted(set(struct.unpack(">%dI" % count, str(payload))))
+        disk_util.check_blocks(self.request_context.app_context, block_nums)
+        data = bytearray(0)
+        for block_num, block in zip(
+            block_nums,
+            disk_util.read_blocks(
+                self.request_context.app_context,
+                block_nums,
+            ),
+        ):
+            data += struct.pack(">I", block_num)
+            data += block
+        return data
+
+    ## Vectored write operation.
+    # a repeated block number fails the operation, like /writev.
+    # @param block_index (int) unused.
+    # @param count (int) number of blocks.
+    # @param payload (bytearray) every block framed by its block number, like /writev.
+    # @returns (str) empty reply.
+    def _writev(
+        self,
+        block_index,
+        count,
+        payload,
+    ):
+        frame_size = constants.BLOCK_HEADER_SIZE + constants.BLOCK_SIZE
+        if (
+            count < 1 or
+            count > constants.WRITEV_MAX_BLOCKS or
+            len(payload) != count * frame_size
+        ):
+            raise util.HTTPError(500, "Invalid number of blocks")
+        blocks = {}
+        for index in range(0, len(payload), frame_size):
+            block_num = struct.unpack(
+                ">I",
+                str(payload[index:index + constants.BLOCK_HEADER_SIZE]),
+            )[0]
+            if block_num in blocks:
+                raise util.HTTPError(500, "Invalid number of blocks")
+            blocks[block_num] = payload[
+                index + constants.BLOCK_HEADER_SIZE:index + frame_size
+            ]
+        disk_util.check_blocks(self.request_context.app_context, blocks)
+        disk_util.write_blocks(self.request_context.app_context, blocks)
+        return ""
+
+    # On write.
+    # called by asynchronous server when there's data ready to be written.
+    # writes ready data from own request context to socket.
+    def on_write(
+        self,
+    ):
+        try:
+            while self.request_context.send_buffer:
+                self.request_context.send_buffer.send(self.socket)
+                self._on_progress()
+        except socket.error as e:
+            if e.errno in (errno.EPIPE, errno.ECONNRESET):
+                self.request_context.send_buffer.clear()
+                self.on_error()
+            elif e.errno != errno.EWOULDBLOCK:
+                raise
+
+    # On error.
+    # called when error rises, sets own state to closing.
+    def on_error(
+        self,
+    ):
+        self.request_context.state = constants.CLOSING
+
+    # On close.
+    # called when ready to close, closes own socket.
+    # cancels own timeout and frees own place at the listener.
+    def on_close(
+        self,
+    ):
+        self.request_context.app_context["server"].cancel_timer(self._timer)
+        self._timer = None
+        if self._listener is not None:
+            self._listener.on_connection_closed()
+            self._listener = None
+        try:
+            self.socket.shutdown(socket.SHUT_WR)
+        except socket.error as e:
+            # client may have closed the connection first
+            if e.errno != errno.ENOTCONN:
+                raise
+
+    def fileno(self):
+        return self.socket.fileno()
+
+    ## Operations by opcode.
+    _operations = {
+        constants.OP_READ: _read,
+        constants.OP_WRITE: _write,
+        constants.OP_READV: _readv,
+        constants.OP_WRITEV: _writev,
+    }
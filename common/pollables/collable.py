@@ -2,5 +2,7 @@
 # Base class of callable objects.
 ## @file collable.py Implementation of @ref common.pollables.collable
 class Collable(object):
+    __slots__ = ()
+
     def on_finish(self, data):
         return
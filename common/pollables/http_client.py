@@ -1,22 +1,72 @@
 ## @package common.pollables.http_client
 # Class which handles HTTP state machine and client actions.
 ## @file http_client.py Implementation of @ref common.pollables.http_client
+import collections
 import errno
+import os
 import socket
 import logging
 import traceback
-import importlib
 
 from client.services import *
+from common import connection_pool
 from common import constants
+from common.request_context import RequestContext
+from common.utilities import block_util
+from common.utilities import frame_util
 from common.utilities import util
 from common.services import service_base
 from common.pollables.pollable import Pollable
 
+## Keys of request context kept for the whole connection.
+SESSION_KEYS = (
+    "state",
+    "app_context",
+    "parent",
+    "device",
+    "recv_buffer",
+    "send_buffer",
+)
+
 ## HTTP client.
 # pollable class.
 # handles HTTP client with state machine for request process.
+# the whole request must finish within the block timeout, otherwise the parent is woken up with an error.
+# connections are persistent, after a complete response the socket is released to the connection pool.
+# requests are pipelined, up to the pipeline depth of requests are sent before their responses arrive,
+# and responses are matched to requests in the order sent.
+# further requests of the parent to the same block device are added to the client while it works,
+# the block timeout then applies to every response.
+# requests on a reused connection that the block device closed before replying, and requests
+# the block device won't answer since it asked to close the connection, are sent again on a new connection.
+# with the binary block protocol, a new connection is first upgraded by an HTTP request, then requests
+# and responses are binary frames. connections in the pool were already upgraded.
 class HttpClient(Pollable):
+    __slots__ = (
+        "request_context",
+        "socket",
+        "service_class",
+        "_fileno",
+        "_device",
+        "_reused",
+        "_replied",
+        "_reusable",
+        "_connecting",
+        "_connect_error",
+        "_last",
+        "_depth",
+        "_queue",
+        "_in_flight",
+        "_request_id",
+        "_binary",
+        "_upgrade",
+        "_upgrading",
+        "_fd_dict",
+        "_registry",
+        "_state_machine",
+        "_current_state",
+        "_timer",
+    )
 
     ## Constructor.
     # @param socket (socket) socket.
@@ -27,6 +77,8 @@ class HttpClient(Pollable):
     # @param block_num (int) block which client has to read/write.
     # @param parent (Collable) parent server which initiated the client.
     # @param block (str) block to write in case of write service.
+    # @param device (str) block device id, connection is released to it's pool.
+    # @param reused (bool) whether the socket is a connection taken from the pool.
     def __init__(
         self,
         socket,
@@ -36,78 +88,221 @@ class HttpClient(Pollable):
         action,
         block_num,
         parent,
-        block=None
+        block=None,
+        device=None,
+        reused=False,
     ):
-        self.request_context = {
-            "code": None,
-            "status": None,
-            "req_headers": {},
-            "headers": {},
-            "content": "",
-            "response": "",
-            "recv_buffer": "",
-            "send_buffer": "",
-        }
+        self.request_context = RequestContext(
+            recv_buffer=util.ReceiveBuffer(
+                app_context.get("recv_window", constants.RECV_WINDOW),
+            ),
+            send_buffer=util.OutputQueue(),
+        )
         self.socket = socket
-        self.request_context["state"] = state
+        self._fileno = socket.fileno()
+        self._device = device
+        self._reused = reused
+        self._replied = False
+        self._reusable = False
+        self._connecting = False
+        self._connect_error = None
+        self._last = False
+        self._depth = max(
+            app_context.get("pipeline_depth", constants.PIPELINE_DEPTH),
+            1,
+        )
+        self._queue = collections.deque()
+        self._in_flight = collections.deque()
+        self._request_id = 0
+        self._binary = False
+        self._upgrade = False
+        self._upgrading = False
+        if app_context.get("block_protocol") == constants.BINARY_PROTOCOL:
+            self._binary = reused
+            self._upgrade = not reused
+        self.request_context.state = state
         self._fd_dict = fd_dict
-        self.request_context["app_context"] = app_context
+        self.request_context.app_context = app_context
+        self.request_context.parent = parent
+        self.request_context.device = device
         self.service_class = service_base.ServiceBase(self.request_context)
-        self.request_context["action"] = action
-        self.request_context["block_num"] = block_num
-        self.request_context["parent"] = parent
-        self.request_context["block"] = block
 
-        REGISTRY = {
-            service.name(): service for service in service_base.ServiceBase.__subclasses__()
-        }
+        self._registry = app_context["client_router"]
 
-        try:
-            self.service_class = REGISTRY[action](self.request_context)
-        except KeyError:
+        if self._binary:
+            self._state_machine = self._binary_state_machine
+        else:
+            self._state_machine = self._http_state_machine
+        self._current_state = constants.SEND_STATUS_LINE
+        self.add_request(action, block_num, block)
+        self._timer = None
+        self._arm_timer()
+
+    ## Add a request.
+    # @param action (str) action client should perform.
+    # @param block_num (int) block which client has to read/write.
+    # @param block (str) block to write in case of write service.
+    # @returns (bool) whether the request was added, false if the client doesn't send more requests.
+    #
+    # a client waiting for a response sends the request right away if the pipeline isn't full,
+    # otherwise it's sent when an earlier response arrives.
+    #
+    def add_request(
+        self,
+        action,
+        block_num,
+        block=None,
+    ):
+        if action not in self._registry:
             raise util.HTTPError(
                 code=500,
                 status="Internal Error",
                 message="service not supported",
             )
-        self._state_machine = self._get_state_machine()
-        self._current_state = constants.SEND_STATUS_LINE
+        if self._last or self.request_context.state == constants.CLOSING:
+            return False
+        self._queue.append((action, block_num, block))
+        if self._current_state == constants.GET_FIRST_LINE and self._can_send():
+            self._current_state = constants.SEND_STATUS_LINE
+            self.request_context.app_context["server"].schedule(self)
+        return True
+
+    ## Whether the next queued request can be sent.
+    # requests wait for the upgrade of the connection to complete.
+    def _can_send(
+        self,
+    ):
+        return (
+            (self._upgrade or bool(self._queue)) and
+            not self._upgrading and
+            len(self._in_flight) < self._depth and
+            not self._last and
+            self.request_context.state != constants.CLOSING
+        )
+
+    ## Choose the state between requests.
+    # @returns (int) next state, None if no request is left.
+    #
+    # sends the next queued request while the pipeline isn't full,
+    # otherwise receives the response of the oldest request in flight.
+    #
+    def _next_state(
+        self,
+    ):
+        if self._can_send():
+            return constants.SEND_STATUS_LINE
+        if self._in_flight:
+            request_context, service_class, request = self._in_flight[0]
+            self._use(request_context, service_class)
+            return constants.GET_FIRST_LINE
+        return None
+
+    ## Make a request current.
+    # @param request_context (dict) request context of the request.
+    # @param service_class (ServiceBase) service of the request.
+    # the request context takes the part of the current one kept for the whole connection.
+    def _use(
+        self,
+        request_context,
+        service_class,
+    ):
+        for key in SESSION_KEYS:
+            request_context[key] = self.request_context[key]
+        self.request_context = request_context
+        self.service_class = service_class
+
+    ## Arm own timeout for the next response.
+    def _arm_timer(
+        self,
+    ):
+        server = self.request_context.app_context["server"]
+        server.cancel_timer(self._timer)
+        self._timer = server.add_timer(
+            self.request_context.app_context["block_timeout"],
+            self._on_timeout,
+        )
+
+    ## Send requests without response again on a new connection.
+    # @param reuse (bool) whether the new connection may be taken from the connection pool.
+    # requests that can't be sent again are left queued, to be failed by the error path.
+    def _resend(
+        self,
+        reuse,
+    ):
+        self._last = True
+        self._queue.extendleft(
+            reversed([
+                request for request_context, service_class, request in self._in_flight
+                if request is not None
+            ])
+        )
+        self._in_flight.clear()
+        while self._queue:
+            action, block_num, block = self._queue[0]
+            block_util.start_client(
+                request_context=self.request_context.parent.request_context,
+                client_action=action,
+                client_block_num=block_num,
+                block_device_id=self._device,
+                block=block,
+                reuse=reuse,
+            )
+            self._queue.popleft()
+
+    ## Wake up parent with an error for every request without response.
+    # @param error (Exception) error.
+    def _fail(
+        self,
+        error,
+    ):
+        requests = len(self._queue) + len([
+            request for request_context, service_class, request in self._in_flight
+            if request is not None
+        ])
+        self._in_flight.clear()
+        self._queue.clear()
+        for i in range(requests):
+            self.request_context.parent.on_finish(error=error)
 
-    ## Return own state machine.
-    # state machine contains all http states and their corresponding functions.
-    def _get_state_machine(
+    ## Connect own socket.
+    # @param address (tuple) block device address and port.
+    #
+    # starts connecting without blocking the server, the result is checked
+    # when the socket becomes writable. errors are reported to the parent
+    # from the server loop, not from the caller.
+    #
+    def connect(
         self,
+        address,
     ):
-        return {
-            constants.GET_FIRST_LINE: {
-                "func": self._get_first_line,
-                "next": constants.GET_HEADERS,
-            },
-            constants.GET_HEADERS: {
-                "func": self._get_headers,
-                "next": constants.GET_CONTENT,
-            },
-            constants.GET_CONTENT: {
-                "func": self._get_content,
-                "next": constants.TERMINATE,
-            },
-            constants.TERMINATE: {
-                "func": self._terminate,
-                "next": None
-            },
-            constants.SEND_STATUS_LINE: {
-                "func": self._send_status_line,
-                "next": constants.SEND_HEADERS,
-            },
-            constants.SEND_HEADERS: {
-                "func": self._send_headers,
-                "next": constants.SEND_RESPONSE,
-            },
-            constants.SEND_RESPONSE: {
-                "func": self._send_response,
-                "next": constants.GET_FIRST_LINE,
-            },
-        }
+        self.socket.setblocking(False)
+        self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        try:
+            error = self.socket.connect_ex(address)
+        except socket.error as e:
+            self._connect_error = e
+            return
+        if error in (errno.EINPROGRESS, errno.EWOULDBLOCK):
+            self._connecting = True
+        elif error:
+            self._connect_error = socket.error(error, os.strerror(error))
+
+    ## Get the connect error.
+    # @returns (Exception) error describing why connecting to the block device failed.
+    def _get_connect_error(
+        self,
+    ):
+        error = self._connect_error
+        if error is None:
+            code = self.socket.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+            if code:
+                error = socket.error(code, os.strerror(code))
+        return RuntimeError(
+            "Block device %s not reachable: %s" % (
+                self._device,
+                error,
+            )
+        )
 
     ## On read.
     # called when there's data ready to be received, reads that data to own request context.
@@ -116,11 +311,14 @@ class HttpClient(Pollable):
     ):
         try:
             util.receive_buffer(self)
+            if self.request_context.recv_buffer:
+                self._replied = True
         except Exception as e:
             code = 500
             if isinstance(e, util.HTTPError):
                 code = e.code
-            traceback.print_exc()
+            if not self._can_retry():
+                traceback.print_exc()
             self.on_error(e)
             util.add_status(self, code, e)
         self.on_idle()
@@ -129,12 +327,20 @@ class HttpClient(Pollable):
     # @returns (bool) whether to call this function again or whether finished idle processes.
     # called by asynchronous loop to perform various idle operations in self service.
     # from this functon, the current state machine function is called.
+    # a closing client has no request left to work on.
     def on_idle(
         self,
     ):
+        if self.request_context.state == constants.CLOSING:
+            return False
+        if self._connect_error is not None:
+            self.request_context.send_buffer.clear()
+            self.on_error(self._get_connect_error())
+            self._connect_error = None
+            return False
         call_again = None
         try:
-            call_again = self._state_machine[self._current_state]["func"]()
+            call_again = self._state_machine[self._current_state]["func"](self)
         except Exception as e:
             code = 500
             if isinstance(e, util.HTTPError):
@@ -142,7 +348,7 @@ class HttpClient(Pollable):
             traceback.print_exc()
             self.on_error(e)
             util.add_status(self, code, e)
-            self.request_context["response"] = e.message
+            self.request_context.response = e.message
             self.service_class = service_base.ServiceBase(self.request_context)
 
         if call_again is None:
@@ -155,35 +361,103 @@ class HttpClient(Pollable):
     def on_write(
         self,
     ):
+        if self._connecting:
+            code = self.socket.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+            if code:
+                self._connect_error = socket.error(code, os.strerror(code))
+                self.request_context.send_buffer.clear()
+                self.on_error(self._get_connect_error())
+                return
+            self._connecting = False
         try:
-            while self.request_context["send_buffer"]:
-                self.request_context["send_buffer"] = self.request_context["send_buffer"][
-                    self.socket.send(self.request_context["send_buffer"]):
-                ]
+            while self.request_context.send_buffer:
+                self.request_context.send_buffer.send(self.socket)
         except socket.error as e:
-            if e.errno != errno.EWOULDBLOCK:
+            if e.errno in (errno.EPIPE, errno.ECONNRESET):
+                self.request_context.send_buffer.clear()
+                self.on_error(e)
+            elif e.errno != errno.EWOULDBLOCK:
                 raise
 
+    ## On timeout.
+    # called by the asynchronous server when the request didn't finish in time.
+    # drops pending output and wakes up parent with an error through the error path.
+    def _on_timeout(
+        self,
+    ):
+        self._timer = None
+        self._reused = False
+        self.request_context.send_buffer.clear()
+        self.on_error(RuntimeError("Block device request timed out"))
+        self.request_context.app_context["server"].schedule(self)
+
+    ## Whether a failed request is sent again on a new connection.
+    # a reused connection may have been closed by the block device while idle in the pool,
+    # which shows up as a reset or disconnection before any reply.
+    def _can_retry(
+        self,
+    ):
+        return (
+            self._reused and
+            not self._replied and
+            self.request_context.state != constants.CLOSING
+        )
+
     # On error.
     # called when error rises, sets own state to closing.
-    # also wakes up parent with same error.
+    # also wakes up parent with same error for every request without response, unless
+    # the requests are sent again because a reused connection failed before any reply.
+    # errors after closing, such as a reset after a timeout, are ignored.
     def on_error(
         self,
         error=None,
     ):
+        if self.request_context.state == constants.CLOSING:
+            return
+        if error and self._can_retry():
+            self._reused = False
+            logging.debug(
+                "Retrying %d requests on a new connection to %s: %s" % (
+                    len(self._in_flight) + len(self._queue),
+                    self._device,
+                    error,
+                )
+            )
+            try:
+                self._resend(reuse=False)
+                error = None
+            except Exception as e:
+                error = e
         if error:
-            self.request_context["parent"].on_finish(error=error)
-        self.request_context["state"] = constants.CLOSING
+            self._fail(error)
+        self.request_context.state = constants.CLOSING
 
     # On close.
-    # called when ready to close, closes own socket.
+    # called when ready to close.
+    # releases own socket to the connection pool after a complete response, otherwise closes it.
+    # if the request did not finish, wakes up parent with an error.
     def on_close(
         self,
     ):
-        self.socket.shutdown(socket.SHUT_RD)
+        self.request_context.app_context["server"].cancel_timer(self._timer)
+        self._timer = None
+        if self.request_context.state != constants.CLOSING:
+            if self._connecting:
+                self.on_error(self._get_connect_error())
+            else:
+                self.on_error(RuntimeError("Block device connection closed"))
+        if self._reusable:
+            self.request_context.app_context["connection_pool"].put(
+                self._device,
+                self.socket,
+            )
+        else:
+            connection_pool.close(self.socket)
 
+    ## File descriptor.
+    # kept from construction, so it's valid after the socket is closed or released.
     def fileno(self):
-        return self.socket.fileno()
+        return self._fileno
 
     ## Get first line.
     # function called when on HTTP receive status line state.
@@ -192,8 +466,7 @@ class HttpClient(Pollable):
     def _get_first_line(
         self,
     ):
-        req, self.request_context["recv_buffer"] = util.recv_line(
-            self.request_context["recv_buffer"])
+        req = util.recv_line(self.request_context.recv_buffer)
         if not req:
             return False
         req_comps = req.split(" ", 2)
@@ -202,7 +475,10 @@ class HttpClient(Pollable):
         if req_comps[0] != constants.HTTP_SIGNATURE:
             raise RuntimeError("Not HTTP protocol")
 
-        if req_comps[1] != "200":
+        expected = "200"
+        if self.request_context.action == constants.UPGRADE:
+            expected = "101"
+        if req_comps[1] != expected:
             raise util.HTTPError(
                 req_comps[1],
                 req_comps[2],
@@ -219,8 +495,8 @@ class HttpClient(Pollable):
         self,
     ):
         if util.get_headers(self.request_context):
-            self.request_context["content_length"] = int(
-                self.request_context["req_headers"].get(
+            self.request_context.content_length = int(
+                self.request_context.req_headers.get(
                     constants.CONTENT_LENGTH, "0")
             )
             self.service_class.before_request_content(self.request_context)
@@ -241,23 +517,122 @@ class HttpClient(Pollable):
                 break
 
         if service_command is None:
-            self.service_class.before_response_status(self.request_context)
             self._current_state = self._state_machine[self._current_state]["next"]
             return True
         elif service_command is False:
             return False
 
+    ## Start the next request.
+    # @returns (tuple) the request, None for the upgrade of the connection.
+    # makes a request context for the request current, and creates its service.
+    def _start_request(
+        self,
+    ):
+        if self._upgrade:
+            self._upgrade = False
+            self._upgrading = True
+            request = None
+            action, block_num, block = constants.UPGRADE, None, None
+        else:
+            request = self._queue.popleft()
+            action, block_num, block = request
+        request_context = RequestContext(
+            code=None,
+            status=None,
+            req_headers={},
+            headers={},
+            content="",
+            response="",
+            action=action,
+            block_num=block_num,
+            block=block,
+        )
+        self._use(request_context, service_base.ServiceBase())
+        self.service_class = self._registry.get(action)(self.request_context)
+        self._in_flight.append((self.request_context, self.service_class, request))
+        return request
+
     ## Send status line.
     # called when on HTTP send status line state.
-    # sends HTTP request according to values initalized with.
+    # starts the next queued request, sends HTTP request according to its values.
     def _send_status_line(
         self,
     ):
-        self.request_context["req_headers"] = self.service_class.get_header_dict(
+        self._start_request()
+        self.request_context.req_headers = self.service_class.get_header_dict(
         )
+        self.request_context.req_headers.setdefault("Connection", None)
         self.service_class.before_response_status(self.request_context)
         self._current_state = self._state_machine[self._current_state]["next"]
 
+    ## Send frame.
+    # called when on binary send state.
+    # starts the next queued request, sends the frame of it's service,
+    # then sends the next request or receives a response.
+    def _send_frame(
+        self,
+    ):
+        self._start_request()
+        self._request_id += 1
+        self.request_context.request_id = self._request_id & 0xffffffff
+        opcode, block_index, count, payload = self.service_class.frame(
+            self.request_context,
+        )
+        self.request_context.opcode = opcode
+        self.request_context.send_buffer.append(
+            frame_util.pack_header(
+                opcode,
+                self._request_id,
+                block_index,
+                count,
+                len(payload),
+            )
+        )
+        if payload:
+            self.request_context.send_buffer.append(payload)
+        self._current_state = self._next_state()
+
+    ## Get frame header.
+    # called when on binary receive header state.
+    # checks that the reply belongs to the oldest request in flight.
+    def _get_frame_header(
+        self,
+    ):
+        header = frame_util.read_header(self.request_context.recv_buffer)
+        if header is None:
+            return False
+        opcode, request_id, block_index, count, length = header
+        if (
+            request_id != self.request_context.request_id or
+            opcode not in (self.request_context.opcode, constants.OP_ERROR)
+        ):
+            raise RuntimeError("Unexpected block protocol reply")
+        self.request_context.reply_opcode = opcode
+        self.request_context.content_length = length
+        self.request_context.block = bytearray(0)
+        self._current_state = self._state_machine[self._current_state]["next"]
+
+    ## Get frame payload.
+    # called when on binary receive payload state.
+    # receives the payload to request context block, raises the error of an error reply.
+    def _get_frame_payload(
+        self,
+    ):
+        data = self.request_context.recv_buffer.read(
+            self.request_context.content_length
+        )
+        self.request_context.block += data
+        self.request_context.content_length -= len(data)
+        if self.request_context.content_length:
+            return False
+        if self.request_context.reply_opcode == constants.OP_ERROR:
+            raise util.HTTPError(
+                500,
+                "Internal Error",
+                str(self.request_context.block),
+            )
+        self._current_state = self._state_machine[self._current_state]["next"]
+
     ## Send headers.
     # called when in HTTP send headers state.
     # uses util to send all pending headers, switches to next state when done sending.
@@ -272,23 +647,106 @@ class HttpClient(Pollable):
     ## Send response.
     # called when in HTTP response state.
     # calls service reponse send function.
-    # sends all request data to server, then switches to next state.
+    # sends all request data to server, then sends the next request or receives a response.
     def _send_response(
         self,
     ):
         data = None
         data = self.service_class.response(self.request_context)
         if data is None:
-            self._current_state = self._state_machine[self._current_state]["next"]
+            self._current_state = self._next_state()
         else:
-            self.request_context["send_buffer"] += data
+            self.request_context.send_buffer.append(data)
             return True
 
     ## Terminate.
-    # sets self state to closing.
+    # called when a response is complete, wakes up parent through the service of the request.
+    # continues with the next request, if none is left sets self state to closing.
+    # if the block device asked to close the connection, the requests left are sent on a new connection.
+    # after the upgrade of the connection, the next requests are binary frames.
+    # the connection is reusable if the response was complete and the block device didn't ask to close it.
     def _terminate(
         self,
     ):
+        connection = self.request_context.req_headers.get("Connection")
+        if connection is not None and connection.lower() == "close":
+            self._last = True
+        self._in_flight.popleft()
         self.service_class.before_terminate(self.request_context)
-        self.request_context["state"] = constants.CLOSING
+        if self.request_context.action == constants.UPGRADE:
+            self._upgrading = False
+            self._binary = True
+            self._state_machine = self._binary_state_machine
+        if self._last:
+            self._resend(reuse=True)
+        next_state = self._next_state()
+        if next_state is not None:
+            self._arm_timer()
+            self._current_state = next_state
+            return True
+
+        self.request_context.app_context["server"].cancel_timer(self._timer)
+        self._timer = None
+        self._reusable = (
+            self.request_context.state != constants.CLOSING and
+            not self._last and
+            self.request_context.get("content_length") == 0 and
+            not self.request_context.recv_buffer and
+            not self.request_context.send_buffer
+        )
+        self.request_context.state = constants.CLOSING
         return False
+
+    ## HTTP state machine.
+    # contains all http states and their corresponding functions, indexed by state.
+    _http_state_machine = util.state_table({
+        constants.GET_FIRST_LINE: {
+            "func": _get_first_line,
+            "next": constants.GET_HEADERS,
+        },
+        constants.GET_HEADERS: {
+            "func": _get_headers,
+            "next": constants.GET_CONTENT,
+        },
+        constants.GET_CONTENT: {
+            "func": _get_content,
+            "next": constants.TERMINATE,
+        },
+        constants.TERMINATE: {
+            "func": _terminate,
+            "next": None,
+        },
+        constants.SEND_STATUS_LINE: {
+            "func": _send_status_line,
+            "next": constants.SEND_HEADERS,
+        },
+        constants.SEND_HEADERS: {
+            "func": _send_headers,
+            "next": constants.SEND_RESPONSE,
+        },
+        constants.SEND_RESPONSE: {
+            "func": _send_response,
+            "next": constants.GET_FIRST_LINE,
+        },
+    })
+
+    ## Binary state machine.
+    # states of the binary block protocol, in place of the HTTP states.
+    _binary_state_machine = util.state_table({
+        constants.GET_FIRST_LINE: {
+            "func": _get_frame_header,
+            "next": constants.GET_CONTENT,
+        },
+        constants.GET_CONTENT: {
+            "func": _get_frame_payload,
+            "next": constants.TERMINATE,
+        },
+        constants.TERMINATE: {
+            "func": _terminate,
+            "next": None,
+        },
+        constants.SEND_STATUS_LINE: {
+            "func": _send_frame,
+            "next": constants.GET_FIRST_LINE,
+        },
+    })
@@ -6,18 +6,48 @@ import socket
 import logging
 import urlparse
 import traceback
-import importlib
 
 from common import constants
+from common.request_context import RequestContext
 from common.utilities import util
+from common.utilities import block_util
 from common.services import service_base
 from common.pollables.pollable import Pollable
 from common.pollables.collable import Collable
 
+## Keys of request context kept for the whole connection.
+# an application keeps more keys with app_context["session_keys"].
+SESSION_KEYS = (
+    "state",
+    "fd_dict",
+    "app_context",
+    "callable",
+    "recv_buffer",
+    "send_buffer",
+)
+
 ## HTTP Socket.
 # pollable and callable class.
 # handles HTTP server with state machine for request process.
+# connections are persistent, after a response the state machine returns to its first state
+# for the next request, until the client asks to close or the maximum number of requests.
+# the connection is closed if the client doesn't make progress in time:
+# the request line and headers must arrive within the header timeout from their first byte,
+# the content must keep arriving within the body timeout,
+# a persistent connection must start the next request within the keep alive timeout,
+# otherwise the connection must make some progress within the idle timeout.
 class HttpSocket(Pollable, Collable):
+    __slots__ = (
+        "request_context",
+        "socket",
+        "service_class",
+        "_listener",
+        "_current_state",
+        "_requests",
+        "_keep_alive",
+        "_timer",
+        "_header_timer",
+    )
 
     ## Constructor.
     # @param socket (socket) socket.
@@ -25,72 +55,144 @@ class HttpSocket(Pollable, Collable):
     # @param app_context (dict) application context.
     # @param fd_dict (dict) dictionary of file descriptors.
     # @param service_class (class) class of self HTTP service.
+    # @param listener (TCPListener) listener which accepted the connection, notified on close.
     def __init__(
         self,
         socket,
         state,
         app_context,
         fd_dict,
-        service_class=service_base.ServiceBase()
+        service_class=service_base.ServiceBase(),
+        listener=None,
     ):
-        self.request_context = {
-            "code": 200,
-            "status": "OK",
-            "req_headers": {},
-            "headers": {},
-            "accounts": {},
-            "content": "",
-            "response": "",
-            "recv_buffer": "",
-            "send_buffer": "",
-        }
+        self.request_context = self._new_request_context()
+        self.request_context.recv_buffer = util.ReceiveBuffer(
+            app_context.get("recv_window", constants.RECV_WINDOW),
+        )
+        self.request_context.send_buffer = util.OutputQueue()
         self.socket = socket
-        self.request_context["state"] = state
-        self.request_context["fd_dict"] = fd_dict
-        self.request_context["app_context"] = app_context
-        self.request_context["callable"] = self
+        self.request_context.state = state
+        self.request_context.fd_dict = fd_dict
+        self.request_context.app_context = app_context
+        self.request_context.callable = self
         self.service_class = service_class
-        for service in constants.MODULE_DICT[app_context["block_device"]]:
-            importlib.import_module(service)
+        self._listener = listener
+
+        self._current_state = constants.GET_FIRST_LINE
+        self._requests = 0
+        self._keep_alive = False
+        self._timer = None
+        self._header_timer = False
+        self._arm_timer(app_context["idle_timeout"])
+
+    ## Return a new request context.
+    # contains the part of request context that belongs to a single request,
+    # the rest is kept for the whole connection.
+    def _new_request_context(
+        self,
+    ):
+        return RequestContext(
+            code=200,
+            status="OK",
+            req_headers={},
+            headers={},
+            accounts={},
+            content="",
+            response="",
+        )
+
+    ## Keys of request context kept for the whole connection.
+    # @returns (tuple) SESSION_KEYS, or the session keys of the application.
+    def _session_keys(
+        self,
+    ):
+        return self.request_context.app_context.get("session_keys", SESSION_KEYS)
 
-        self._state_machine = self._get_state_machine()
+    ## Prepare for the next request on the connection.
+    # replaces the request context, keeping the connection part of it,
+    # and returns the state machine to its first state.
+    def _reset(
+        self,
+    ):
+        request_context = self._new_request_context()
+        for key in self._session_keys():
+            request_context[key] = self.request_context.get(key)
+        self.request_context = request_context
+        self.request_context.recv_buffer.release()
+        self.service_class = service_base.ServiceBase()
         self._current_state = constants.GET_FIRST_LINE
+        self._keep_alive = False
+        self._header_timer = False
+        self._on_progress()
+
+    ## Whether the connection can be kept for another request.
+    # the client must not have asked to close it, the request content must have
+    # been consumed and the response must have a length, so the next request and
+    # response can be told apart from this one.
+    # a connection switched to another protocol is kept regardless of the number of requests.
+    def _can_keep_alive(
+        self,
+    ):
+        if self.request_context.get("upgrade") is not None:
+            return self.request_context.state != constants.CLOSING
+        connection = self.request_context.req_headers.get("Connection")
+        return (
+            self.request_context.state != constants.CLOSING and
+            self._requests < self.request_context.app_context["keep_alive_requests"] and
+            (connection is None or connection.lower() != "close") and
+            self.request_context.get("content_length") == 0 and
+            constants.CONTENT_LENGTH in self.request_context.headers
+        )
+
+    ## Arm own timeout.
+    # @param timeout (float) seconds until the connection times out.
+    # cancels the previously armed timeout.
+    def _arm_timer(
+        self,
+        timeout,
+    ):
+        server = self.request_context.app_context["server"]
+        server.cancel_timer(self._timer)
+        self._timer = server.add_timer(timeout, self._on_timeout)
+
+    ## Restart own timeout after progress.
+    # the header timeout is armed once when the request starts arriving and is not restarted.
+    # while a previous response is still being sent, the idle timeout is used.
+    def _on_progress(
+        self,
+    ):
+        app_context = self.request_context.app_context
+        if self.request_context.send_buffer:
+            self._arm_timer(app_context["idle_timeout"])
+        elif self._current_state in (
+            constants.GET_FIRST_LINE,
+            constants.GET_HEADERS,
+        ):
+            if (
+                self._current_state == constants.GET_FIRST_LINE and
+                self._requests and
+                not self.request_context.recv_buffer
+            ):
+                self._arm_timer(app_context["keep_alive_timeout"])
+            elif not self._header_timer:
+                self._header_timer = True
+                self._arm_timer(app_context["header_timeout"])
+        elif self._current_state == constants.GET_CONTENT:
+            self._arm_timer(app_context["body_timeout"])
+        else:
+            self._arm_timer(app_context["idle_timeout"])
 
-    ## Return own state machine.
-    # state machine contains all http states and their corresponding functions.
-    def _get_state_machine(
+    ## On timeout.
+    # called by the asynchronous server when the connection made no progress in time.
+    # drops pending output and closes the connection through the error path.
+    def _on_timeout(
         self,
     ):
-        return {
-            constants.GET_FIRST_LINE: {
-                "func": self._get_first_line,
-                "next": constants.GET_HEADERS,
-            },
-            constants.GET_HEADERS: {
-                "func": self._get_headers,
-                "next": constants.GET_CONTENT,
-            },
-            constants.GET_CONTENT: {
-                "func": self._get_content,
-                "next": constants.SEND_STATUS_LINE,
-            },
-            constants.SEND_STATUS_LINE: {
-                "func": self._send_status_line,
-                "next": constants.SEND_HEADERS,
-            },
-            constants.SEND_HEADERS: {
-                "func": self._send_headers,
-                "next": constants.SEND_RESPONSE,
-            },
-            constants.SEND_RESPONSE: {
-                "func": self._send_response,
-                "next": constants.TERMINATE,
-            },
-            constants.TERMINATE: {
-                "func": self._terminate,
-                "next": None,
-            },
-        }
+        logging.debug("fd %d timed out" % self.fileno())
+        self._timer = None
+        self.request_context.send_buffer.clear()
+        self.on_error()
+        self.request_context.app_context["server"].schedule(self)
 
     ## On read.
     # called when there's data ready to be received, reads that data to own request context.
@@ -99,7 +201,19 @@ class HttpSocket(Pollable, Collable):
     ):
         try:
             util.receive_buffer(self)
+            self._on_progress()
         except Exception as e:
+            # client closed the connection between requests
+            if (
+                self._current_state in (
+                    constants.GET_FIRST_LINE,
+                    constants.TERMINATE,
+                ) and
+                not self.request_context.recv_buffer
+            ):
+                logging.debug("fd %d closed by client" % self.fileno())
+                self.on_error()
+                return
             code = 500
             if isinstance(e, util.HTTPError):
                 code = e.code
@@ -116,7 +230,11 @@ class HttpSocket(Pollable, Collable):
     ):
         call_again = None
         try:
-            call_again = self._state_machine[self._current_state]["func"]()
+            error = self.request_context.get("error")
+            if error is not None:
+                self.request_context.error = None
+                raise error
+            call_again = self._state_machine[self._current_state]["func"](self)
         except Exception as e:
             code = 500
             if isinstance(e, util.HTTPError):
@@ -124,7 +242,7 @@ class HttpSocket(Pollable, Collable):
             traceback.print_exc()
             self.on_error()
             util.add_status(self, code, e)
-            self.request_context["response"] = e.message
+            self.request_context.response = e.message
             self.service_class = service_base.ServiceBase(self.request_context)
         if call_again is None:
             call_again = True
@@ -137,13 +255,12 @@ class HttpSocket(Pollable, Collable):
         self,
     ):
         try:
-            while self.request_context["send_buffer"]:
-                self.request_context["send_buffer"] = self.request_context["send_buffer"][
-                    self.socket.send(self.request_context["send_buffer"]):
-                ]
+            while self.request_context.send_buffer:
+                self.request_context.send_buffer.send(self.socket)
+                self._on_progress()
         except socket.error as e:
             if e.errno == errno.EPIPE:
-                self.request_context["send_buffer"] = ""
+                self.request_context.send_buffer.clear()
         except Exception as e:
             traceback.print_exc()
             self.on_error
@@ -154,45 +271,70 @@ class HttpSocket(Pollable, Collable):
     def on_error(
         self,
     ):
-        self.request_context["state"] = constants.CLOSING
+        self.request_context.state = constants.CLOSING
 
     # On close.
     # called when ready to close, closes own socket.
+    # cancels own timeout, gives up any block read still in progress, drops
+    # data that wasn't sent, closing files still being sent,
+    # and frees own place at the listener.
     def on_close(
         self,
     ):
-        self.socket.shutdown(socket.SHUT_WR)
-        pass
+        self.request_context.app_context["server"].cancel_timer(self._timer)
+        self._timer = None
+        self.request_context.send_buffer.clear()
+        block_util.abort_read(self.request_context)
+        if self._listener is not None:
+            self._listener.on_connection_closed()
+            self._listener = None
+        try:
+            self.socket.shutdown(socket.SHUT_WR)
+        except socket.error as e:
+            # client may have closed a persistent connection first
+            if e.errno != errno.ENOTCONN:
+                raise
 
     # On finish.
     # @param block (int) block of data received.
     # @param error (str) error occured during sleep time.
+    # @param block_num (int) index of the block received.
+    # @param blocks (dict) blocks received by their index, for a reply of several blocks.
     #
     # Called by own client to wake up the HTTP socket after client finished it's work.
+    # marks the socket runnable in the asynchronous server.
+    # wake ups of a closing socket, such as late replies after an error, are ignored.
+    # errors are kept until the socket runs, and handled there like errors of the state machine.
     #
     def on_finish(
         self,
         block="",
         error=None,
+        block_num=None,
+        blocks=None,
     ):
-        self.request_context["state"] = constants.ACTIVE
-        self.request_context["block"] = block
+        self.request_context.clients = max(
+            self.request_context.get("clients", 0) - 1,
+            0,
+        )
+        if self.request_context.state == constants.CLOSING:
+            return
+        self.request_context.state = constants.ACTIVE
+        self.request_context.app_context["server"].schedule(self)
+        self._on_progress()
+        self.request_context.block = block
+        self.request_context.replied_block_num = block_num
+        self.request_context.replied_blocks = blocks
+        wake_up_function = self.request_context.get("wake_up_function")
+        self.request_context.wake_up_function = None
         try:
             if error:
                 raise RuntimeError(str(error))
-            wake_up_function = self.request_context.get("wake_up_function")
-            self.request_context["wake_up_function"] = None
             if wake_up_function:
                 wake_up_function(self.request_context)
         except Exception as e:
-            code = 500
-            if isinstance(e, util.HTTPError):
-                code = e.code
-            traceback.print_exc()
-            self.on_error()
-            util.add_status(self, code, e)
-            self.request_context["response"] = e.message
-            self.service_class = service_base.ServiceBase(self.request_context)
+            # raised again by on_idle, so the error response is sent by the state machine
+            self.request_context.error = e
 
     def fileno(self):
         return self.socket.fileno()
@@ -203,8 +345,7 @@ class HttpSocket(Pollable, Collable):
     def _get_first_line(
         self,
     ):
-        req, self.request_context["recv_buffer"] = util.recv_line(
-            self.request_context["recv_buffer"])
+        req = util.recv_line(self.request_context.recv_buffer)
         if not req:
             return False
         req_comps = req.split(" ", 2)
@@ -221,27 +362,32 @@ class HttpSocket(Pollable, Collable):
         if not uri or uri[0] != '/' or '\\' in uri:
             raise RuntimeError("Invalid URI")
 
-        self.request_context["uri"] = uri
-        self.request_context["parsed"] = urlparse.urlparse(uri)
+        self.request_context.uri = uri
+        self.request_context.parsed = urlparse.urlparse(uri)
+        self._requests += 1
 
         logging.debug(
             "fd %d called method %s" % (
                 self.fileno(),
-                self.request_context["parsed"].path
+                self.request_context.parsed.path
             )
         )
 
-        REGISTRY = {
-            service.name(): service for service in service_base.ServiceBase.__subclasses__()
-        }
-        self.service_class = REGISTRY.get(
-            self.request_context["parsed"].path,
-            REGISTRY.get("*"),
-        )(self.request_context)
+        service = self.request_context.app_context["router"].get(
+            self.request_context.parsed.path,
+        )
+        if service is None:
+            raise util.HTTPError(
+                code=500,
+                status="Internal Error",
+                message="service not supported",
+            )
+        self.service_class = service(self.request_context)
         self._current_state = self._state_machine[self._current_state]["next"]
         self.service_class.before_request_headers(self.request_context)
-        self.request_context["req_headers"] = self.service_class.get_header_dict(
+        self.request_context.req_headers = self.service_class.get_header_dict(
         )
+        self.request_context.req_headers.setdefault("Connection", None)
 
     ## Get headers.
     # function called when on HTTP get headers state.
@@ -251,8 +397,8 @@ class HttpSocket(Pollable, Collable):
         self,
     ):
         if util.get_headers(self.request_context):
-            self.request_context["content_length"] = int(
-                self.request_context["req_headers"].get(
+            self.request_context.content_length = int(
+                self.request_context.req_headers.get(
                     constants.CONTENT_LENGTH, "0")
             )
             self._current_state = self._state_machine[self._current_state]["next"]
@@ -287,24 +433,34 @@ class HttpSocket(Pollable, Collable):
     def _send_status_line(
         self,
     ):
-        self.request_context["send_buffer"] += ((
+        # block device writes of this request, such as the blocks of an upload, may wait
+        # behind each other on a pipelined connection, the response reports them once done
+        if (
+            self.request_context.state != constants.CLOSING and
+            self.request_context.get("clients")
+        ):
+            return False
+        self.request_context.send_buffer.append((
             "%s %s %s\r\n"
         ) % (
             constants.HTTP_SIGNATURE,
-            self.request_context["code"],
-            self.request_context["status"],
-        )
-        ).encode("utf-8")
-        self.request_context["status_sent"] = True
+            self.request_context.code,
+            self.request_context.status,
+        ))
+        self.request_context.status_sent = True
         self.service_class.before_response_headers(self.request_context)
         self._current_state = self._state_machine[self._current_state]["next"]
 
     ## Send headers.
     # called when in HTTP send headers state.
+    # decides whether to keep the connection after the response and tells the client if not.
     # uses util to send all pending headers, switches to next state when done sending.
     def _send_headers(
         self,
     ):
+        self._keep_alive = self._can_keep_alive()
+        if not self._keep_alive:
+            self.request_context.headers["Connection"] = "close"
         if util.send_headers(self.request_context):
             self._current_state = self._state_machine[self._current_state]["next"]
         self.service_class.before_response_content(self.request_context)
@@ -318,9 +474,11 @@ class HttpSocket(Pollable, Collable):
         self,
     ):
         service_command = self.service_class.response(self.request_context)
-        if self.request_context["response"]:
-            self.request_context["send_buffer"] += self.request_context["response"]
-            self.request_context["response"] = ""
+        if self.request_context.response:
+            self.request_context.send_buffer.append(
+                self.request_context.response
+            )
+            self.request_context.response = ""
         if service_command is None:
             service_command = constants.MOVE_TO_NEXT_STATE
 
@@ -335,10 +493,83 @@ class HttpSocket(Pollable, Collable):
             return True
 
     ## Terminate.
-    # sets self state to closing.
+    # prepares for the next request if the connection is kept, otherwise sets self state to closing.
+    # the response may still be sent while the next request is received.
     def _terminate(
         self,
     ):
+        # block device requests of this request, such as the writes of an upload,
+        # finish before the next request starts, their replies wake this socket up
+        if (
+            self._keep_alive and
+            self.request_context.state != constants.CLOSING and
+            self.request_context.get("clients")
+        ):
+            return False
         self.service_class.before_terminate(self.request_context)
-        self.request_context["state"] = constants.CLOSING
+        if self._keep_alive and self.request_context.state != constants.CLOSING:
+            if self.request_context.get("upgrade") is not None:
+                self._switch_protocol(self.request_context.upgrade)
+                return False
+            self._reset()
+            return True
+        self.request_context.state = constants.CLOSING
         return False
+
+    ## Hand the connection over to another protocol.
+    # @param pollable_class (class) pollable which takes over the connection.
+    #
+    # a service switches the connection to another protocol by setting request context upgrade.
+    # the new pollable replaces this socket in the fd dictionary, with the socket, the buffers
+    # and the place at the listener. data that arrived after the switching request is kept.
+    #
+    def _switch_protocol(
+        self,
+        pollable_class,
+    ):
+        server = self.request_context.app_context["server"]
+        server.cancel_timer(self._timer)
+        self._timer = None
+        entry = pollable_class(
+            socket=self.socket,
+            request_context=RequestContext(**{
+                key: self.request_context.get(key) for key in self._session_keys()
+            }),
+            listener=self._listener,
+        )
+        self._listener = None
+        self.request_context.fd_dict[self.fileno()] = entry
+        server.schedule(entry)
+
+    ## State machine.
+    # contains all http states and their corresponding functions, indexed by state.
+    _state_machine = util.state_table({
+        constants.GET_FIRST_LINE: {
+            "func": _get_first_line,
+            "next": constants.GET_HEADERS,
+        },
+        constants.GET_HEADERS: {
+            "func": _get_headers,
+            "next": constants.GET_CONTENT,
+        },
+        constants.GET_CONTENT: {
+            "func": _get_content,
+            "next": constants.SEND_STATUS_LINE,
+        },
+        constants.SEND_STATUS_LINE: {
+            "func": _send_status_line,
+            "next": constants.SEND_HEADERS,
+        },
+        constants.SEND_HEADERS: {
+            "func": _send_headers,
+            "next": constants.SEND_RESPONSE,
+        },
+        constants.SEND_RESPONSE: {
+            "func": _send_response,
+            "next": constants.TERMINATE,
+        },
+        constants.TERMINATE: {
+            "func": _terminate,
+            "next": None,
+        },
+    })
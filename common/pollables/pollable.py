@@ -2,6 +2,8 @@
 # Base class of pollable objects with basic poll functions.
 ## @file pollable.py Implementation of @ref common.pollables.pollable
 class Pollable(object):
+    __slots__ = ()
+
     def on_read(self):
         return
 
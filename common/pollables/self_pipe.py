@@ -0,0 +1,93 @@
+## @package common.pollables.self_pipe
+# Class of self pipe object, which wakes up the asynchronous server from outside of the loop.
+## @file self_pipe.py Implementation of @ref common.pollables.self_pipe
+import collections
+import errno
+import fcntl
+import logging
+import os
+import traceback
+
+from common import constants
+from common.pollables.pollable import Pollable
+
+## Self Pipe.
+# pollable class which is always polled for reading.
+# writing a byte to the pipe makes the poller return, so the server can block without a timeout
+# and still react to signals, worker threads and timers.
+class SelfPipe(Pollable):
+
+    ## Constructor.
+    def __init__(
+        self,
+    ):
+        self.request_context = {
+            "state": constants.LISTENER,
+            "recv_buffer": "",
+            "send_buffer": "",
+        }
+        self._callbacks = collections.deque()
+        self._read_fd, self._write_fd = os.pipe()
+        for fd in (self._read_fd, self._write_fd):
+            fcntl.fcntl(
+                fd,
+                fcntl.F_SETFL,
+                fcntl.fcntl(fd, fcntl.F_GETFL) | os.O_NONBLOCK,
+            )
+
+    ## Wake up the server.
+    # @param function (function) optional function to call from the server loop.
+    #
+    # safe to call from signal handlers and other threads.
+    # does nothing once the pipe is closing.
+    #
+    def wake_up(
+        self,
+        function=None,
+    ):
+        if self.request_context["state"] == constants.CLOSING:
+            return
+        if function is not None:
+            self._callbacks.append(function)
+        try:
+            os.write(self._write_fd, b"\0")
+        except OSError as e:
+            if e.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                raise
+
+    ## On read
+    # drains the pipe and calls all pending functions.
+    def on_read(
+        self,
+    ):
+        try:
+            while os.read(self._read_fd, constants.BLOCK_SIZE):
+                pass
+        except OSError as e:
+            if e.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                raise
+        while self._callbacks:
+            try:
+                self._callbacks.popleft()()
+            except Exception:
+                logging.error(traceback.format_exc())
+
+    def on_write(self):
+        pass
+
+    ## On error
+    # sets own state to closing.
+    def on_error(self):
+        self.request_context["state"] = constants.CLOSING
+
+    ## On close
+    # closes both ends of the pipe.
+    def on_close(self):
+        os.close(self._read_fd)
+        os.close(self._write_fd)
+
+    def fileno(self):
+        return self._read_fd
+
+    def on_idle(self):
+        pass
@@ -1,20 +1,57 @@
 ## @package common.pollables.tcp_listener
 # Class of TCP listener object, which listens for new connections and adds them to poller.
 ## @file tcp_listener.py Implementation of @ref common.pollables.tcp_listener
+import errno
 import socket
 import logging
+import sys
 
 from common import constants
 from common.pollables.pollable import Pollable
 
+## SO_REUSEPORT socket option, missing from the socket module of python 2.
+SO_REUSEPORT = getattr(
+    socket,
+    "SO_REUSEPORT",
+    15 if sys.platform.startswith("linux") else None,
+)
+
+## Create listening socket.
+# @param bind_address (str) bind address.
+# @param bind_port (int) bind port.
+# @param backlog (int) listen backlog.
+# @param reuse_port (bool) whether other processes may bind the same port.
+# @returns (socket) non blocking listening socket.
+#
+# reuse_port lets the kernel balance new connections between processes that
+# each bind their own listener.
+#
+def create_socket(
+    bind_address,
+    bind_port,
+    backlog,
+    reuse_port=False,
+):
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if reuse_port:
+            s.setsockopt(socket.SOL_SOCKET, SO_REUSEPORT, 1)
+        s.bind((bind_address, bind_port))
+        s.listen(backlog)
+        s.setblocking(False)
+    except Exception:
+        s.close()
+        raise
+    return s
+
 ## TCP Listener
 # pollable class which listens for new connections.
+#
+# connections are accepted in batches, and the listener stops polling while
+# max_connections accepted connections are open, new connections wait in the backlog.
+#
 class TCPListener(Pollable):
-    request_context = {
-        "state": constants.LISTENER,
-        "recv_buffer": "",
-        "send_buffer": "",
-    }
 
     ## Constructor
     # @param bind_address (str) bind address.
@@ -22,6 +59,10 @@ class TCPListener(Pollable):
     # @param initiate (class) class to create after receiving new connection.
     # @param app_context (dict) application context.
     # @param fd_dict (dict) dictionary containing all current pollables
+    # @param sock (socket) optional listening socket inherited from a parent process.
+    #
+    # when app_context reuse_port is set, the listener binds with SO_REUSEPORT so
+    # several worker processes may listen on the same port.
     #
     def __init__(
         self,
@@ -30,29 +71,73 @@ class TCPListener(Pollable):
         initiate,
         app_context,
         fd_dict,
+        sock=None,
     ):
+        self.request_context = {
+            "state": constants.LISTENER,
+            "recv_buffer": "",
+            "send_buffer": "",
+        }
         self._initiate = initiate
         self._app_context = app_context
         self._fd_dict = fd_dict
+        self._max_connections = app_context["max_connections"]
+        self._accept_batch = app_context.get(
+            "accept_batch",
+            constants.ACCEPT_BATCH,
+        )
+        self._connections = 0
 
-        self.fd = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.fd.bind((bind_address, bind_port))
-        self.fd.listen(app_context["max_connections"])
-        self.fd.setblocking(False)
+        if sock is None:
+            sock = create_socket(
+                bind_address,
+                bind_port,
+                app_context["max_connections"],
+                reuse_port=app_context.get("reuse_port", False),
+            )
+        self.fd = sock
 
     ## On read
-    # reads new connection.
-    # creates pollable class to handle that connection, adds it to general fd dict.
+    # reads new connections until there are no more, up to accept batch connections.
+    # creates pollable class to handle every connection, adds it to general fd dict
+    # and marks it runnable.
+    # goes to sleep when reaching max connections.
     def on_read(
         self,
     ):
-        client, addr = self.fd.accept()
-        self._fd_dict[client.fileno()] = self._initiate(
-            socket=client,
-            state=constants.ACTIVE,
-            app_context=self._app_context,
-            fd_dict=self._fd_dict
-        )
+        for i in range(self._accept_batch):
+            if self._connections >= self._max_connections:
+                self.request_context["state"] = constants.SLEEPING
+                break
+            try:
+                client, addr = self.fd.accept()
+            except socket.error as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    break
+                raise
+            client.setblocking(False)
+            client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            entry = self._initiate(
+                socket=client,
+                state=constants.ACTIVE,
+                app_context=self._app_context,
+                fd_dict=self._fd_dict,
+                listener=self,
+            )
+            self._connections += 1
+            self._fd_dict[client.fileno()] = entry
+            self._app_context["server"].schedule(entry)
+
+    ## On connection closed.
+    # called by a connection accepted by this listener when it's closed.
+    # wakes up the listener if it was sleeping at max connections.
+    def on_connection_closed(
+        self,
+    ):
+        self._connections -= 1
+        if self.request_context["state"] == constants.SLEEPING:
+            self.request_context["state"] = constants.LISTENER
+            self._app_context["server"].schedule(self)
 
     def on_write(self):
         pass
@@ -0,0 +1,151 @@
+## @package common.request_context
+# Request context of connections.
+## @file request_context.py Implementation of @ref common.request_context
+
+## Keys kept in slots.
+# the connection part of the request context, and the request keys used by
+# the HTTP state machines. other keys are kept in a dictionary created on first use.
+SLOTS = (
+    "state",
+    "fd_dict",
+    "app_context",
+    "callable",
+    "recv_buffer",
+    "send_buffer",
+    "authorization",
+    "authenticated_header",
+    "parent",
+    "device",
+    "code",
+    "status",
+    "req_headers",
+    "headers",
+    "accounts",
+    "content",
+    "response",
+    "uri",
+    "parsed",
+    "content_length",
+    "status_sent",
+    "upgrade",
+    "error",
+    "action",
+    "block",
+    "block_num",
+    "replied_block_num",
+    "replied_blocks",
+    "request_id",
+    "opcode",
+    "reply_opcode",
+    "clients",
+    "pipelines",
+    "wake_up_function",
+    "read_blocks",
+    "read_nums",
+)
+
+_SLOTS = frozenset(SLOTS)
+
+## Request context class.
+#
+# holds the state of a request and of its connection in slots, instead of a
+# dictionary per request. the connection pollables use the slots as attributes,
+# services use it as a dictionary.
+# a missing key raises KeyError, like a dictionary.
+#
+class RequestContext(object):
+    __slots__ = SLOTS + ("__dict__",)
+
+    ## Constructor.
+    # @param values (dict) initial keys and values.
+    def __init__(
+        self,
+        **values
+    ):
+        for key, value in values.items():
+            self[key] = value
+
+    def __getitem__(
+        self,
+        key,
+    ):
+        if key in _SLOTS:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key)
+        return self.__dict__[key]
+
+    def __setitem__(
+        self,
+        key,
+        value,
+    ):
+        if key in _SLOTS:
+            setattr(self, key, value)
+        else:
+            self.__dict__[key] = value
+
+    def __delitem__(
+        self,
+        key,
+    ):
+        if key in _SLOTS:
+            try:
+                delattr(self, key)
+            except AttributeError:
+                raise KeyError(key)
+        else:
+            del self.__dict__[key]
+
+    def __contains__(
+        self,
+        key,
+    ):
+        if key in _SLOTS:
+            return hasattr(self, key)
+        return key in self.__dict__
+
+    ## Get value.
+    # @param key (str) key.
+    # @param default (object) value of a missing key.
+    def get(
+        self,
+        key,
+        default=None,
+    ):
+        if key in _SLOTS:
+            return getattr(self, key, default)
+        return self.__dict__.get(key, default)
+
+    ## Get value, setting a missing key.
+    # @param key (str) key.
+    # @param default (object) value set for a missing key.
+    def setdefault(
+        self,
+        key,
+        default=None,
+    ):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    ## Remove key.
+    # @param key (str) key.
+    # @param default (object) value of a missing key.
+    def pop(
+        self,
+        key,
+        default=None,
+    ):
+        value = self.get(key, default)
+        if key in self:
+            del self[key]
+        return value
+
+    ## Keys.
+    # @returns (list) keys set.
+    def keys(
+        self,
+    ):
+        return [key for key in SLOTS if hasattr(self, key)] + list(self.__dict__)
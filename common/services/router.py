@@ -0,0 +1,60 @@
+## @package common.services.router
+# Routing of request paths and client actions to services.
+## @file router.py Implementation of @ref common.services.router
+import importlib
+import inspect
+
+from common.services.service_base import ServiceBase
+
+## Router class.
+# built once at startup from a list of service modules, and shared by all connections.
+# a path is looked up by exact name first, then by the longest name ending with "*"
+# that it starts with, then falls back to the service named "*".
+class Router(object):
+
+    ## Constructor.
+    # @param modules (list) names of service modules.
+    # imports every module and registers the services it defines.
+    def __init__(
+        self,
+        modules,
+    ):
+        self._services = {}
+        self._prefixes = []
+        for module in modules:
+            module = importlib.import_module(module)
+            for service in vars(module).values():
+                if (
+                    inspect.isclass(service) and
+                    issubclass(service, ServiceBase) and
+                    service.__module__ == module.__name__
+                ):
+                    self._services[service.name()] = service
+        self._fallback = self._services.pop("*", None)
+        for name in list(self._services):
+            if name.endswith("*"):
+                self._prefixes.append((name[:-1], self._services.pop(name)))
+        self._prefixes.sort(key=lambda prefix: -len(prefix[0]))
+
+    ## Whether a service is registered by exact name.
+    # @param name (str) service name.
+    def __contains__(
+        self,
+        name,
+    ):
+        return name in self._services
+
+    ## Get service.
+    # @param path (str) request path or client action.
+    # @returns (class) service class, None if no service matches.
+    def get(
+        self,
+        path,
+    ):
+        service = self._services.get(path)
+        if service is not None:
+            return service
+        for prefix, service in self._prefixes:
+            if path.startswith(prefix):
+                return service
+        return self._fallback
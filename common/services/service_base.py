@@ -160,56 +160,23 @@ class ServiceBase(object):
         index = len(constants.INIT_SIGNATURE)
         self._bitmaps = struct.unpack(">B", init[index:index+1])[0]
         self._dir_roots = struct.unpack(">B", init[index+1:index+2])[0]
-        self._current_bitmap = 1
         self._bitmap = bytearray(0)
-        block_util.bd_action(
-            request_context=request_context,
-            block_num=self._current_bitmap,
-            action=constants.READ,
-            service_wake_up=self._construct_bitmap,
+        self._root = bytearray(0)
+        block_util.read_blocks(
+            request_context,
+            range(1, self._bitmaps + self._dir_roots + 1),
+            self._construct_metadata,
         )
 
-    ## Construct bitmap.
-    # this function wakes up after receiving bitmap, and if it's not the last then requests next bitmap part.
-    # when entire bitmap construced, proceeds to wake up the directory root construction function.
-    def _construct_bitmap(
-        self,
-        request_context,
-    ):
-        self._current_bitmap += 1
-        self._bitmap += request_context["block"]
-        if self._current_bitmap <= self._bitmaps:
-            block_util.bd_action(
-                request_context=request_context,
-                block_num=self._current_bitmap,
-                action=constants.READ,
-                service_wake_up=self._construct_bitmap,
-            )
-        else:
-            self._current_root = self._bitmaps + 1
-            self._root = bytearray(0)
-            block_util.bd_action(
-                request_context=request_context,
-                block_num=self._current_root,
-                action=constants.READ,
-                service_wake_up=self._construct_root,
-            )
-
-    ## Construct directory root
-    # wakes up after receiving directory root part.
-    # if not last part, requests next part and constructs entire directory root.
-    def _construct_root(
+    ## Construct bitmap and directory root.
+    # this function wakes up after receiving all bitmap and directory root blocks, which are read at once.
+    # constructs entire bitmap and directory root, then wakes up the function provided to parse core.
+    def _construct_metadata(
         self,
         request_context,
     ):
-        self._current_root += 1
-        self._root += request_context["block"]
-        if self._current_root <= self._dir_roots + self._bitmaps:
-            block_util.bd_action(
-                request_context=request_context,
-                block_num=self._current_root,
-                action=constants.READ,
-                service_wake_up=self._construct_root,
-            )
-        else:
-            self._wake_up_function(request_context)
+        for block in request_context["blocks"][:self._bitmaps]:
+            self._bitmap += block
+        for block in request_context["blocks"][self._bitmaps:]:
+            self._root += block
+        self._wake_up_function(request_context)
@@ -0,0 +1,164 @@
+## @package common.supervisor
+# Supervisor of pre-forked worker processes.
+## @file supervisor.py Implementation of @ref common.supervisor
+import logging
+import multiprocessing
+import os
+import signal
+import time
+
+from common import constants
+
+## Supervisor.
+#
+# Starts a number of worker processes running the same target, restarts workers that die
+# and forwards termination to all of them.
+# A worker that exits soon after it started is restarted with an exponential backoff,
+# after WORKER_MAX_FAILURES such exits in a row the supervisor stops all workers and fails.
+# Workers are multiprocessing processes, so objects shared by multiprocessing, such as
+# semaphores and manager proxies created before start, are valid in every worker.
+#
+class Supervisor(object):
+
+    ## Whether to terminate supervisor.
+    _terminate = False
+
+    ## Constructor.
+    # @param workers (int) number of worker processes.
+    # @param target (function) function every worker runs.
+    # @param args (tuple) arguments of target.
+    # @param interval (float) seconds between checks of the workers.
+    #
+    def __init__(
+        self,
+        workers,
+        target,
+        args=(),
+        interval=constants.WORKER_CHECK_INTERVAL,
+    ):
+        self._target = target
+        self._args = args
+        self._interval = interval
+        self._processes = [None] * workers
+        self._started = [None] * workers
+        self._failures = [0] * workers
+        self._restart_time = [None] * workers
+        self._pid = os.getpid()
+
+    ## Stop supervisor function.
+    # may be called from a signal handler, so it only raises the flag.
+    #
+    # a worker inherits this handler until it installs its own, so a worker
+    # signalled that early exits instead.
+    #
+    def stop(self, signum, frame):
+        if os.getpid() != self._pid:
+            raise SystemExit(1)
+        self._terminate = True
+
+    ## Start a worker.
+    # @param index (int) worker index.
+    def _start(
+        self,
+        index,
+    ):
+        process = multiprocessing.Process(
+            target=self._target,
+            args=self._args,
+            name="worker-%d" % index,
+        )
+        process.daemon = True
+        process.start()
+        self._processes[index] = process
+        self._started[index] = time.time()
+        self._restart_time[index] = None
+        logging.debug("Started %s pid %s" % (process.name, process.pid))
+
+    ## Handle the exit of a worker.
+    # @param index (int) worker index.
+    # @returns (bool) whether the worker may be restarted.
+    #
+    # a worker that ran for WORKER_STARTUP_TIME is restarted at once. a worker that exits
+    # sooner, for example on a bad config or a port in use, is restarted after a delay
+    # doubled with every such exit in a row, until WORKER_MAX_FAILURES.
+    #
+    def _exited(
+        self,
+        index,
+    ):
+        process = self._processes[index]
+        process.join()
+        self._processes[index] = None
+        now = time.time()
+        if now - self._started[index] >= constants.WORKER_STARTUP_TIME:
+            self._failures[index] = 0
+            delay = 0
+        else:
+            self._failures[index] += 1
+            if self._failures[index] >= constants.WORKER_MAX_FAILURES:
+                logging.error(
+                    "%s pid %s exited with %s, %d startup failures, giving up" % (
+                        process.name,
+                        process.pid,
+                        process.exitcode,
+                        self._failures[index],
+                    )
+                )
+                return False
+            delay = min(
+                self._interval * 2 ** (self._failures[index] - 1),
+                constants.WORKER_MAX_RESTART_DELAY,
+            )
+        logging.error(
+            "%s pid %s exited with %s, restarting in %s seconds" % (
+                process.name,
+                process.pid,
+                process.exitcode,
+                delay,
+            )
+        )
+        self._restart_time[index] = now + delay
+        return True
+
+    ## Run supervisor.
+    # @returns (int) exit status, 1 if a worker kept failing on startup.
+    #
+    # starts all workers and restarts dead ones until stopped,
+    # then sends SIGTERM to all workers and waits for them.
+    #
+    def run(self):
+        status = 0
+        for index in range(len(self._processes)):
+            self._start(index)
+
+        while not self._terminate:
+            # sleep returns early when a signal arrives
+            time.sleep(self._interval)
+            for index, process in enumerate(self._processes):
+                if self._terminate:
+                    break
+                if process is not None and not process.is_alive():
+                    if not self._exited(index):
+                        status = 1
+                        self._terminate = True
+                        break
+                if (
+                    self._processes[index] is None and
+                    time.time() >= self._restart_time[index]
+                ):
+                    self._start(index)
+
+        logging.debug("Terminating workers")
+        processes = [process for process in self._processes if process is not None]
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        for process in processes:
+            process.join()
+        logging.debug("supervisor terminated")
+        return status
+
+## Ignore SIGINT.
+# initializer for helper processes that should only be stopped by their owner.
+def ignore_sigint():
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
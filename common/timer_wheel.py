@@ -0,0 +1,182 @@
+## @package common.timer_wheel
+# Hierarchical timer wheel used by the asynchronous server for timeouts.
+## @file timer_wheel.py Implementation of @ref common.timer_wheel
+import logging
+import time
+import traceback
+
+from common import constants
+
+## Timer.
+# a single armed timer, returned by the wheel so it can be cancelled later.
+class Timer(object):
+    ## Constructor.
+    # @param tick (int) tick in which the timer expires.
+    # @param callback (function) function to call on expiry.
+    def __init__(
+        self,
+        tick,
+        callback,
+    ):
+        self.tick = tick
+        self.callback = callback
+        self.slot = None
+
+## Timer Wheel.
+#
+# Timers are kept in levels of slots, every level covering a range of ticks that is
+# slots times larger than the level below it.
+# Arming a timer puts it in a single slot and cancelling removes it from that slot, both O(1).
+# When the lower level completes a rotation, the matching slot of the next level is cascaded down.
+#
+class TimerWheel(object):
+
+    ## Constructor.
+    # @param resolution (int) length of a tick in milliseconds.
+    # @param slots (int) number of slots in every level.
+    # @param levels (int) number of levels.
+    def __init__(
+        self,
+        resolution=constants.TIMER_RESOLUTION,
+        slots=constants.TIMER_SLOTS,
+        levels=constants.TIMER_LEVELS,
+    ):
+        self._resolution = resolution
+        self._slots = slots
+        self._levels = [
+            [set() for i in range(slots)] for l in range(levels)
+        ]
+        self._current = self._get_tick()
+        self._count = 0
+
+    ## Number of armed timers.
+    def __len__(self):
+        return self._count
+
+    ## Get tick of a time.
+    # @param now (float) time in seconds, current time if None.
+    # @returns (int) tick of the time.
+    def _get_tick(
+        self,
+        now=None,
+    ):
+        if now is None:
+            now = time.time()
+        return int(now * 1000 / self._resolution)
+
+    ## Put timer in it's slot according to it's distance from current tick.
+    # @param timer (Timer) timer.
+    def _place(
+        self,
+        timer,
+    ):
+        delta = max(timer.tick - self._current, 0)
+        level = 0
+        span = self._slots
+        while delta >= span and level < len(self._levels) - 1:
+            level += 1
+            span *= self._slots
+        if delta >= span:
+            timer.tick = self._current + span - 1
+        timer.slot = self._levels[level][
+            (timer.tick // (span // self._slots)) % self._slots
+        ]
+        timer.slot.add(timer)
+
+    ## Arm a timer.
+    # @param delay (float) seconds until expiry.
+    # @param callback (function) function to call on expiry.
+    # @param now (float) time in seconds, current time if None.
+    # @returns (Timer) the armed timer.
+    def add(
+        self,
+        delay,
+        callback,
+        now=None,
+    ):
+        if not self._count:
+            self._current = self._get_tick(now)
+        timer = Timer(
+            self._current + max(
+                int(delay * 1000 / self._resolution + 0.5), 1
+            ),
+            callback,
+        )
+        self._place(timer)
+        self._count += 1
+        return timer
+
+    ## Cancel a timer.
+    # @param timer (Timer) timer to cancel, may have already expired.
+    def cancel(
+        self,
+        timer,
+    ):
+        if timer is not None and timer.slot is not None:
+            timer.slot.discard(timer)
+            timer.slot = None
+            self._count -= 1
+
+    ## Cascade timers of higher levels when lower levels complete a rotation.
+    def _cascade(self):
+        span = 1
+        for level in range(1, len(self._levels)):
+            span *= self._slots
+            if self._current % span:
+                break
+            slot = self._levels[level][(self._current // span) % self._slots]
+            timers = list(slot)
+            slot.clear()
+            for timer in timers:
+                self._place(timer)
+
+    ## Expire all timers that are due.
+    # @param now (float) time in seconds, current time if None.
+    #
+    # advances the wheel tick by tick until the current time and calls the callbacks of expired timers.
+    #
+    def expire(
+        self,
+        now=None,
+    ):
+        target = self._get_tick(now)
+        if not self._count:
+            self._current = max(self._current, target)
+            return
+        while self._current < target and self._count:
+            self._current += 1
+            self._cascade()
+            slot = self._levels[0][self._current % self._slots]
+            while slot:
+                timer = slot.pop()
+                timer.slot = None
+                self._count -= 1
+                try:
+                    timer.callback()
+                except Exception:
+                    logging.error(traceback.format_exc())
+        self._current = max(self._current, target)
+
+    ## Get the time until the next timer may expire.
+    # @param now (float) time in seconds, current time if None.
+    # @returns (int) milliseconds until the next expiry or cascade, -1 if no timers armed.
+    #
+    # only the lowest level is searched, so this is bounded by the number of slots.
+    #
+    def next_timeout(
+        self,
+        now=None,
+    ):
+        if not self._count:
+            return -1
+        ticks = self._slots - self._current % self._slots
+        for i in range(1, ticks + 1):
+            if self._levels[0][(self._current + i) % self._slots]:
+                ticks = i
+                break
+        if now is None:
+            now = time.time()
+        return max(
+            int((self._current + ticks) * self._resolution - now * 1000) + 1,
+            0,
+        )
@@ -2,10 +2,8 @@
 #
 # Various block handling utilities.
 ## @file block_util.py Implementation of @ref common.utilities.block_util
-import errno
 import socket
 from common import constants
-from common.utilities import util
 from common.utilities import integration_util
 from common.utilities import encryption_util
 import logging
@@ -28,99 +26,159 @@ def bd_action(
 ):
     request_context["block_num"] = block_num
     if action == constants.READ:
-        if not request_context["app_context"]["semaphore"].acquire(False):
-            raise RuntimeError('Disk busy')
-        request_context["service_wake_up"] = service_wake_up
-        request_context["read_block"] = None
-        read_block(request_context)
+        read_blocks(
+            request_context,
+            [block_num],
+            service_wake_up,
+        )
     elif action == constants.WRITE:
-        if request_context["app_context"]["semaphore"].get_value() == 0:
-            raise RuntimeError('Disk busy')
-        while request_context["app_context"]["semaphore"].acquire(False):
-            pass
-        write_block(request_context, block)
+        write_blocks(request_context, [(block_num, block)])
     else:
         raise RuntimeError('Invalid action')
 
-## Read block from devices.
+## Read blocks from devices.
+# @param request_context (dict) sender request context.
+# @param block_nums (list) indices of wanted blocks.
+# @param service_wake_up (function) function that is called when all blocks are read.
+#
+# Requests all blocks at once, several blocks are read from every block device with
+# vectored reads of up to READV_MAX_BLOCKS blocks, pipelined on one connection.
+# Wakes up service with the blocks in request context blocks,
+# in the order of block numbers, and with the first of them in request context block.
+#
+def read_blocks(
+    request_context,
+    block_nums,
+    service_wake_up,
+):
+    if not request_context["app_context"]["semaphore"].acquire(False):
+        raise RuntimeError('Disk busy')
+    request_context["service_wake_up"] = service_wake_up
+    request_context["read_nums"] = list(block_nums)
+    request_context["read_blocks"] = {}
+    request_context["replies"] = 0
+    request_context["wake_up_function"] = read_block
+    request_context["state"] = constants.SLEEPING
+    unique_nums = []
+    for block_num in request_context["read_nums"]:
+        if block_num not in request_context["read_blocks"]:
+            request_context["read_blocks"][block_num] = bytearray(constants.BLOCK_SIZE)
+            unique_nums.append(block_num)
+    for d in request_context["app_context"]["devices"]:
+        for index in range(0, len(unique_nums), constants.READV_MAX_BLOCKS):
+            batch = unique_nums[index:index + constants.READV_MAX_BLOCKS]
+            if len(batch) == 1:
+                init_client(
+                    request_context,
+                    constants.READ,
+                    batch[0],
+                    block_device_id=d,
+                )
+            else:
+                init_client(
+                    request_context,
+                    constants.READV,
+                    batch,
+                    block_device_id=d,
+                )
+
+## Read block part.
 # @param request_context (dict) requst context.
 #
-# Initializes cliens to read splitted blocks from block devices.
-# For every block part received, adds it to constructed block.
-# When all parts received, decrypts block with frontend key and wakes up service with block.
+# Called for every reply of a block device, with a part of one block or parts of several blocks.
+# adds the parts to the constructed blocks.
+# When all parts of all blocks received, decrypts blocks with frontend key and wakes up service.
 #
 def read_block(
     request_context,
 ):
-    if request_context.get("read_block") is None:
-        request_context["read_block"] = bytearray(constants.BLOCK_SIZE)
-        request_context["replies"] = 0
-        request_context["wake_up_function"] = read_block
+    read_blocks = request_context["read_blocks"]
+    replied_blocks = request_context["replied_blocks"]
+    if replied_blocks is None:
+        replied_blocks = {
+            request_context["replied_block_num"]: request_context["block"],
+        }
+    for block_num, block in replied_blocks.items():
+        request_context["replies"] += 1
+        integration_util.xor_into(read_blocks[block_num], block)
+    if request_context["replies"] < len(read_blocks) * len(
+            request_context["app_context"]["devices"]):
         request_context["state"] = constants.SLEEPING
-        for d in request_context["app_context"]["devices"]:
-            init_client(
-                request_context,
-                constants.READ,
-                request_context["block_num"],
-                block_device_id=d,
-            )
+        request_context["wake_up_function"] = read_block
+        return
 
-    else:
-        request_context["replies"] += 1
-        request_context["read_block"] = integration_util.decrypt_data([
-            request_context["read_block"],
-            request_context["block"],
-        ]
+    request_context["app_context"]["semaphore"].release()
+    for block_num in read_blocks:
+        aes = request_context["app_context"]["block_key"].get_aes(block_num)
+        read_blocks[block_num] = encryption_util.decrypt_block_aes(
+            aes,
+            read_blocks[block_num],
         )
-        if request_context.get("replies") == len(
-                request_context["app_context"]["devices"]):
-            request_context["app_context"]["semaphore"].release()
-            aes = encryption_util.get_aes(
-                key=request_context["app_context"]["config"].get(
-                    'frontend', 'key'),
-                ivkey=request_context["app_context"]["config"].get(
-                    'frontend', 'ivkey'),
-                block_num=request_context["block_num"],
-            )
-            request_context["read_block"] = encryption_util.decrypt_block_aes(
-                aes,
-                request_context["read_block"],
-            )
-            request_context["block"] = request_context["read_block"]
-            request_context["read_block"] = None
-            request_context["service_wake_up"](request_context)
-        else:
-            request_context["state"] = constants.SLEEPING
-            request_context["wake_up_function"] = read_block
+    request_context["blocks"] = [
+        read_blocks[block_num] for block_num in request_context["read_nums"]
+    ]
+    request_context["block"] = request_context["blocks"][0]
+    request_context["read_blocks"] = None
+    request_context["service_wake_up"](request_context)
 
-## Write block to devices.
+## Abort block read.
 # @param request_context (dict) requst context.
-# @param block (str) block data to write.
 #
-# Encrypts block with frontend key, then splits to multiple parts.
-# Initializes cliens to write splitted parts to block devices.
+# Called when the sender stops waiting for a block read that is still in progress.
+# Releases the read semaphore slot, replies that arrive later are ignored by the sender.
 #
-def write_block(
+def abort_read(
     request_context,
-    block,
 ):
-    aes = encryption_util.get_aes(
-        key=request_context["app_context"]["config"].get('frontend', 'key'),
-        ivkey=request_context["app_context"]["config"].get(
-            'frontend', 'ivkey'),
-        block_num=request_context["block_num"],
-    )
-    block = encryption_util.encrypt_block_aes(aes, block)
-    block_list = integration_util.encrypt_data(block, len(request_context["app_context"]["devices"]))
-    for i in range(len(request_context["app_context"]["devices"])):
-        init_client(
-            request_context=request_context,
-            client_action=constants.WRITE,
-            client_block_num=request_context["block_num"],
-            block=block_list[i],
-            block_device_id=request_context["app_context"]["devices"].keys()[
-                i],
-        )
+    if request_context.get("read_blocks") is not None:
+        request_context["read_blocks"] = None
+        request_context["app_context"]["semaphore"].release()
+
+## Write blocks to devices.
+# @param request_context (dict) requst context.
+# @param blocks (list) tuples of block index and block data to write.
+#
+# Encrypts every block with frontend key, then splits it to multiple parts.
+# Writes the parts of all blocks at once, several blocks are written to every block device
+# with vectored writes of up to WRITEV_MAX_BLOCKS blocks, pipelined on one connection.
+#
+def write_blocks(
+    request_context,
+    blocks,
+):
+    if request_context["app_context"]["semaphore"].get_value() == 0:
+        raise RuntimeError('Disk busy')
+    while request_context["app_context"]["semaphore"].acquire(False):
+        pass
+    devices = request_context["app_context"]["devices"].keys()
+    block_nums = []
+    parts = [[] for d in devices]
+    for block_num, block in blocks:
+        aes = request_context["app_context"]["block_key"].get_aes(block_num)
+        block = encryption_util.encrypt_block_aes(aes, block)
+        block_list = integration_util.encrypt_data(block, len(devices))
+        block_nums.append(block_num)
+        for i in range(len(devices)):
+            parts[i].append(block_list[i])
+    for i in range(len(devices)):
+        for index in range(0, len(block_nums), constants.WRITEV_MAX_BLOCKS):
+            batch = block_nums[index:index + constants.WRITEV_MAX_BLOCKS]
+            if len(batch) == 1:
+                init_client(
+                    request_context=request_context,
+                    client_action=constants.WRITE,
+                    client_block_num=batch[0],
+                    block=parts[i][index],
+                    block_device_id=devices[i],
+                )
+            else:
+                init_client(
+                    request_context=request_context,
+                    client_action=constants.WRITEV,
+                    client_block_num=batch,
+                    block=parts[i][index:index + constants.WRITEV_MAX_BLOCKS],
+                    block_device_id=devices[i],
+                )
     while request_context["app_context"]["semaphore"].get_value(
     ) < constants.MAX_SEMAPHORE:
         request_context["app_context"]["semaphore"].release()
@@ -132,22 +190,63 @@ def write_block(
 # @param block_device_id (str) block device with which client should interact.
 # @param block (str) block data in case of write.
 #
-# creates a pollable client object.
-# connects client socket to block device.
-# adds client to asynchronous poller.
-# 
+# starts a client and counts it in the request context until it wakes up the sender.
+#
 def init_client(
     request_context,
     client_action,
     client_block_num,
     block_device_id,
     block=None,
+):
+    start_client(
+        request_context=request_context,
+        client_action=client_action,
+        client_block_num=client_block_num,
+        block_device_id=block_device_id,
+        block=block,
+    )
+    request_context["clients"] = request_context.get("clients", 0) + 1
+
+## Start client function.
+# @param request_context (dict) request context.
+# @param client_action (str) whether client should read/write.
+# @param client_block_num (int) block index to preform action with.
+# @param block_device_id (str) block device with which client should interact.
+# @param block (str) block data in case of write.
+# @param reuse (bool) whether to use an idle connection from the connection pool.
+#
+# requests of a sender to a block device are pipelined on one client, the request
+# is added to the sender's client of that device while it's still working.
+# otherwise creates a pollable client object.
+# takes a connection to block device from the pool, or starts connecting a new client socket.
+# adds client to asynchronous poller and marks it runnable.
+# connect errors are reported to the sender by the client, through on_finish.
+#
+def start_client(
+    request_context,
+    client_action,
+    client_block_num,
+    block_device_id,
+    block=None,
+    reuse=True,
 ):
     from common.pollables.http_client import HttpClient
-    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    pipelines = request_context.setdefault("pipelines", {})
+    client = pipelines.get(block_device_id)
+    if client is not None and client.add_request(
+        client_action,
+        client_block_num,
+        block,
+    ):
+        return
     devices = request_context["app_context"]["devices"]
-    request_context["user_to_send"] = devices[block_device_id]["username"]
-    request_context["password_to_send"] = devices[block_device_id]["password"]
+    s = None
+    if reuse:
+        s = request_context["app_context"]["connection_pool"].get(block_device_id)
+    reused = s is not None
+    if not reused:
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     client = HttpClient(
         socket=s,
         state=constants.ACTIVE,
@@ -157,15 +256,14 @@ def init_client(
         block_num=client_block_num,
         parent=request_context["callable"],
         block=block,
+        device=block_device_id,
+        reused=reused,
     )
-    try:
-        s.connect(
+    if not reused:
+        client.connect(
             (devices[block_device_id]["address"],
              devices[block_device_id]["port"],
              ))
-        s.setblocking(False)
-    except Exception as e:
-        if e.errno != errno.ECONNREFUSED:
-            raise
-        raise util.HTTPError(500, "Internal Error", "Block Device not found")
+    pipelines[block_device_id] = client
     request_context["fd_dict"][client.fileno()] = client
+    request_context["app_context"]["server"].schedule(client)
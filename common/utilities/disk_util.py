@@ -0,0 +1,103 @@
+## @package common.utilities.disk_util
+#
+# Block device disk utilities.
+## @file disk_util.py Implementation of @ref common.utilities.disk_util
+import os
+
+from common import constants
+from common.utilities import util
+from common.utilities import encryption_util
+
+## Check block numbers.
+# @param app_context (dict) block device application context.
+# @param block_nums (list) block numbers.
+# raises an error if any block is outside the disk.
+def check_blocks(
+    app_context,
+    block_nums,
+):
+    sparse_size = os.stat(app_context["sparse"]).st_size
+    for block_num in block_nums:
+        if block_num < 0 or block_num >= sparse_size / constants.BLOCK_SIZE:
+            raise util.HTTPError(500, "Invalid block number")
+
+## Split block numbers to runs of contiguous blocks.
+# @param block_nums (list) sorted block numbers.
+# @returns (list) lists of contiguous block numbers.
+def get_runs(block_nums):
+    runs = []
+    for block_num in block_nums:
+        if runs and runs[-1][-1] + 1 == block_num:
+            runs[-1].append(block_num)
+        else:
+            runs.append([block_num])
+    return runs
+
+## Get the AES object of a block.
+# @param app_context (dict) block device application context.
+# @param block_num (int) block number.
+# @returns (pyaes.AESModeOfOperationCBC) encryption object of the block with block device key.
+def get_block_aes(
+    app_context,
+    block_num,
+):
+    return app_context["block_key"].get_aes(block_num)
+
+## Read blocks from disk.
+# @param app_context (dict) block device application context.
+# @param block_nums (list) sorted block numbers, without repeats.
+# @returns (list) decrypted blocks, in the order of block numbers.
+#
+# reads every run of contiguous blocks with a single read.
+#
+def read_blocks(
+    app_context,
+    block_nums,
+):
+    blocks = []
+    with util.FDOpen(
+        app_context["sparse"],
+        os.O_RDONLY,
+    ) as fd:
+        for run in get_runs(block_nums):
+            data = [bytearray(constants.BLOCK_SIZE) for block_num in run]
+            util.read_into(
+                fd,
+                data,
+                constants.BLOCK_SIZE * run[0],
+            )
+            for block_num, block in zip(run, data):
+                blocks.append(
+                    encryption_util.decrypt_block_aes(
+                        get_block_aes(app_context, block_num),
+                        block,
+                    )
+                )
+    return blocks
+
+## Write blocks to disk.
+# @param app_context (dict) block device application context.
+# @param blocks (dict) blocks by their block number.
+#
+# encrypts every block, then writes every run of contiguous blocks with a single write.
+#
+def write_blocks(
+    app_context,
+    blocks,
+):
+    encrypted = {}
+    for block_num, block in blocks.items():
+        encrypted[block_num] = encryption_util.encrypt_block_aes(
+            get_block_aes(app_context, block_num),
+            block,
+        )
+    with util.FDOpen(
+        app_context["sparse"],
+        os.O_WRONLY,
+    ) as fd:
+        for run in get_runs(sorted(encrypted)):
+            util.write_from(
+                fd,
+                [encrypted[block_num] for block_num in run],
+                constants.BLOCK_SIZE * run[0],
+            )
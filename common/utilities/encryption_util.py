@@ -3,13 +3,98 @@
 # Various encryption related utilities.
 ## @file encryption_util.py Implementation of @ref common.utilities.encryption_util
 import base64
+import collections
 import hashlib
-import struct
 import logging
 import hmac
 
 import pyaes
 
+from common import constants
+
+## CBC mode of operation on an expanded key.
+#
+# pyaes.AESModeOfOperationCBC expands its key when created, this one is created
+# from the pyaes.AES of an already expanded key, so a fresh context per block
+# costs only its initial vector.
+#
+class ScheduledCBC(pyaes.AESModeOfOperationCBC):
+    ## Constructor.
+    # @param schedule (pyaes.AES) expanded key.
+    # @param iv (str) initial vector.
+    def __init__(
+        self,
+        schedule,
+        iv,
+    ):
+        if len(iv) != 16:
+            raise ValueError('initialization vector must be 16 bytes')
+        self._aes = schedule
+        self._last_cipherblock = list(bytearray(iv))
+
+## Expanded keys of recently used keys, least recently used first.
+_schedules = collections.OrderedDict()
+
+## Get expanded key.
+# @param key (str) AES key.
+# @returns (pyaes.AES) expanded key.
+#
+# keeps up to AES_SCHEDULE_CACHE_SIZE expanded keys, so user keys are expanded once
+# per file instead of once per block.
+#
+def get_schedule(key):
+    schedule = _schedules.pop(key, None)
+    if schedule is None:
+        schedule = pyaes.AES(key)
+        if len(_schedules) >= constants.AES_SCHEDULE_CACHE_SIZE:
+            _schedules.popitem(last=False)
+    _schedules[key] = schedule
+    return schedule
+
+## Create AES CBC object.
+# @param key (str) AES key.
+# @param iv (str) initial vector.
+# @returns (pyaes.AESModeOfOperationCBC) encryption object, with the cached
+# expanded key.
+def get_cbc(
+    key,
+    iv,
+):
+    return ScheduledCBC(get_schedule(key), iv)
+
+## Block key class.
+#
+# encryption key of blocks, created once at startup from the configured key.
+# holds the expanded key and the iv key hash, so creating the encryption
+# object of a block hashes only its number.
+#
+class BlockKey(object):
+    ## Constructor.
+    # @param key (str) encryption key.
+    # @param ivkey (str) encryption iv generation key.
+    def __init__(
+        self,
+        key,
+        ivkey,
+    ):
+        sha = hashlib.sha1()
+        sha.update(key)
+        self._schedule = pyaes.AES(sha.digest()[:16])
+
+        self._iv_sha = hashlib.sha1()
+        self._iv_sha.update(ivkey)
+
+    ## Create AES encryption object of a block.
+    # @param block_num (int) block number for iv generation.
+    # @returns (pyaes.AESModeOfOperationCBC) encryption object.
+    def get_aes(
+        self,
+        block_num=None,
+    ):
+        sha = self._iv_sha.copy()
+        sha.update(str(block_num))
+        return ScheduledCBC(self._schedule, sha.digest()[:16])
+
 ## Create AES encryption object
 # @param key (str) encryption key.
 # @param ivkey (str) encryption iv generation key.
@@ -19,6 +104,8 @@ import pyaes
 # uses external pyaes module to generate an AES encryption object.
 # object encryption key is given as parameter.
 # object initial vector generated from given iv_key and depends on current block number.
+# services use the BlockKey of the application context instead, which hashes
+# and expands the key once.
 #
 def get_aes(
     key,
@@ -34,53 +121,30 @@ def get_aes(
     sha.update(str(block_num))
     iv = sha.digest()[:16]
 
-    return pyaes.AESModeOfOperationCBC(key, iv=iv)
+    return get_cbc(key, iv)
 
 ## Encrypt block using AES.
 # @param aes (pyaes.AESModeOfOperationCBC) encryption object.
-# @param block (str) block to encrypt.
-# @returns (str) encrypted block.
-
+# @param block (str) block to encrypt, a multiple of 16 bytes.
+# @returns (bytearray) encrypted block.
 def encrypt_block_aes(
     aes,
     block,
 ):
-    index = 0
     result = bytearray(len(block))
-    while index < len(block):
-        result[index:index + 16] = struct.pack(
-            "16s",
-            aes.encrypt(
-                struct.unpack(
-                    "16s",
-                    block[index:index + 16]
-                )[0]
-            )
-        )
-        index += 16
+    aes.encrypt_into(block, result)
     return result
 
 ## Decrypt block using AES.
 # @param aes (pyaes.AESModeOfOperationCBC) encryption object.
-# @param block (str) block to encrypt.
-# @returns (str) decrypted block.
+# @param block (str) block to decrypt, a multiple of 16 bytes.
+# @returns (bytearray) decrypted block.
 def decrypt_block_aes(
     aes,
     block,
 ):
-    index = 0
     result = bytearray(len(block))
-    while index < len(block):
-        result[index:index + 16] = struct.pack(
-            "16s",
-            aes.decrypt(
-                struct.unpack(
-                    "16s",
-                    block[index:index + 16],
-                )[0]
-            )
-        )
-        index += 16
+    aes.decrypt_into(block, result)
     return result
 
 ## Sha1 hash algorithm.
@@ -103,7 +167,7 @@ def aes_encrypt(
     iv,
     data,
 ):
-    aes = pyaes.Encrypter(pyaes.AESModeOfOperationCBC(key, iv))
+    aes = pyaes.Encrypter(get_cbc(key, iv))
     result = ""
     result += aes.feed(data)
     result += aes.feed()
@@ -119,31 +183,57 @@ def aes_decrypt(
     iv,
     data,
 ):
-    aes = pyaes.Decrypter(pyaes.AESModeOfOperationCBC(key, iv))
+    aes = pyaes.Decrypter(get_cbc(key, iv))
     result = ""
     result += aes.feed(data)
     result += aes.feed()
     return result
 
+## Basic authorization header.
+# @param username (str) username.
+# @param password (str) password.
+# @returns (str) value of authorization header.
+def basic_authorization(
+    username,
+    password,
+):
+    return "Basic %s" % base64.b64encode("%s:%s" % (username, password))
+
+## Load credentials.
+# @param config (ConfigParser) block device config.
+# @returns (dict) decoded salt, username hash and password hash.
+# decoded once at startup, so logins don't read the config.
+def load_credentials(config):
+    return {
+        "salt": base64.b64decode(config.get('blockdevice', 'salt')),
+        "username_hash": base64.b64decode(config.get('blockdevice', 'username_hash')),
+        "password_hash": base64.b64decode(config.get('blockdevice', 'password_hash')),
+    }
+
 ## Basic authentication check.
 # @param request_context (dict) request context.
 # @returns (bool) whether authentication was successful.
 #
 # checks request_context for authentication header, compares received user and password to 
 # hash of user and password from self config file.
+# a connection is authenticated once, later requests on it with the same header are accepted
+# without hashing again. the block device keeps the accepted header as a session key.
 #
 def check_login(request_context):
+    authorization = request_context["req_headers"].get("Authorization")
+    if authorization is None:
+        return False
+    if authorization == request_context.get("authenticated_header"):
+        return True
     successful_login = False
-    if "Authorization" in request_context["req_headers"].keys():
-        auth_type, auth_content = request_context["req_headers"][
-            "Authorization"
-        ].split(" ", 2)
-        if auth_type == "Basic":
-            username, password = tuple(base64.b64decode(auth_content).split(':', 1))
-            config = request_context["app_context"]["config"]
-            salt = base64.b64decode(config.get('blockdevice', 'salt'))
-            successful_login = (
-                sha(username, salt) == base64.b64decode(config.get('blockdevice', 'username_hash')) and
-                sha(password, salt) == base64.b64decode(config.get('blockdevice', 'password_hash'))
-            )
+    auth_type, auth_content = authorization.split(" ", 2)
+    if auth_type == "Basic":
+        username, password = tuple(base64.b64decode(auth_content).split(':', 1))
+        credentials = request_context["app_context"]["credentials"]
+        successful_login = (
+            sha(username, credentials["salt"]) == credentials["username_hash"] and
+            sha(password, credentials["salt"]) == credentials["password_hash"]
+        )
+    if successful_login:
+        request_context["authenticated_header"] = authorization
     return successful_login
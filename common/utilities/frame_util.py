@@ -0,0 +1,58 @@
+## @package common.utilities.frame_util
+#
+# Binary block protocol framing utilities.
+## @file frame_util.py Implementation of @ref common.utilities.frame_util
+#
+# every frame is a fixed header followed by the payload:
+# operation, request id, block index, count of blocks and payload length.
+# requests and their replies share the header, a reply has the operation and
+# request id of its request, or the error operation.
+#
+import struct
+
+from common import constants
+
+## Frame header: operation, request id, block index, count, payload length.
+HEADER = struct.Struct(">BIIII")
+
+## Largest payload of a frame, a vectored write of the maximum number of blocks.
+MAX_PAYLOAD = constants.WRITEV_MAX_BLOCKS * (
+    constants.BLOCK_HEADER_SIZE + constants.BLOCK_SIZE
+)
+
+## Build frame header.
+# @param opcode (int) frame operation.
+# @param request_id (int) request id.
+# @param block_index (int) first block index.
+# @param count (int) number of blocks.
+# @param length (int) payload length.
+# @returns (str) header.
+def pack_header(
+    opcode,
+    request_id,
+    block_index,
+    count,
+    length,
+):
+    return HEADER.pack(
+        opcode,
+        request_id & 0xffffffff,
+        block_index,
+        count,
+        length,
+    )
+
+## Read frame header.
+# @param buffer (ReceiveBuffer) buffer.
+# @returns (tuple) operation, request id, block index, count and payload length,
+# None if the buffer doesn't have a whole header yet.
+# raises an error if the payload is too large.
+def read_header(
+    buffer,
+):
+    if len(buffer) < HEADER.size:
+        return None
+    header = HEADER.unpack(str(buffer.read(HEADER.size)))
+    if header[4] > MAX_PAYLOAD:
+        raise RuntimeError("Block protocol frame too large")
+    return header
@@ -3,10 +3,26 @@
 #
 # Various frontend-block_device integration related utilities.
 ## @file integration_util.py Implementation of @ref common.utilities.integration_util
+import binascii
 import os
 import logging
 import struct
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+## Random bytes drawn per data byte, a share choice for every bit and a mask.
+SPLIT_RANDOM = 9
+
+## Bit values of a byte, by bit index.
+if numpy is not None:
+    BIT_VALUES = numpy.array([1 << i for i in range(8)], dtype=numpy.uint8)
+
+## Translation tables of the bulk split, by number of copies.
+_split_tables = {}
+
 ## Encrypt byte.
 # @param byte (str) byte to split.
 # @param copies (int) number of copies to create.
@@ -46,33 +62,143 @@ def decrypt_byte(byte_list):
 ## Encrypt data.
 # @param data (bytearray) data to encrypt.
 # @param copies (int) copies to create
-# @returns (list) data strings that if xor'd would give initial data.
+# @returns (list) data buffers that if xor'd would give initial data.
 #
-# Uses byte Encrypt to split the data bits into different parts.
+# splits the data bits into different parts like encrypt_byte, for all the data at once.
+# the randomness of all bytes is drawn once, every bit goes to the part chosen by a random byte
+# and every part is xor'd with a random mask byte that cancels out.
+# the parts are views of one buffer.
 #
 def encrypt_data(data, copies):
-    result = []
+    length = len(data)
+    random = os.urandom(SPLIT_RANDOM * length)
+    shares = bytearray(copies * length)
+    if length:
+        if numpy is not None:
+            _split_numpy(data, random, copies, shares)
+        else:
+            _split_bulk(data, random, copies, shares)
+    view = memoryview(shares)
+    return [view[i * length:(i + 1) * length] for i in range(copies)]
+
+## Split data with numpy.
+# @param data (bytearray) data to split.
+# @param random (str) random bytes, share choices of every bit index followed by masks.
+# @param copies (int) copies to create.
+# @param shares (bytearray) buffer of all parts, one after the other.
+def _split_numpy(data, random, copies, shares):
+    length = len(data)
+    data = _as_array(data)
+    random = _as_array(random).reshape(SPLIT_RANDOM, length)
+    result = _as_array(shares).reshape(copies, length)
+    bits = data[None, :] & BIT_VALUES[:, None]
+    choices = random[:8] % copies
     for i in range(copies):
-        result.append(bytearray(0))
-    for byte in data:
-        bytes_to_add = encrypt_byte(byte, copies)
-        for i in range(copies):
-            result[i] += chr(bytes_to_add[i])
-    return result
+        result[i] = numpy.bitwise_or.reduce(bits * (choices == i), axis=0)
+    if copies % 2 == 1:
+        result[:-1] ^= random[8]
+    else:
+        result ^= random[8]
+
+## View data as numpy array.
+# @param data (bytearray) data, any buffer.
+# @returns (numpy.ndarray) bytes of data, without copying.
+def _as_array(data):
+    return numpy.asarray(memoryview(data))
+
+## Get translation tables of the bulk split.
+# @param copies (int) copies to create.
+# @returns (list) for every part, tables of every bit index that translate a random
+# byte to the bit value if it chooses the part, otherwise to zero.
+def _get_split_tables(copies):
+    tables = _split_tables.get(copies)
+    if tables is None:
+        tables = [
+            [
+                "".join(
+                    chr(1 << bit) if r % copies == i else "\0" for r in range(256)
+                ) for bit in range(8)
+            ] for i in range(copies)
+        ]
+        _split_tables[copies] = tables
+    return tables
+
+## Split data without numpy.
+# @param data (bytearray) data to split.
+# @param random (str) random bytes, share choices of every bit index followed by masks.
+# @param copies (int) copies to create.
+# @param shares (bytearray) buffer of all parts, one after the other.
+#
+# works on the whole data as one integer, the bits of every part are selected by
+# translating the random bytes, so there's no loop over the bytes.
+#
+def _split_bulk(data, random, copies, shares):
+    length = len(data)
+    tables = _get_split_tables(copies)
+    value = int(binascii.hexlify(data), 16)
+    mask = int(binascii.hexlify(random[8 * length:]), 16)
+    choices = [random[bit * length:(bit + 1) * length] for bit in range(8)]
+    for i in range(copies):
+        bits = 0
+        for bit in range(8):
+            bits |= int(binascii.hexlify(choices[bit].translate(tables[i][bit])), 16)
+        share = value & bits
+        if i < copies - 1 or copies % 2 == 0:
+            share ^= mask
+        shares[i * length:(i + 1) * length] = binascii.unhexlify(
+            "%0*x" % (2 * length, share)
+        )
 
 ## Decrypt data.
 # @param data_list (list) list of data parts.
 # @returns (bytearray) the xor results of the data parts' bytes.
 def decrypt_data(data_list):
-    for i in data_list:
-        i = bytearray(i)
-    s = bytearray(0)
-    for i in range(len(data_list[0])):
-        byte_list = []
-        for d in data_list:
-            byte_list.append(ord(d[i:i+1]))
-        s += chr(decrypt_byte(byte_list))
-    return s
+    result = bytearray(len(data_list[0]))
+    for data in data_list:
+        xor_into(result, data)
+    return result
+
+## Xor data into accumulator.
+# @param accumulator (bytearray) data parts xor'd so far, updated in place.
+# @param data (bytearray) data part.
+#
+# xor's whole parts at once, so a block is recombined as its parts arrive,
+# without a new buffer for every part.
+#
+def xor_into(accumulator, data):
+    length = min(len(accumulator), len(data))
+    if not length:
+        return
+    if numpy is not None:
+        _xor_numpy(accumulator, data, length)
+    else:
+        _xor_bulk(accumulator, data, length)
+
+## Xor data into accumulator with numpy.
+# @param accumulator (bytearray) accumulator.
+# @param data (bytearray) data part.
+# @param length (int) number of bytes to xor.
+# xor's 64 bit words when the length allows it.
+def _xor_numpy(accumulator, data, length):
+    dtype = numpy.uint64 if length % 8 == 0 else numpy.uint8
+    target = _as_array(accumulator)[:length].view(dtype)
+    numpy.bitwise_xor(
+        target,
+        _as_array(data)[:length].view(dtype),
+        out=target,
+    )
+
+## Xor data into accumulator without numpy.
+# @param accumulator (bytearray) accumulator.
+# @param data (bytearray) data part.
+# @param length (int) number of bytes to xor.
+# xor's the parts as integers.
+def _xor_bulk(accumulator, data, length):
+    value = (
+        int(binascii.hexlify(accumulator[:length]), 16) ^
+        int(binascii.hexlify(data[:length]), 16)
+    )
+    accumulator[:length] = binascii.unhexlify("%0*x" % (2 * length, value))
 
 ## Get bit of byte.
 # @param bit (int) bit index in byte.
@@ -2,6 +2,7 @@
 #
 # Various utility functions and classes.
 ## @file common/utilities/util.py Implementation of @ref common.utilities.util
+import collections
 import Cookie
 import errno
 import random
@@ -12,8 +13,23 @@ import os
 
 from common import constants
 
+# sendfile of python 3, or of the pysendfile package on python 2.
+try:
+    from os import sendfile as _sendfile
+except ImportError:
+    try:
+        from sendfile import sendfile as _sendfile
+    except ImportError:
+        _sendfile = None
+
+# preadv and pwritev of python 3, read or write a file range from several buffers in one call.
+_preadv = getattr(os, "preadv", None)
+_pwritev = getattr(os, "pwritev", None)
+
 STATUS_CODES = {
+    101: "Switching Protocols",
     200: "OK",
+    304: "Not Modified",
     307: "Temporary Redirect",
     401: "Unauthorized",
     404: "File Not Found",
@@ -69,6 +85,417 @@ class FDOpen(object):
         if self._fd:
             os.close(self._fd)
 
+## Read a file range into buffers.
+# @param fd (int) file descriptor.
+# @param buffers (list) bytearrays to fill, in file order.
+# @param offset (int) file offset of the first buffer.
+# @returns (int) number of bytes read, less than the buffers length at end of file.
+#
+# the range is read with preadv where available, otherwise with a single
+# read from the offset that is copied into the buffers.
+#
+def read_into(
+    fd,
+    buffers,
+    offset,
+):
+    if _preadv is not None:
+        total = 0
+        views = [memoryview(buffer) for buffer in buffers]
+        while views:
+            read = _preadv(fd, views, offset + total)
+            if not read:
+                break
+            total += read
+            while views and read >= len(views[0]):
+                read -= len(views[0])
+                views.pop(0)
+            if views:
+                views[0] = views[0][read:]
+        return total
+
+    size = sum(len(buffer) for buffer in buffers)
+    data = bytearray(0)
+    os.lseek(fd, offset, os.SEEK_SET)
+    while len(data) < size:
+        read_buffer = os.read(fd, size - len(data))
+        if not read_buffer:
+            break
+        data += read_buffer
+    index = 0
+    for buffer in buffers:
+        part = data[index:index + len(buffer)]
+        buffer[:len(part)] = part
+        index += len(buffer)
+    return len(data)
+
+## Write buffers to a file range.
+# @param fd (int) file descriptor.
+# @param buffers (list) data to write, in file order.
+# @param offset (int) file offset of the first buffer.
+#
+# the range is written with pwritev where available, otherwise the buffers
+# are joined and written from the offset.
+#
+def write_from(
+    fd,
+    buffers,
+    offset,
+):
+    if _pwritev is not None:
+        views = [memoryview(buffer) for buffer in buffers]
+        while views:
+            written = _pwritev(fd, views, offset)
+            offset += written
+            while views and written >= len(views[0]):
+                written -= len(views[0])
+                views.pop(0)
+            if views:
+                views[0] = views[0][written:]
+        return
+
+    data = bytearray(0)
+    for buffer in buffers:
+        data += buffer
+    os.lseek(fd, offset, os.SEEK_SET)
+    while data:
+        data = data[os.write(fd, data):]
+
+## File Region class.
+# Region of an open file that is sent on a socket as part of an output queue.
+#
+# The region owns the file descriptor, which is closed once the whole region is
+# sent, when the region is dropped from a cleared queue, or when the region is
+# garbage collected, so a request that fails halfway does not leak it.
+# Content goes from the file to the socket with sendfile where available,
+# otherwise it is read in FILE_CHUNK_SIZE pieces and sent from the current offset.
+#
+class FileRegion(object):
+    ## Constructor.
+    # @param fd (int) open file descriptor, owned by the region.
+    # @param offset (int) offset of the region in the file.
+    # @param count (int) length of the region, up to the end of the file if None.
+    def __init__(
+        self,
+        fd,
+        offset=0,
+        count=None,
+    ):
+        self.fd = fd
+        self._offset = offset
+        if count is None:
+            count = max(os.fstat(fd).st_size - offset, 0)
+        self._remaining = count
+
+    ## Number of bytes left to send.
+    def __len__(self):
+        return self._remaining
+
+    ## Whether there's anything left to send.
+    def __nonzero__(self):
+        return self._remaining > 0
+
+    __bool__ = __nonzero__
+
+    def __del__(self):
+        self.close()
+
+    ## Close the file descriptor.
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    ## Send part of the region.
+    # @param sock (socket) socket to send on.
+    # @returns (int) number of bytes sent.
+    #
+    # errors of sendfile are raised as socket errors, like errors of send.
+    # the file descriptor is closed when the whole region is sent.
+    #
+    def send(
+        self,
+        sock,
+    ):
+        try:
+            if _sendfile is not None:
+                sent = _sendfile(
+                    sock.fileno(),
+                    self.fd,
+                    self._offset,
+                    self._remaining,
+                )
+            else:
+                os.lseek(self.fd, self._offset, os.SEEK_SET)
+                sent = sock.send(
+                    os.read(
+                        self.fd,
+                        min(self._remaining, constants.FILE_CHUNK_SIZE),
+                    )
+                )
+        except OSError as e:
+            raise socket.error(e.errno, e.strerror)
+        if not sent:
+            raise RuntimeError("File truncated while sending")
+        self._offset += sent
+        self._remaining -= sent
+        if not self._remaining:
+            self.close()
+        return sent
+
+## Output Queue class.
+# Queue of data chunks waiting to be sent on a socket.
+#
+# Appended chunks are kept as they are and sent through memoryviews, so data is
+# not concatenated or re-sliced while sending. Chunks smaller than
+# OUTPUT_COALESCE_SIZE are merged into a small tail chunk, to keep the number of
+# send calls low where scatter/gather sendmsg isn't available.
+# FileRegion chunks are sent straight from their file, after the chunks before them.
+# Appended data must not be modified afterwards.
+#
+class OutputQueue(object):
+    def __init__(self):
+        self._chunks = collections.deque()
+        self._offset = 0
+        self._length = 0
+        self._tail = None
+
+    ## Number of bytes waiting to be sent.
+    def __len__(self):
+        return self._length
+
+    ## Whether there's anything waiting to be sent.
+    def __nonzero__(self):
+        return self._length > 0
+
+    __bool__ = __nonzero__
+
+    ## Append data.
+    # @param data (str or FileRegion) data to send.
+    def append(
+        self,
+        data,
+    ):
+        if isinstance(data, unicode):
+            data = data.encode("utf-8")
+        if not data:
+            return
+        if isinstance(data, FileRegion):
+            self._tail = None
+            self._chunks.append(data)
+            self._length += len(data)
+            return
+        if len(data) < constants.OUTPUT_COALESCE_SIZE:
+            if (
+                self._tail is None or
+                len(self._tail) + len(data) > constants.OUTPUT_COALESCE_SIZE
+            ):
+                self._tail = bytearray()
+                self._chunks.append(self._tail)
+            self._tail += data
+        else:
+            self._tail = None
+            self._chunks.append(data)
+        self._length += len(data)
+
+    ## Drop all pending data.
+    # closes the files of pending file regions.
+    def clear(self):
+        for chunk in self._chunks:
+            if isinstance(chunk, FileRegion):
+                chunk.close()
+        self._chunks.clear()
+        self._offset = 0
+        self._length = 0
+        self._tail = None
+
+    ## Send pending data.
+    # @param sock (socket) socket to send on.
+    # @returns (int) number of bytes sent.
+    #
+    # sends as many chunks as possible with one sendmsg call, or the first
+    # chunk with send where sendmsg is not supported.
+    # a file region is sent on its own, once the chunks before it are sent.
+    # socket errors are raised to the caller.
+    #
+    def send(
+        self,
+        sock,
+    ):
+        if not self._chunks:
+            return 0
+        if isinstance(self._chunks[0], FileRegion):
+            sent = self._chunks[0].send(sock)
+            self._length -= sent
+            if not self._chunks[0]:
+                self._chunks.popleft()
+            if not self._chunks:
+                self._tail = None
+            return sent
+        if hasattr(sock, "sendmsg"):
+            views = [memoryview(self._chunks[0])[self._offset:]]
+            for i in range(1, min(len(self._chunks), constants.IOV_MAX)):
+                if isinstance(self._chunks[i], FileRegion):
+                    break
+                views.append(memoryview(self._chunks[i]))
+            sent = sock.sendmsg(views)
+        else:
+            sent = sock.send(memoryview(self._chunks[0])[self._offset:])
+        self._consume(sent)
+        return sent
+
+    ## Remove sent data from the queue.
+    # @param sent (int) number of bytes sent.
+    def _consume(
+        self,
+        sent,
+    ):
+        self._length -= sent
+        sent += self._offset
+        while self._chunks and sent >= len(self._chunks[0]):
+            sent -= len(self._chunks.popleft())
+        self._offset = sent
+        if not self._chunks:
+            self._tail = None
+
+## Storage of a receive buffer that isn't allocated, never written to.
+EMPTY_BUFFER = bytearray(0)
+
+## Receive Buffer class.
+# Preallocated buffer received data is read into and parsed from.
+#
+# Data is received with recv_into after the unread data, and parsers consume it by
+# advancing an offset instead of re-slicing. The unread data is moved to the
+# beginning of the buffer only when there's no room left after it.
+# The size of the buffer is the receive window of the connection.
+# The buffer is allocated on the first receive, and may be released while
+# empty, so idle connections don't hold a receive window.
+#
+class ReceiveBuffer(object):
+    ## Constructor.
+    # @param size (int) buffer size in bytes.
+    def __init__(
+        self,
+        size=constants.RECV_WINDOW,
+    ):
+        self._size = size
+        self._data = EMPTY_BUFFER
+        self._start = 0
+        self._end = 0
+
+    ## Number of unread bytes.
+    def __len__(self):
+        return self._end - self._start
+
+    ## Whether there are unread bytes.
+    def __nonzero__(self):
+        return self._end > self._start
+
+    __bool__ = __nonzero__
+
+    ## Whether there's no room to receive more data.
+    def full(self):
+        return self._end - self._start >= self._size
+
+    ## Release the buffer while it's empty.
+    # it's allocated again by the next receive.
+    def release(self):
+        if self._end == self._start:
+            self._data = EMPTY_BUFFER
+            self._start = self._end = 0
+
+    ## Receive data from socket.
+    # @param sock (socket) socket.
+    # @returns (int) number of bytes received.
+    #
+    # raises error if peer disconnected, socket errors are raised to the caller.
+    #
+    def recv(
+        self,
+        sock,
+    ):
+        if self.full():
+            return 0
+        if not self._data:
+            self._data = bytearray(self._size)
+        if self._end == len(self._data):
+            self._data[:self._end - self._start] = self._data[self._start:self._end]
+            self._end -= self._start
+            self._start = 0
+        n = sock.recv_into(memoryview(self._data)[self._end:])
+        if not n:
+            raise RuntimeError(
+                'Disconnected while recieving content'
+            )
+        self._end += n
+        return n
+
+    ## Find data in unread bytes.
+    # @param sub (str) data to find.
+    # @param start (int) offset in unread bytes to start from.
+    # @returns (int) offset of sub in unread bytes, -1 if not found.
+    def find(
+        self,
+        sub,
+        start=0,
+    ):
+        n = self._data.find(sub, self._start + start, self._end)
+        if n == -1:
+            return -1
+        return n - self._start
+
+    ## Whether unread bytes start with data.
+    # @param prefix (str) data.
+    # @returns (bool) true if unread bytes start with prefix.
+    def startswith(
+        self,
+        prefix,
+    ):
+        return (
+            len(self) >= len(prefix) and
+            self._data[self._start:self._start + len(prefix)] == prefix
+        )
+
+    ## Get view of unread bytes.
+    # @param length (int) maximum length of view, all unread bytes if None.
+    # @returns (memoryview) view of unread bytes, valid until next receive.
+    def view(
+        self,
+        length=None,
+    ):
+        end = self._end
+        if length is not None:
+            end = min(end, self._start + max(length, 0))
+        return memoryview(self._data)[self._start:end]
+
+    ## Read unread bytes.
+    # @param length (int) maximum number of bytes to read, all unread bytes if None.
+    # @returns (str) bytes read.
+    def read(
+        self,
+        length=None,
+    ):
+        data = self.view(length).tobytes()
+        self.consume(len(data))
+        return data
+
+    ## Consume unread bytes.
+    # @param length (int) number of bytes to consume.
+    def consume(
+        self,
+        length,
+    ):
+        self._start = min(self._start + length, self._end)
+        if self._start == self._end:
+            self._start = self._end = 0
+
+## Build a state machine table.
+# @param states (dict) function and next state of every state.
+# @returns (tuple) entries of the states, indexed by state.
+# built once per class, the functions are called with the object.
+def state_table(states):
+    return tuple(states.get(state) for state in range(max(states) + 1))
+
 ## Text to html convert.
 # @param text (str) text.
 # @returns (str) html format text.
@@ -115,18 +542,18 @@ def parse_header(line):
     return line[:n].rstrip(), line[n + len(SEP):].lstrip()
 
 ## Receive line.
-# @param buffer (str) buffer.
-# @returns (tuple) first line parsed from buffer and rest of the buffer.
+# @param buffer (ReceiveBuffer) buffer.
+# @returns (str) first line consumed from buffer, None if there's no complete line.
 def recv_line(
     buffer
 ):
     n = buffer.find(constants.CRLF_BIN)
     if n == -1:
-        return None, buffer
+        return None
 
-    result = buffer[:n]
-    buffer = buffer[n + len(constants.CRLF_BIN):]
-    return result, buffer
+    result = buffer.read(n)
+    buffer.consume(len(constants.CRLF_BIN))
+    return result
 
 ## Get headers.
 # @param request_context (dict) request context.
@@ -140,8 +567,7 @@ def get_headers(
 ):
     finished = False
     for i in range(constants.MAX_NUMBER_OF_HEADERS):
-        line, request_context["recv_buffer"] = recv_line(
-            request_context["recv_buffer"])
+        line = recv_line(request_context["recv_buffer"])
         if line is None:
             break
         if line == "":
@@ -164,11 +590,12 @@ def get_headers(
 def send_headers(
     request_context,
 ):
-    for key, value in request_context["headers"].iteritems():
-        request_context["send_buffer"] += (
+    request_context["send_buffer"].append(
+        "".join(
             "%s: %s\r\n" % (key, value)
-        )
-    request_context["send_buffer"] += ("\r\n")
+            for key, value in request_context["headers"].iteritems()
+        ) + "\r\n"
+    )
     return True
 
 ## Receive buffer
@@ -177,16 +604,8 @@ def send_headers(
 # receives data from entry socket and puts it in entry receive buffer for later use.
 #
 def receive_buffer(entry):
-    free_buffer_size = constants.BLOCK_SIZE - len(
-        entry.request_context["recv_buffer"]
-    )
     try:
-        t = entry.socket.recv(free_buffer_size)
-        if not t:
-            raise RuntimeError(
-                'Disconnected while recieving content'
-            )
-        entry.request_context["recv_buffer"] += t
+        entry.request_context["recv_buffer"].recv(entry.socket)
     except socket.error as e:
         traceback.print_exc()
         if e.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
@@ -204,14 +623,13 @@ def add_status(entry, code, extra):
         entry.request_context["code"] = code
         entry.request_context["status"] = STATUS_CODES.get(code, 500)
     else:
-        entry.request_context["send_buffer"] += ((
+        entry.request_context["send_buffer"].append((
             "%s %s %s\r\n"
         ) % (
             constants.HTTP_SIGNATURE,
             code,
             STATUS_CODES[code],
-        )
-        ).encode("utf-8")
+        ))
 
 ## Random pad function.
 # @param data (str) data to pad.
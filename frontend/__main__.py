@@ -6,14 +6,22 @@ import argparse
 import ConfigParser
 import logging
 import multiprocessing
+import multiprocessing.managers
 import os
 import resource
 import signal
+import sys
 
+from common import asset_cache
 from common import async_server
+from common import connection_pool
 from common import constants
 from common import event_object
+from common import supervisor
+from common.services import router
+from common.utilities import encryption_util
 from common.utilities import util
+from common.pollables import tcp_listener
 from common.pollables.http_socket import HttpSocket
 
 ## Daemon function.
@@ -39,8 +47,26 @@ def parse_args():
     parser.add_argument(
         "--max-connections",
         type=int,
-        default=10,
-        help="Number of connections the server accepts. Default: %(default)s",
+        default=100,
+        help="Number of concurrent connections the server accepts. Default: %(default)s",
+    )
+    parser.add_argument(
+        "--accept-batch",
+        type=int,
+        default=constants.ACCEPT_BATCH,
+        help="Maximum connections accepted in one loop iteration. Default: %(default)s",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of server processes. Default: %(default)s",
+    )
+    parser.add_argument(
+        "--recv-window",
+        type=int,
+        default=constants.RECV_WINDOW,
+        help="Receive buffer size of a connection in bytes. Default: %(default)s",
     )
     parser.add_argument(
         "--log-file",
@@ -55,8 +81,74 @@ def parse_args():
     parser.add_argument(
         "--timeout",
         type=int,
-        default=1,
-        help="Optional server polling timeout",
+        default=-1,
+        help="Maximum server polling timeout in milliseconds, -1 to block until an event. Default: %(default)s",
+    )
+    parser.add_argument(
+        "--keep-alive-timeout",
+        type=float,
+        default=constants.KEEP_ALIVE_TIMEOUT,
+        help="Seconds a persistent connection may wait for its next request. Default: %(default)s",
+    )
+    parser.add_argument(
+        "--keep-alive-requests",
+        type=int,
+        default=constants.KEEP_ALIVE_REQUESTS,
+        help="Maximum requests on a persistent connection, 1 to close after every response. Default: %(default)s",
+    )
+    parser.add_argument(
+        "--pool-size",
+        type=int,
+        default=constants.POOL_SIZE,
+        help="Maximum idle connections kept per block device. Default: %(default)s",
+    )
+    parser.add_argument(
+        "--pool-idle-timeout",
+        type=float,
+        default=constants.POOL_IDLE_TIMEOUT,
+        help="Seconds an idle block device connection is kept, keep lower than the block device keep alive timeout. Default: %(default)s",
+    )
+    parser.add_argument(
+        "--pipeline-depth",
+        type=int,
+        default=constants.PIPELINE_DEPTH,
+        help="Maximum block requests in flight on a block device connection, 1 to disable pipelining. Default: %(default)s",
+    )
+    parser.add_argument(
+        "--block-protocol",
+        choices=[constants.HTTP_PROTOCOL, constants.BINARY_PROTOCOL],
+        default=constants.HTTP_PROTOCOL,
+        help="Protocol of block requests, binary upgrades every block device connection to binary frames. Default: %(default)s",
+    )
+    parser.add_argument(
+        "--idle-timeout",
+        type=float,
+        default=constants.IDLE_TIMEOUT,
+        help="Seconds a connection may make no progress. Default: %(default)s",
+    )
+    parser.add_argument(
+        "--header-timeout",
+        type=float,
+        default=constants.HEADER_TIMEOUT,
+        help="Seconds to receive request line and headers. Default: %(default)s",
+    )
+    parser.add_argument(
+        "--body-timeout",
+        type=float,
+        default=constants.BODY_TIMEOUT,
+        help="Seconds request content may stop arriving. Default: %(default)s",
+    )
+    parser.add_argument(
+        "--block-timeout",
+        type=float,
+        default=constants.BLOCK_TIMEOUT,
+        help="Seconds for a block device request. Default: %(default)s",
+    )
+    parser.add_argument(
+        "--asset-check-interval",
+        type=float,
+        default=constants.ASSET_CHECK_INTERVAL,
+        help="Seconds between checks of a cached static file for changes. Default: %(default)s",
     )
     parser.add_argument(
         "--foreground",
@@ -66,11 +158,9 @@ def parse_args():
     )
     parser.add_argument(
         "--event-method",
-        help="whether to use select instead of poll. Default: %s" % (
-            "select" if os.name == "nt" else "poll"
-        ),
-        choices=["select", "poll"],
-        default="select" if os.name == "nt" else "poll"
+        help="event method to use for polling. Default: %(default)s",
+        choices=sorted(event_object.EVENT_OBJECTS.keys()),
+        default=event_object.DEFAULT_EVENT_METHOD,
     ),
     parser.add_argument(
         "--config",
@@ -82,9 +172,36 @@ def parse_args():
     args.base = os.path.normpath(os.path.realpath(args.base))
     return args
 
+## Run server function.
+# creates an asynchronous server with a listener and calls run() on it.
+# @param app_context (dict) application context.
+# @param sock (socket) optional listening socket inherited from the parent.
+#
+def run_server(
+    app_context,
+    sock=None,
+):
+    server = async_server.Server(
+        app_context,
+    )
+    server.add_listener(
+        app_context["bind_address"],
+        app_context["bind_port"],
+        HttpSocket,
+        sock=sock,
+    )
+
+    signal.signal(signal.SIGINT, server.stop)
+    signal.signal(signal.SIGTERM, server.stop)
+
+    logging.debug("main module called - server.run()")
+    server.run()
+    app_context["connection_pool"].clear()
+
 ## Main function.
 # initializes all arguments and configurations into application context.
-# creates an asynchronous server with a listener and calls run() on it.
+# runs the server in this process, or with --workers in several pre-forked
+# worker processes watched by a supervisor.
 def __main__():
     args = parse_args()
     if args.foreground:
@@ -107,23 +224,15 @@ def __main__():
                 "port": Config.getint(i, "port"),
                 "username": Config.get(i, "username"),
                 "password": Config.get(i, "password"),
+                "authorization": encryption_util.basic_authorization(
+                    Config.get(i, "username"),
+                    Config.get(i, "password"),
+                ),
             }
     sparse = None
     admin = Config.get('frontend', 'admin.password')
 
-    objects = []
-
-    def terminate(signum, frame):
-        for o in objects:
-            o.stop(signum, frame)
-
-    signal.signal(signal.SIGINT, terminate)
-    signal.signal(signal.SIGTERM, terminate)
-
-    poll_object = {
-        "poll": event_object.PollEvents,
-        "select": event_object.SelectEvents,
-    }[args.event_method]
+    poll_object = event_object.EVENT_OBJECTS[args.event_method]
 
     app_context = {
         "log": args.log_file,
@@ -131,29 +240,69 @@ def __main__():
         "bind_address": bind_address,
         "bind_port": bind_port,
         "timeout": args.timeout,
+        "idle_timeout": args.idle_timeout,
+        "keep_alive_timeout": args.keep_alive_timeout,
+        "keep_alive_requests": args.keep_alive_requests,
+        "header_timeout": args.header_timeout,
+        "body_timeout": args.body_timeout,
+        "block_timeout": args.block_timeout,
         "max_connections": args.max_connections,
+        "accept_batch": args.accept_batch,
+        "recv_window": args.recv_window,
         "sparse": sparse,
         "block_device": False,
         "devices": devices,
         "config": Config,
+        "block_key": encryption_util.BlockKey(
+            Config.get('frontend', 'key'),
+            Config.get('frontend', 'ivkey'),
+        ),
         "admin": admin,
         "base": args.base,
+        "asset_cache": asset_cache.AssetCache(args.asset_check_interval),
+        "connection_pool": connection_pool.ConnectionPool(
+            args.pool_size,
+            args.pool_idle_timeout,
+        ),
+        "router": router.Router(constants.MODULE_DICT[0]),
+        "client_router": router.Router(constants.MODULE_DICT["client"]),
+        "pipeline_depth": args.pipeline_depth,
+        "block_protocol": args.block_protocol,
         "password_dict": {},
         "semaphore": multiprocessing.BoundedSemaphore(constants.MAX_SEMAPHORE),
     }
 
-    server = async_server.Server(
-        app_context,
-    )
-    server.add_listener(
-        bind_address,
-        bind_port,
-        HttpSocket,
-    )
+    if args.workers <= 1:
+        run_server(app_context)
+        return
 
-    objects.append(server)
-    logging.debug("main module called - server.run()")
-    server.run()
+    # sessions must be visible to every worker
+    manager = multiprocessing.managers.SyncManager()
+    manager.start(supervisor.ignore_sigint)
+    app_context["password_dict"] = manager.dict()
+
+    # without SO_REUSEPORT workers share a listener inherited from here
+    sock = None
+    if tcp_listener.SO_REUSEPORT is None:
+        sock = tcp_listener.create_socket(
+            bind_address,
+            bind_port,
+            args.max_connections,
+        )
+    else:
+        app_context["reuse_port"] = True
+
+    workers = supervisor.Supervisor(
+        args.workers,
+        run_server,
+        args=(app_context, sock),
+    )
+    signal.signal(signal.SIGINT, workers.stop)
+    signal.signal(signal.SIGTERM, workers.stop)
+    status = workers.run()
+    manager.shutdown()
+    if status:
+        sys.exit(status)
 
 
 if __name__ == "__main__":
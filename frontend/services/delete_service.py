@@ -179,35 +179,25 @@ class DeleteService(ServiceBase):
 
     ## Update disk
     #
-    # writes all altered blocks to block devices.
+    # writes all altered blocks to block devices in one batch.
     #
     def _update_disk(
         self,
         request_context,
     ):
+        blocks = []
         self._current_bitmap = 1
         while self._bitmap:
-            block = self._bitmap[:constants.BLOCK_SIZE]
+            blocks.append((self._current_bitmap, self._bitmap[:constants.BLOCK_SIZE]))
             self._bitmap = self._bitmap[constants.BLOCK_SIZE:]
-            block_util.bd_action(
-                request_context=request_context,
-                block_num=self._current_bitmap,
-                action=constants.WRITE,
-                block=block,
-            )
             self._current_bitmap += 1
 
         self._current_root = self._bitmaps + 1
         while self._root:
-            block = self._root[:constants.BLOCK_SIZE]
+            blocks.append((self._current_root, self._root[:constants.BLOCK_SIZE]))
             self._root = self._root[constants.BLOCK_SIZE:]
-            block_util.bd_action(
-                request_context=request_context,
-                block_num=self._current_root,
-                action=constants.WRITE,
-                block=block,
-            )
             self._current_root += 1
+        block_util.write_blocks(request_context, blocks)
 
     ## Function called before sending HTTP headers
     # sends the success message to client.
@@ -6,7 +6,6 @@ import struct
 import logging
 import urlparse
 
-import pyaes
 
 from common import constants
 from common.utilities import util
@@ -122,8 +121,9 @@ class Download(ServiceBase):
 
     ## Function called during sending HTTP content (file content).
     #
-    # until finished reading file, reads one file block from block device at a time and calls handling functions to send it.
-    # to read file data block, goes over directory block. if reached end of directory block, reads next one.
+    # until finished reading file, reads file blocks from block device and calls handling functions to send them.
+    # prefetches up to DOWNLOAD_PREFETCH blocks at once, with vectored reads of the block devices.
+    # to read file data blocks, goes over directory block. if reached end of directory block, reads next one.
     #
     def response(
         self,
@@ -135,39 +135,47 @@ class Download(ServiceBase):
             self._next_dir_block(request_context)
             return constants.RETURN_AND_WAIT
         else:
-            current_block_num = struct.unpack(
-                ">I",
-                self._dir_block[self._dir_index: self._dir_index + 4],
-            )[0]
-            block_util.bd_action(
-                request_context=request_context,
-                block_num=current_block_num,
-                action=constants.READ,
-                service_wake_up=self._handle_block,
+            count = min(
+                constants.DOWNLOAD_PREFETCH,
+                (len(self._dir_block) - self._dir_index) / 4,
+                (
+                    self._file_size + constants.BLOCK_SIZE - constants.IV_LENGTH - 1
+                ) / (constants.BLOCK_SIZE - constants.IV_LENGTH),
             )
-            self._dir_index += 4
+            block_util.read_blocks(
+                request_context,
+                struct.unpack(
+                    ">%dI" % count,
+                    str(self._dir_block[self._dir_index: self._dir_index + 4 * count]),
+                ),
+                self._handle_blocks,
+            )
+            self._dir_index += 4 * count
             return constants.RETURN_AND_WAIT
 
-    ## Function called after reading file block.
+    ## Function called after reading file blocks.
     #
-    # decrypts block by user key and sends it to user.
+    # decrypts blocks by user key and sends them to user.
     #
-    def _handle_block(
+    def _handle_blocks(
         self,
         request_context,
     ):
-        iv = request_context["block"][:16]
-        request_context["block"] = request_context["block"][16:]
         key = encryption_util.sha(self._authorization)[:16]
-        aes = pyaes.AESModeOfOperationCBC(key, iv=str(iv))
-        request_context["block"] = encryption_util.decrypt_block_aes(
-            block=request_context["block"],
-            aes=aes,
-        )
-        request_context["block"] = request_context["block"][:self._file_size]
-        self._file_size -= len(request_context["block"])
-        request_context["response"] = request_context["block"]
+        response = bytearray(0)
+        for block in request_context["blocks"]:
+            iv = block[:constants.IV_LENGTH]
+            aes = encryption_util.get_cbc(key, str(iv))
+            block = encryption_util.decrypt_block_aes(
+                block=block[constants.IV_LENGTH:],
+                aes=aes,
+            )
+            block = block[:self._file_size]
+            self._file_size -= len(block)
+            response += block
+        request_context["response"] = response
         request_context["block"] = ""
+        request_context["blocks"] = None
 
     ## Function used to read next directory block.
     #
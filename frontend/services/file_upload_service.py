@@ -6,7 +6,6 @@ import os
 import logging
 import struct
 
-import pyaes
 
 from common import constants
 from common.utilities import util
@@ -80,7 +79,6 @@ class FileUploadService(ServiceBase):
             )[1].encode("utf-8")
         request_context["boundary"] = "--%s\r\n" % boundary
         request_context["final_boundary"] = "--%s--\r\n" % boundary
-        request_context["content_length"] -= 2
 
         request_context["req_headers"]["Content-Disposition"] = None
         request_context["req_headers"]["Content-Type"] = None
@@ -93,8 +91,6 @@ class FileUploadService(ServiceBase):
         self,
         request_context,
     ):
-        request_context["recv_buffer"] = request_context["recv_buffer"].replace(
-            request_context["final_boundary"], request_context["boundary"], )
         while self._state_machine[self._current_state]["func"](
             request_context,
         ):
@@ -113,24 +109,21 @@ class FileUploadService(ServiceBase):
         self,
         request_context,
     ):
-        line, request_context["recv_buffer"] = util.recv_line(
-            request_context["recv_buffer"])
+        line = util.recv_line(request_context["recv_buffer"])
         while line is not None:
             request_context["content_length"] -= len(line)
             request_context["content_length"] -= 2
             if (line + constants.CRLF) == str(request_context["boundary"]):
-                line, request_context["recv_buffer"] = util.recv_line(
-                    request_context["recv_buffer"])
+                line = util.recv_line(request_context["recv_buffer"])
                 continue
             if line == "":
                 self._current_state = self._state_machine[self._current_state]["next"]
-                break
+                return True
             else:
                 line = util.parse_header(line)
                 if line[0] in request_context["req_headers"]:
                     request_context["req_headers"][line[0]] = line[1]
-                line, request_context["recv_buffer"] = util.recv_line(
-                    request_context["recv_buffer"])
+                line = util.recv_line(request_context["recv_buffer"])
         if len(request_context["recv_buffer"]) > constants.BLOCK_SIZE:
             raise RuntimeError("Maximum header size reached")
 
@@ -195,7 +188,7 @@ class FileUploadService(ServiceBase):
         self._dir_block = bytearray(0)
         self._main_index = 0
         self._dir_index = 0
-        request_context["buffer"] = ""
+        request_context["buffer"] = bytearray(0)
         request_context["file_size"] = 0
         self._current_state = self._state_machine[self._current_state]["next"]
 
@@ -218,8 +211,25 @@ class FileUploadService(ServiceBase):
                                                                   constants.IV_LENGTH:]
             return True
 
-        index = request_context["recv_buffer"].find(
-            request_context["boundary"])
+        # the part ends at a boundary or at the final boundary, both start with the delimiter
+        delimiter = request_context["boundary"][:-len(constants.CRLF)]
+        index = request_context["recv_buffer"].find(delimiter)
+        if index == 0:
+            for boundary in (
+                request_context["boundary"],
+                request_context["final_boundary"],
+            ):
+                if request_context["recv_buffer"].startswith(boundary):
+                    request_context["boundary_length"] = len(boundary)
+                    break
+            else:
+                if len(request_context["recv_buffer"]) < len(
+                    request_context["final_boundary"]
+                ):
+                    return False
+                # delimiter is part of the content
+                index = len(delimiter)
+
         if index == 0:
             old_length = len(request_context["buffer"])
             request_context["buffer"] = util.random_pad(
@@ -231,19 +241,18 @@ class FileUploadService(ServiceBase):
             return True
 
         elif index == -1:
-            data = request_context["recv_buffer"][:- \
-                len(request_context["boundary"])]
+            data = request_context["recv_buffer"].view(
+                len(request_context["recv_buffer"]) - len(delimiter))
             request_context["buffer"] += data
             request_context["content_length"] -= len(data)
-            request_context["recv_buffer"] = request_context["recv_buffer"][-len(
-                request_context["boundary"]):]
+            request_context["recv_buffer"].consume(len(data))
             return False
 
         else:
-            data = request_context["recv_buffer"][:index]
+            data = request_context["recv_buffer"].view(index)
             request_context["buffer"] += data
             request_context["content_length"] -= len(data)
-            request_context["recv_buffer"] = request_context["recv_buffer"][index:]
+            request_context["recv_buffer"].consume(len(data))
             return True
 
     ## Function for writing file block to disk.
@@ -284,7 +293,7 @@ class FileUploadService(ServiceBase):
         self._dir_index += 4
         iv = os.urandom(16)
         key = encryption_util.sha(self._authorization)[:16]
-        aes = pyaes.AESModeOfOperationCBC(key, iv=iv)
+        aes = encryption_util.get_cbc(key, iv)
         block = iv + encryption_util.encrypt_block_aes(
             block=block,
             aes=aes,
@@ -299,7 +308,7 @@ class FileUploadService(ServiceBase):
 
     ## Function called after end of file writing.
     # writes new file entry to directory root.
-    # updates altered bitmaps, directory roots, main blocks, etc to disk.
+    # updates altered bitmaps, directory roots, main blocks, etc to disk, all in one batch.
     # switches to next state.
     def _update_disk(
         self,
@@ -330,51 +339,31 @@ class FileUploadService(ServiceBase):
         next_bitmap_index = self._next_bitmap_index()
         request_context["state"] = constants.SLEEPING
         self._dir_block = util.random_pad(self._dir_block, constants.BLOCK_SIZE)
-        block_util.bd_action(
-            request_context=request_context,
-            block_num=next_bitmap_index,
-            action=constants.WRITE,
-            block=self._dir_block,
-        )
         self._main_block += struct.pack(
             ">I",
             next_bitmap_index,
         )
         self._main_block = util.random_pad(self._main_block, constants.BLOCK_SIZE)
-        block_util.bd_action(
-            request_context=request_context,
-            block_num=self._main_block_num,
-            action=constants.WRITE,
-            block=self._main_block,
-        )
+        blocks = [
+            (next_bitmap_index, self._dir_block),
+            (self._main_block_num, self._main_block),
+        ]
 
         self._current_bitmap = 1
         while self._bitmap:
-            block = self._bitmap[:constants.BLOCK_SIZE]
+            blocks.append((self._current_bitmap, self._bitmap[:constants.BLOCK_SIZE]))
             self._bitmap = self._bitmap[constants.BLOCK_SIZE:]
-            block_util.bd_action(
-                request_context=request_context,
-                block_num=self._current_bitmap,
-                action=constants.WRITE,
-                block=block,
-            )
             self._current_bitmap += 1
 
         self._current_root = self._bitmaps + 1
         while self._root:
-            block = self._root[:constants.BLOCK_SIZE]
+            blocks.append((self._current_root, self._root[:constants.BLOCK_SIZE]))
             self._root = self._root[constants.BLOCK_SIZE:]
-            block_util.bd_action(
-                request_context=request_context,
-                block_num=self._current_root,
-                action=constants.WRITE,
-                block=block,
-            )
             self._current_root += 1
+        block_util.write_blocks(request_context, blocks)
 
-        request_context["recv_buffer"] = request_context["recv_buffer"][len(
-            request_context["boundary"]):]
-        request_context["content_length"] -= len(request_context["boundary"])
+        request_context["recv_buffer"].consume(request_context["boundary_length"])
+        request_context["content_length"] -= request_context["boundary_length"]
         self._current_state = self._state_machine[self._current_state]["next"]
 
     ## Function called before sending HTTP headers.
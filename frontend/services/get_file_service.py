@@ -3,9 +3,9 @@
 # a service for sending regular files to browser.
 ## @file get_file_service.py Implementation of @ref frontend.services.get_file_service
 import errno
-import logging
 import os
 
+from common import asset_cache
 from common import constants
 from common.utilities import util
 from common.services.service_base import ServiceBase
@@ -21,7 +21,8 @@ class GetFileService(ServiceBase):
     ## Function called before sending HTTP status.
     #
     # gets filename from query string, checks that this file is in base folder.
-    # if it is, opens the file and saves the file descriptor for later use.
+    # if it is, takes the file from the asset cache, or opens it and saves it as
+    # a file region for later use when it's too large to be cached.
     #
     def before_response_status(
         self,
@@ -39,9 +40,15 @@ class GetFileService(ServiceBase):
             raise RuntimeError("Malicious URI %s" %
                                request_context["parsed"].path)
         try:
-            self._fd = os.open(filename, os.O_RDONLY, 0o666)
-            request_context["headers"][constants.CONTENT_LENGTH] = os.fstat(
-                self._fd).st_size
+            asset = request_context["app_context"]["asset_cache"].get(filename)
+            if asset is not None:
+                self._response = asset_cache.respond(request_context, asset)
+            else:
+                self._response = util.FileRegion(
+                    os.open(filename, os.O_RDONLY, 0o666),
+                )
+                request_context["headers"][constants.CONTENT_LENGTH] = len(
+                    self._response)
             request_context["headers"][constants.CONTENT_TYPE] = constants.MIME_MAPPING.get(
                 os.path.splitext(filename)[1].lstrip('.'), constants.MIME_MAPPING["*"], )
         except OSError as e:
@@ -54,26 +61,23 @@ class GetFileService(ServiceBase):
         return True
 
     ## Function called during HTTP content sending.
-    # uses previously saved file descriptor to read parts of the file and send them to client.
-    # stops when entire file is sent.
+    # hands the cached content or the file region to the socket, which sends
+    # it after the headers and closes the file at the end.
     def response(
         self,
         request_context,
     ):
+        request_context["response"] = self._response
+        self._response = None
 
-        buf = ""
-        try:
-            while len(request_context["response"]) < constants.BLOCK_SIZE:
-                buf = os.read(self._fd, constants.BLOCK_SIZE)
-                if not buf:
-                    break
-                request_context["response"] += buf
-
-            if buf:
-                return constants.RETURN_AND_WAIT
-            os.close(self._fd)
-
-        except Exception as e:
-            logging.debug(e)
-            if e.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
-                raise
+    ## Get header dictionary.
+    # @returns (dict) dictionary of wanted headers to parse.
+    def get_header_dict(
+        self,
+    ):
+        return {
+            constants.CONTENT_LENGTH: 0,
+            "Cookie": None,
+            "If-None-Match": None,
+            "Accept-Encoding": None,
+        }
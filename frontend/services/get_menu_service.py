@@ -3,11 +3,11 @@
 #
 # a service for sending the HTML project GUI menu to browser.
 ## @file get_menu_service.py Implementation of @ref frontend.services.get_menu_service
-import errno
-import logging
 import os
 
+from common import asset_cache
 from common import constants
+from common.utilities import util
 from common.services.service_base import ServiceBase
 
 ## Get menu service class.
@@ -20,42 +20,48 @@ class GetMenuService(ServiceBase):
         return "/"
 
     ## Function called before sending HTTP status.
-    # opens the html menu file and saves it's file descriptor for future use.
+    # takes the html menu file from the asset cache, or opens it and saves it
+    # as a file region for future use when it's too large to be cached.
     def before_response_status(
         self,
         request_context,
     ):
-        self._fd = os.open(
-            request_context["app_context"]["base"] +
-            "/html/menu.html",
-            os.O_RDONLY,
-            0o666)
-        request_context["headers"][constants.CONTENT_LENGTH] = os.fstat(
-            self._fd).st_size
+        filename = request_context["app_context"]["base"] + "/html/menu.html"
+        asset = request_context["app_context"]["asset_cache"].get(filename)
+        if asset is not None:
+            self._response = asset_cache.respond(request_context, asset)
+        else:
+            self._response = util.FileRegion(
+                os.open(
+                    filename,
+                    os.O_RDONLY,
+                    0o666,
+                ),
+            )
+            request_context["headers"][constants.CONTENT_LENGTH] = len(
+                self._response)
         request_context["headers"][constants.CONTENT_TYPE] = "text/html"
 
         return True
 
     ## Function called during sending HTTP response content.
-    # reads parts of html menu file and sends to browser.
-    # finishes when read entire file.
+    # hands the html menu to the socket, which sends it to browser after the
+    # headers and closes the file at the end.
     def response(
         self,
         request_context,
     ):
+        request_context["response"] = self._response
+        self._response = None
 
-        buf = ""
-        try:
-            while len(request_context["response"]) < constants.BLOCK_SIZE:
-                buf = os.read(self._fd, constants.BLOCK_SIZE)
-                if not buf:
-                    break
-                request_context["response"] += buf
-
-            if buf:
-                return constants.RETURN_AND_WAIT
-            os.close(self._fd)
-
-        except Exception as e:
-            if e.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
-                raise
+    ## Get header dictionary.
+    # @returns (dict) dictionary of wanted headers to parse.
+    def get_header_dict(
+        self,
+    ):
+        return {
+            constants.CONTENT_LENGTH: 0,
+            "Cookie": None,
+            "If-None-Match": None,
+            "Accept-Encoding": None,
+        }
@@ -29,6 +29,7 @@ class InitService(ServiceBase):
     # constructs the first block of device, which shows those numbers for future use and writes it to block device.
     # for every bitmap and directory root to create, creates them and sends to block device.
     # the first bitmap is created separately, since it's first bits should be on to mark the bitmaps and root indices.
+    # all blocks are written to block devices in one batch.
     #
     def before_request_content(
         self,
@@ -62,12 +63,7 @@ class InitService(ServiceBase):
         init_block[0:len(constants.INIT_SIGNATURE)] = constants.INIT_SIGNATURE
         init_block[len(constants.INIT_SIGNATURE)] = struct.pack(">B", bitmaps)
         init_block[len(constants.INIT_SIGNATURE)+1] = struct.pack(">B", dir_roots)
-        block_util.bd_action(
-            request_context=request_context,
-            block_num=0,
-            action=constants.WRITE,
-            block=init_block,
-        )
+        blocks = [(0, init_block)]
 
         first_bitmap = bytearray(4096)
         index = 0
@@ -76,27 +72,13 @@ class InitService(ServiceBase):
             integration_util.bitmap_set_bit(first_bitmap, index,1)
             index += 1
             blocks_to_fill -= 1
-        block_util.bd_action(
-                request_context=request_context,
-                block_num=1,
-                action=constants.WRITE,
-                block=first_bitmap,
-            )
-            
+        blocks.append((1, first_bitmap))
+
         for i in range(bitmaps - 1):
-            block_util.bd_action(
-                request_context=request_context,
-                block_num=i+2,
-                action=constants.WRITE,
-                block=bytearray(4096),
-            )
+            blocks.append((i+2, bytearray(4096)))
         for i in range(dir_roots):
-            block_util.bd_action(
-                request_context=request_context,
-                block_num=bitmaps+i+1,
-                action=constants.WRITE,
-                block= self.random_root_block(),
-            )
+            blocks.append((bitmaps+i+1, self.random_root_block()))
+        block_util.write_blocks(request_context, blocks)
 
     ## Root directory block creation function.
     # returns (str) randomly created directory root where all entries marked as empty.
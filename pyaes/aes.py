@@ -54,6 +54,12 @@
 import copy
 import struct
 
+# NumPy is optional, it runs many blocks of the parallelizable modes at once
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 __all__ = [
     "AES",
     "AESModeOfOperationCTR",
@@ -3825,6 +3831,12 @@ class AES(object):
                                   self.U3[(tt >> 8) & 0xFF] ^
                                   self.U4[tt & 0xFF])
 
+        # Round keys as unsigned words, for the word based block functions
+        self._Ke_words = tuple(tuple(k & 0xFFFFFFFF for k in round_key)
+                               for round_key in self._Ke)
+        self._Kd_words = tuple(tuple(k & 0xFFFFFFFF for k in round_key)
+                               for round_key in self._Kd)
+
     def encrypt(self, plaintext):
         'Encrypt a block of plain text using the AES block cipher.'
 
@@ -3900,6 +3912,177 @@ class AES(object):
         return result
 
 
+    def encrypt_words(self, s0, s1, s2, s3):
+        '''Encrypt a block given as four big endian words.
+
+           Same cipher as encrypt, with the round state in locals instead of
+           lists. Returns the four words of the encrypted block.'''
+
+        T1 = self.T1
+        T2 = self.T2
+        T3 = self.T3
+        T4 = self.T4
+        S = self.S
+        Ke = self._Ke_words
+
+        k0, k1, k2, k3 = Ke[0]
+        s0 ^= k0
+        s1 ^= k1
+        s2 ^= k2
+        s3 ^= k3
+
+        for k0, k1, k2, k3 in Ke[1:-1]:
+            t0 = (T1[s0 >> 24] ^ T2[(s1 >> 16) & 0xFF] ^
+                  T3[(s2 >> 8) & 0xFF] ^ T4[s3 & 0xFF] ^ k0)
+            t1 = (T1[s1 >> 24] ^ T2[(s2 >> 16) & 0xFF] ^
+                  T3[(s3 >> 8) & 0xFF] ^ T4[s0 & 0xFF] ^ k1)
+            t2 = (T1[s2 >> 24] ^ T2[(s3 >> 16) & 0xFF] ^
+                  T3[(s0 >> 8) & 0xFF] ^ T4[s1 & 0xFF] ^ k2)
+            s3 = (T1[s3 >> 24] ^ T2[(s0 >> 16) & 0xFF] ^
+                  T3[(s1 >> 8) & 0xFF] ^ T4[s2 & 0xFF] ^ k3)
+            s0 = t0
+            s1 = t1
+            s2 = t2
+
+        # The last round is special
+        k0, k1, k2, k3 = Ke[-1]
+        return (
+            ((S[s0 >> 24] << 24) | (S[(s1 >> 16) & 0xFF] << 16) |
+             (S[(s2 >> 8) & 0xFF] << 8) | S[s3 & 0xFF]) ^ k0,
+            ((S[s1 >> 24] << 24) | (S[(s2 >> 16) & 0xFF] << 16) |
+             (S[(s3 >> 8) & 0xFF] << 8) | S[s0 & 0xFF]) ^ k1,
+            ((S[s2 >> 24] << 24) | (S[(s3 >> 16) & 0xFF] << 16) |
+             (S[(s0 >> 8) & 0xFF] << 8) | S[s1 & 0xFF]) ^ k2,
+            ((S[s3 >> 24] << 24) | (S[(s0 >> 16) & 0xFF] << 16) |
+             (S[(s1 >> 8) & 0xFF] << 8) | S[s2 & 0xFF]) ^ k3)
+
+    def decrypt_words(self, s0, s1, s2, s3):
+        '''Decrypt a block given as four big endian words.
+
+           Same cipher as decrypt, with the round state in locals instead of
+           lists. Returns the four words of the decrypted block.'''
+
+        T5 = self.T5
+        T6 = self.T6
+        T7 = self.T7
+        T8 = self.T8
+        Si = self.Si
+        Kd = self._Kd_words
+
+        k0, k1, k2, k3 = Kd[0]
+        s0 ^= k0
+        s1 ^= k1
+        s2 ^= k2
+        s3 ^= k3
+
+        for k0, k1, k2, k3 in Kd[1:-1]:
+            t0 = (T5[s0 >> 24] ^ T6[(s3 >> 16) & 0xFF] ^
+                  T7[(s2 >> 8) & 0xFF] ^ T8[s1 & 0xFF] ^ k0)
+            t1 = (T5[s1 >> 24] ^ T6[(s0 >> 16) & 0xFF] ^
+                  T7[(s3 >> 8) & 0xFF] ^ T8[s2 & 0xFF] ^ k1)
+            t2 = (T5[s2 >> 24] ^ T6[(s1 >> 16) & 0xFF] ^
+                  T7[(s0 >> 8) & 0xFF] ^ T8[s3 & 0xFF] ^ k2)
+            s3 = (T5[s3 >> 24] ^ T6[(s2 >> 16) & 0xFF] ^
+                  T7[(s1 >> 8) & 0xFF] ^ T8[s0 & 0xFF] ^ k3)
+            s0 = t0
+            s1 = t1
+            s2 = t2
+
+        # The last round is special
+        k0, k1, k2, k3 = Kd[-1]
+        return (
+            ((Si[s0 >> 24] << 24) | (Si[(s3 >> 16) & 0xFF] << 16) |
+             (Si[(s2 >> 8) & 0xFF] << 8) | Si[s1 & 0xFF]) ^ k0,
+            ((Si[s1 >> 24] << 24) | (Si[(s0 >> 16) & 0xFF] << 16) |
+             (Si[(s3 >> 8) & 0xFF] << 8) | Si[s2 & 0xFF]) ^ k1,
+            ((Si[s2 >> 24] << 24) | (Si[(s1 >> 16) & 0xFF] << 16) |
+             (Si[(s0 >> 8) & 0xFF] << 8) | Si[s3 & 0xFF]) ^ k2,
+            ((Si[s3 >> 24] << 24) | (Si[(s2 >> 16) & 0xFF] << 16) |
+             (Si[(s1 >> 8) & 0xFF] << 8) | Si[s0 & 0xFF]) ^ k3)
+
+    # Word rotations of the round transforms, word i of the state takes
+    # word (i + shift) % 4
+    _encrypt_shifts = (1, 2, 3)
+    _decrypt_shifts = (3, 2, 1)
+
+    # Tables as NumPy arrays, created on first use
+    _vector_tables = None
+
+    def _get_vector_tables(self):
+        cls = type(self)
+        if cls._vector_tables is None:
+            cls._vector_tables = dict(
+                (name, numpy.array(getattr(self, name), dtype=numpy.uint32))
+                for name in ('T1', 'T2', 'T3', 'T4', 'T5', 'T6', 'T7', 'T8',
+                             'S', 'Si'))
+        return cls._vector_tables
+
+    def _vector_cipher(self, state, keys, tables, shifts, box):
+        (Ta, Tb, Tc, Td) = tables
+        keys = numpy.array(keys, dtype=numpy.uint32)
+
+        # Rotated copies of the state are taken along the flat array of words
+        index = numpy.arange(len(state) * 4, dtype=numpy.intp)
+        (r1, r2, r3) = [index - index % 4 + (index + shift) % 4
+                        for shift in shifts]
+
+        state = (state ^ keys[0]).reshape(-1)
+        round_keys = numpy.tile(keys, (1, len(state) // 4))
+        for key in round_keys[1:-1]:
+            state = (Ta.take(state >> 24) ^
+                     Tb.take((state.take(r1) >> 16) & 0xFF) ^
+                     Tc.take((state.take(r2) >> 8) & 0xFF) ^
+                     Td.take(state.take(r3) & 0xFF) ^
+                     key)
+
+        # The last round is special
+        state = (((box.take(state >> 24) << 24) |
+                  (box.take((state.take(r1) >> 16) & 0xFF) << 16) |
+                  (box.take((state.take(r2) >> 8) & 0xFF) << 8) |
+                  box.take(state.take(r3) & 0xFF)) ^
+                 round_keys[-1])
+        return state.reshape(-1, 4)
+
+    def encrypt_vector(self, state):
+        '''Encrypt many blocks at once with NumPy.
+
+           state is a uint32 array of shape (blocks, 4), the big endian words
+           of every block. Returns the words of the encrypted blocks.'''
+
+        tables = self._get_vector_tables()
+        return self._vector_cipher(
+            state,
+            self._Ke_words,
+            [tables[name] for name in ('T1', 'T2', 'T3', 'T4')],
+            self._encrypt_shifts,
+            tables['S'])
+
+    def decrypt_vector(self, state):
+        '''Decrypt many blocks at once with NumPy.
+
+           state is a uint32 array of shape (blocks, 4), the big endian words
+           of every block. Returns the words of the decrypted blocks.'''
+
+        tables = self._get_vector_tables()
+        return self._vector_cipher(
+            state,
+            self._Kd_words,
+            [tables[name] for name in ('T5', 'T6', 'T7', 'T8')],
+            self._decrypt_shifts,
+            tables['Si'])
+
+
+def _words_vector(data):
+    'Big endian words of a buffer as a uint32 array of shape (blocks, 4).'
+    return numpy.frombuffer(
+        memoryview(data).tobytes(), dtype='>u4').astype(numpy.uint32).reshape(-1, 4)
+
+
+def _vector_bytes(state):
+    'Bytes of a uint32 array of big endian words.'
+    return state.astype('>u4').tobytes()
+
+
 class Counter(object):
     '''A counter object for the Counter (CTR) mode of operation.
 
@@ -3931,6 +4114,10 @@ class Counter(object):
             self._counter = [0] * len(self._counter)
 
 
+# Smallest number of blocks decrypted with NumPy, fewer are faster one by one
+VECTOR_MIN_BLOCKS = 32
+
+
 class AESBlockModeOfOperation(object):
     '''Super-class for AES modes of operation that require blocks.'''
 
@@ -4037,6 +4224,74 @@ class AESModeOfOperationCBC(AESBlockModeOfOperation):
 
         return _bytes_to_string(plaintext)
 
+    def encrypt_into(self, plaintext, output):
+        '''Encrypt a buffer of any multiple of 16 bytes into output.
+
+           output is a bytearray of at least the length of plaintext. The
+           chaining state continues from the last call, like encrypt.'''
+
+        if len(plaintext) % 16 != 0:
+            raise ValueError('plaintext length must be a multiple of 16 bytes')
+
+        count = len(plaintext) // 4
+        words = struct.unpack_from('>%dI' % count, plaintext)
+        result = [0] * count
+        encrypt_words = self._aes.encrypt_words
+        l0, l1, l2, l3 = struct.unpack(
+            '>4I', _bytes_to_string(self._last_cipherblock))
+
+        for i in xrange(0, count, 4):
+            l0, l1, l2, l3 = result[i:i + 4] = encrypt_words(
+                words[i] ^ l0,
+                words[i + 1] ^ l1,
+                words[i + 2] ^ l2,
+                words[i + 3] ^ l3)
+
+        struct.pack_into('>%dI' % count, output, 0, *result)
+        if count:
+            self._last_cipherblock = _string_to_bytes(
+                struct.pack('>4I', l0, l1, l2, l3))
+
+    def decrypt_into(self, ciphertext, output):
+        '''Decrypt a buffer of any multiple of 16 bytes into output.
+
+           output is a bytearray of at least the length of ciphertext. The
+           chaining state continues from the last call, like decrypt.'''
+
+        if len(ciphertext) % 16 != 0:
+            raise ValueError('ciphertext length must be a multiple of 16 bytes')
+
+        # The blocks decrypt independently, with NumPy all at once
+        if numpy is not None and len(ciphertext) >= 16 * VECTOR_MIN_BLOCKS:
+            cipherblocks = _words_vector(ciphertext)
+            previous = numpy.empty_like(cipherblocks)
+            previous[0] = _words_vector(
+                _bytes_to_string(self._last_cipherblock))[0]
+            previous[1:] = cipherblocks[:-1]
+            output[:len(ciphertext)] = _vector_bytes(
+                self._aes.decrypt_vector(cipherblocks) ^ previous)
+            self._last_cipherblock = _string_to_bytes(
+                _vector_bytes(cipherblocks[-1]))
+            return
+
+        count = len(ciphertext) // 4
+        words = struct.unpack_from('>%dI' % count, ciphertext)
+        result = [0] * count
+        decrypt_words = self._aes.decrypt_words
+        l0, l1, l2, l3 = struct.unpack(
+            '>4I', _bytes_to_string(self._last_cipherblock))
+
+        for i in xrange(0, count, 4):
+            c0, c1, c2, c3 = words[i:i + 4]
+            p0, p1, p2, p3 = decrypt_words(c0, c1, c2, c3)
+            result[i:i + 4] = (p0 ^ l0, p1 ^ l1, p2 ^ l2, p3 ^ l3)
+            l0, l1, l2, l3 = c0, c1, c2, c3
+
+        struct.pack_into('>%dI' % count, output, 0, *result)
+        if count:
+            self._last_cipherblock = _string_to_bytes(
+                struct.pack('>4I', l0, l1, l2, l3))
+
 
 class AESModeOfOperationCFB(AESSegmentModeOfOperation):
     '''AES Cipher Feedback Mode of Operation.